@@ -1,4 +1,5 @@
 #!/opt/local/bin/python3
+import sys
 import subprocess
 from datetime import datetime, timedelta
 
@@ -28,11 +29,44 @@ progs_tvar = [
     "python/readgrib_msm_tvar_reg.py", "python/readgrib_gsm_tvar_reg.py"
 ]
 times_tvar = ["36", "72"]
+#
+# 全ての水平分布の簡易版を先に描いて公開し、通常版はバックグラウンドで作図して置き換えるかどうか
+# （通常版では入力データを読み直すので、全体の処理量は増える）
+opt_quick = False
+
+
+def run_progs(fcst_date, progs, tier):
+    """全ての地域の水平分布を作図する
+
+    Parameters:
+    ----------
+    fcst_date: str
+        予報時刻（形式：20210819120000）
+    progs: list(str, str, ...)
+        作図プログラムのリスト
+    tier: str
+        作図の品質（quick、full）
+    ----------
+    """
+    for sta in stations:
+        for p in progs:
+            res = subprocess.run(
+                [p, "--fcst_date", fcst_date, "--sta", sta, "--tier", tier],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE)
+            print(res.stdout.decode("utf-8"))
+            print(res.stderr.decode("utf-8"))
+
 
 if __name__ == '__main__':
     # 5時間前に設定
     time = datetime.utcnow() - timedelta(hours=5)
     fcst_date = time.strftime("%Y%m%d%H") + "0000"
+    # バックグラウンドで通常版を作図する場合（予報時刻を引き継ぐ）
+    opt_full = len(sys.argv) > 2 and sys.argv[1] == "--full"
+    if opt_full:
+        fcst_date = sys.argv[2]
+        time = datetime.strptime(fcst_date, "%Y%m%d%H%M%S")
     print(fcst_date)
     hh = time.strftime("%H")
     opt_gsm = False
@@ -42,13 +76,20 @@ if __name__ == '__main__':
     progs = progs_msm
     if opt_gsm:
         progs.extend(progs_gsm)
-    for sta in stations:
-        for p in progs:
-            res = subprocess.run([p, "--fcst_date", fcst_date, "--sta", sta],
-                                 stdout=subprocess.PIPE,
-                                 stderr=subprocess.PIPE)
-            print(res.stdout.decode("utf-8"))
-            print(res.stderr.decode("utf-8"))
+    if opt_full:
+        # 簡易版を通常版で置き換える
+        run_progs(fcst_date, progs, "full")
+        sys.exit()
+    if opt_quick:
+        # 簡易版を先に作図し、通常版は別のプロセスで作図する
+        run_progs(fcst_date, progs, "quick")
+        with open("main_auto_full.log", "w") as flog:
+            subprocess.Popen([sys.executable, __file__, "--full", fcst_date],
+                             stdout=flog,
+                             stderr=subprocess.STDOUT,
+                             start_new_session=True)
+    else:
+        run_progs(fcst_date, progs, "full")
 
     for sta in stations_tvar:
         for p, t in zip(progs_tvar, times_tvar):
@@ -0,0 +1,68 @@
+#!/opt/local/bin/python3
+#
+#  2026/10/19 相当温位の計算（mktheta、mkthetae）の速度とメモリ使用量の比較
+#
+import time
+import tracemalloc
+import numpy as np
+from utils import mktheta
+from utils import mkthetae
+
+# MSMの気圧面データと同じ大きさ（予報時間, 気圧面, 緯度, 経度）
+nt = 4
+plevs = np.array([1000, 975, 950, 925, 900, 850, 800, 700, 600, 500, 400, 300])
+ny = 253
+nx = 241
+# 繰り返し回数
+nrep = 3
+
+
+def bench(func):
+    """最小の実行時間（秒）とメモリ使用量の最大値（MB）を求める"""
+    elapsed = []
+    for n in range(nrep):
+        t0 = time.perf_counter()
+        func()
+        elapsed.append(time.perf_counter() - t0)
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return min(elapsed), peak / 1024. / 1024.
+
+
+if __name__ == '__main__':
+    rng = np.random.default_rng(0)
+    shape = (nt, len(plevs), ny, nx)
+    pres = plevs.reshape(1, len(plevs), 1, 1) * 100.  # (Pa)
+    tem = rng.uniform(220., 310., shape)  # (K)
+    rh = rng.uniform(0., 100., shape)  # (%)
+    tem32 = tem.astype(np.float32)
+    rh32 = rh.astype(np.float32)
+    out = np.empty(shape, dtype=np.float32)
+    presf = np.broadcast_to(pres, shape)
+
+    # 元の関数（気圧面・予報時間毎に呼ぶ）
+    def loop_mktheta():
+        for it in range(nt):
+            for k, p in enumerate(plevs):
+                mktheta(p * 100., tem[it, k], rh[it, k])
+
+    cases = [
+        ("mktheta (loop, float64)", loop_mktheta),
+        ("mktheta (cube, float64)", lambda: mktheta(presf, tem, rh)),
+        ("mkthetae (cube, float64)",
+         lambda: mkthetae(pres, tem, rh, dtype=np.float64)),
+        ("mkthetae (cube, float32)", lambda: mkthetae(pres, tem32, rh32)),
+        ("mkthetae (cube, float32, out=)",
+         lambda: mkthetae(pres, tem32, rh32, out=out)),
+    ]
+    print("shape = ", shape)
+    for name, func in cases:
+        elapsed, peak = bench(func)
+        print("%-32s %8.3f s %9.1f MB" % (name, elapsed, peak))
+    # 元の関数との差
+    the, thes = mktheta(presf, tem, rh)
+    the32, thes32 = mkthetae(pres, tem32, rh32, opt_thes=True)
+    print("max diff (float32): the = %.2e K, thes = %.2e K" %
+          (np.abs(the32 - the).max(), np.abs(thes32 - thes).max()))
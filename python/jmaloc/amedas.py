@@ -51,6 +51,25 @@ class AmedasStation():
         latitude = df_loc.iloc[0, 5]
         return float(longitude), float(latitude)
 
+    def get_all_staloc(self):
+        """全てのアメダス地点の地点番号、英語の地点名、経度、緯度を返す
+
+        Returns:
+        ----------
+        staids: ndarray
+            地点番号（1次元、str）
+        en_names: ndarray
+            英語の地点名（1次元、str）
+        longitudes, latitudes: ndarray
+            アメダス地点の経度、緯度（1次元、float）
+        ----------
+        """
+        staids = self.df.loc[:, "staid"].to_numpy()
+        en_names = self.df.loc[:, "enname"].to_numpy()
+        longitudes = self.df.loc[:, "longitude"].to_numpy(dtype=np.float64)
+        latitudes = self.df.loc[:, "latitude"].to_numpy(dtype=np.float64)
+        return staids, en_names, longitudes, latitudes
+
     def _location(self):
         """アメダス地点情報読み込み"""
         url_top = "https://www.jma.go.jp/bosai/amedas/const/"
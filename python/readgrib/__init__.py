@@ -7,6 +7,7 @@ import subprocess
 import urllib.request
 import netCDF4
 import numpy as np
+import scipy.sparse
 import ssl
 
 ssl._create_default_https_context = ssl._create_unverified_context
@@ -15,6 +16,13 @@ ssl._create_default_https_context = ssl._create_unverified_context
 #verbose = True
 verbose = False
 
+# 地点毎に周囲の格子だけを読み込む地点数の上限
+# （超える場合は全ての地点を含む範囲をまとめて読み込む）
+column_boxes_max = 20
+
+# ret_cubesで一度に読み込む予報時間の数の上限（メモリの使用量を抑える）
+cube_hours_max = 24
+
 # 入力する気象庁GPVデータのファイルを置いたディレクトリ
 sys_file_dir = os.environ.get('DATADIR_GPV', '/data')
 
@@ -314,6 +322,249 @@ def _netcdf_gsm_plev(gsm_dir, fcst_time, tsel):
 
 ### utils ###
 
+
+def _group_files(netcdf_file, file_dir, fcst_times, tsel):
+    """予報時間をファイル毎にまとめる
+
+    Parameters:
+    ----------
+    netcdf_file: function
+        予報時間からデータ番号とファイル名を返す関数（_netcdf_msm_surfなど）
+    file_dir: str
+        データを置いたディレクトリ、またはretrieve、force_retrieve
+    fcst_times: list(int, int, ...) or ndarray
+        予報時刻からの経過時間のリスト
+    tsel: str
+        ファイル名に含まれる時刻部分
+    ----------
+    Returns 
+    ----------
+    groups: list((str, list((int, int, int), ...)), ...)
+        ファイル名と、(fcst_timesでの番号, 予報時間, データ番号)のリスト
+    ----------
+    """
+    groups = dict()
+    for n, t in enumerate(fcst_times):
+        rec_num, file_dir_name = netcdf_file(file_dir, int(t), tsel)
+        groups.setdefault(file_dir_name, []).append((n, int(t), rec_num))
+    return list(groups.items())
+
+
+def _column_boxes(weights):
+    """地点の値を求めるのに使う格子を含む範囲と、範囲内の格子に対する重みを求める
+
+    Parameters:
+    ----------
+    weights: utils.interp.StationWeights
+        地点への内挿の重み
+    ----------
+    Returns 
+    ----------
+    boxes: list((ndarray, slice, slice, scipy.sparse.csr_matrix), ...)
+        地点の番号、範囲の緯度・経度方向のスライス、範囲内の格子に対する重み
+    ----------
+    """
+    w = weights.weights.tocsr()
+    nx = weights.shape[1]
+    rows_all = np.arange(weights.nsta)
+    if weights.nsta <= column_boxes_max:
+        groups = [rows_all[r:r + 1] for r in rows_all]
+    else:
+        groups = [rows_all]
+    boxes = []
+    for rows in groups:
+        sub = w[rows]
+        j = sub.indices // nx
+        i = sub.indices % nx
+        j0, j1, i0, i1 = j.min(), j.max(), i.min(), i.max()
+        bw = i1 - i0 + 1
+        local = scipy.sparse.csr_matrix(
+            (sub.data, (j - j0) * bw + (i - i0), sub.indptr),
+            shape=(len(rows), (j1 - j0 + 1) * bw))
+        boxes.append((rows, slice(j0, j1 + 1), slice(i0, i1 + 1), local))
+    return boxes
+
+
+def _gsm_prev_record(gsm_dir, fcst_time, tsel):
+    """3時間毎のファイルの最初のデータの、1つ前のデータを探す（GSM、surf）
+
+    1つ前のデータは、前のファイルの最後のデータ（3時間前）になる
+
+    Parameters:
+    ----------
+    gsm_dir: str
+        GSMデータを置いたディレクトリ、またはretrieve、force_retrieve
+    fcst_time: int
+        予報時刻（ファイルの最初のデータ、87、135など）
+    tsel: str
+        ファイル名に含まれる時刻部分
+    ----------
+    Returns
+    ----------
+    prev_time: int
+        1つ前のデータの予報時刻
+    rec_num: int
+        1つ前のデータのデータ番号
+    file_dir_name: str
+        1つ前のデータのNetCDFファイル名
+    ----------
+    """
+    prev_time = fcst_time - 3
+    rec_num, file_dir_name = _netcdf_gsm_surf(gsm_dir, prev_time, tsel)
+    return prev_time, rec_num, file_dir_name
+
+
+def _gsm_prev_rain(gsm_dir, fcst_time, tsel, var_name="APCP_surface"):
+    """3時間毎のファイルの最初のデータの、1つ前の累積降水量を読み込む（GSM、surf）
+
+    Parameters:
+    ----------
+    gsm_dir: str
+        GSMデータを置いたディレクトリ、またはretrieve、force_retrieve
+    fcst_time: int
+        予報時刻（ファイルの最初のデータ、87、135など）
+    tsel: str
+        ファイル名に含まれる時刻部分
+    var_name: str
+        読み出す変数名
+    ----------
+    Returns
+    ----------
+    d: ndarray
+        3時間前の累積降水量（2次元）
+    ----------
+    """
+    _, rec_num, file_dir_name = _gsm_prev_record(gsm_dir, fcst_time, tsel)
+    with netCDF4.Dataset(file_dir_name, 'r') as nc:
+        return nc.variables[var_name][rec_num]
+
+
+def _read_columns(groups, var_name, plevs, nt, weights, fact, offset):
+    """地点の周囲の格子だけを読み込み、全ての予報時間・気圧面の地点の値を求める
+
+    Parameters:
+    ----------
+    groups: list
+        _group_filesの戻り値
+    var_name: str
+        読み出す変数名（気圧面の名前は付けない）
+    plevs: list(int, int, ...) or ndarray(int, int, ...)
+        読み出す気圧面レベル（hPa）
+    nt: int
+        予報時間の数
+    weights: utils.interp.StationWeights
+        地点への内挿の重み
+    fact: float
+        データに掛けるスケールファクター
+    offset: float
+        データに足すオフセット値
+    ----------
+    Returns 
+    ----------
+    d: ndarray
+        取り出したデータ（3次元、(予報時間, 気圧面, 地点)、欠損値はNaN）
+    ----------
+    """
+    boxes = _column_boxes(weights)
+    d = np.full((nt, len(plevs), weights.nsta), np.nan)
+    for file_dir_name, items in groups:
+        r0 = min(rec for n, t, rec in items)
+        r1 = max(rec for n, t, rec in items)
+        with netCDF4.Dataset(file_dir_name, 'r') as nc:
+            for k, p in enumerate(plevs):
+                var = nc.variables[var_name + "_" + str(p) + "mb"]
+                for rows, jsl, isl, local in boxes:
+                    # 予報時間の範囲の、地点の周囲の格子だけを読み込む
+                    slab = np.ma.filled(
+                        np.ma.asarray(var[r0:r1 + 1, jsl, isl],
+                                      dtype=np.float64), np.nan)
+                    slab = slab.reshape((slab.shape[0], -1))
+                    points = local.dot(slab.T).T * fact + offset
+                    for n, t, rec in items:
+                        d[n, k, rows] = points[rec - r0]
+    return d
+
+
+def _read_cubes(groups,
+                var_name,
+                fact,
+                offset,
+                diff_rain,
+                hours_max,
+                prev_record=None):
+    """ファイル毎に、予報時間の範囲をまとめて格子全体のデータを読み込む
+
+    Parameters:
+    ----------
+    groups: list
+        _group_filesの戻り値
+    var_name: str
+        読み出す変数名
+    fact: float
+        データに掛けるスケールファクター
+    offset: float
+        データに足すオフセット値
+    diff_rain: bool
+        累積降水量の1つ前のデータとの差で前1時間降水量を求めるかどうか
+    hours_max: int
+        一度に読み込む予報時間の数の上限（デフォルト：cube_hours_max）
+    prev_record: function
+        ファイルの最初のデータの予報時間から、1つ前のデータの
+        (予報時間, データ番号, ファイル名)を返す関数（_gsm_prev_recordなど）
+        diff_rainの場合、ファイルの最初のデータはこのデータとの差にする
+    ----------
+    Yields:
+    ----------
+    hours: ndarray
+        予報時間（1次元）
+    d: ndarray
+        取り出したデータ（3次元、(予報時間, 緯度, 経度)、float32、欠損値はNaN）
+    ----------
+    """
+    if hours_max is None:
+        hours_max = cube_hours_max
+    rain = var_name == "APCP_surface"
+
+    def read(var, r0, r1):
+        return np.ma.filled(np.ma.asarray(var[r0:r1 + 1], dtype=np.float32),
+                            np.nan) * fact + offset
+
+    last = None  # 最後に読み込んだ(予報時間, データ)（塊・ファイルをまたいで使う）
+    for file_dir_name, items in groups:
+        with netCDF4.Dataset(file_dir_name, 'r') as nc:
+            var = nc.variables[var_name]
+            for c in range(0, len(items), hours_max):
+                chunk = items[c:c + hours_max]
+                r0 = min(rec for n, t, rec in chunk)
+                r1 = max(rec for n, t, rec in chunk)
+                # 前1時間降水量は1つ前の累積降水量との差で求める
+                if diff_rain:
+                    r0 = max(r0 - 1, 0)
+                cube = read(var, r0, r1)
+                d = np.empty((len(chunk), ) + cube.shape[1:],
+                             dtype=np.float32)
+                for k, (n, t, rec) in enumerate(chunk):
+                    if rain and t == 0:
+                        # データがないため、+0hのみ0 (kg/m2)
+                        d[k] = 0.0
+                    elif diff_rain and t >= 2 and rec >= 1:
+                        d[k] = cube[rec - r0] - cube[rec - 1 - r0]
+                    elif diff_rain and t >= 2 and prev_record is not None:
+                        # ファイルの最初のデータは、前のファイルの最後のデータとの差
+                        t1, rec1, file1 = prev_record(t)
+                        if last is not None and last[0] == t1:
+                            prev = last[1]
+                        else:
+                            with netCDF4.Dataset(file1, 'r') as nc1:
+                                prev = read(nc1.variables[var_name], rec1,
+                                            rec1)[0]
+                        d[k] = cube[rec - r0] - prev
+                    else:
+                        d[k] = cube[rec - r0]
+                last = (chunk[-1][1], cube[-1])
+                yield np.array([t for n, t, rec in chunk]), d
+
+
 ##############################################################################
 
 
@@ -472,6 +723,152 @@ class ReadMSM():
             print(var_name, d.shape)
         return d
 
+    #
+    def ret_points(self,
+                   var_name,
+                   fcst_times,
+                   ilat=None,
+                   ilon=None,
+                   fact=1.0,
+                   offset=0.0,
+                   weights=None):
+        """全ての予報時間のデータを、地点の格子番号で取り出す
+
+        ファイル毎に必要な予報時間の範囲をまとめて読み込み、全ての地点を一度に取り出す
+
+        Parameters:
+        ----------
+        var_name: str
+            読み出す変数名
+        fcst_times: list(int, int, ...) or ndarray
+            予報時刻からの経過時間のリスト
+        ilat: ndarray
+            地点の緯度方向の格子番号（1次元、weightsを与えた場合は不要）
+        ilon: ndarray
+            地点の経度方向の格子番号（1次元、weightsを与えた場合は不要）
+        fact: float
+            データに掛けるスケールファクター
+        offset: float
+            データに足すオフセット値
+        weights: utils.interp.StationWeights
+            与えた場合は、格子番号の代わりに地点への内挿の重みで値を求める
+        ----------
+        Returns 
+        ----------
+        d: ndarray
+            取り出したデータ（2次元、(予報時間, 地点)）
+        ----------
+        """
+        if self.msm_lev == "surf":
+            netcdf_file = _netcdf_msm_surf
+        else:
+            netcdf_file = _netcdf_msm_plev
+        nsta = len(ilat) if weights is None else weights.nsta
+        d = np.ma.zeros((len(fcst_times), nsta))
+        for file_dir_name, items in _group_files(netcdf_file, self.msm_dir,
+                                                 fcst_times, self.tsel):
+            r0 = min(rec for n, t, rec in items)
+            r1 = max(rec for n, t, rec in items)
+            with netCDF4.Dataset(file_dir_name, 'r') as nc:
+                cube = nc.variables[var_name][r0:r1 + 1]
+            if weights is None:
+                points = cube[:, ilat, ilon] * fact + offset
+            else:
+                points = weights.sample(cube) * fact + offset
+            for n, t, rec in items:
+                if var_name == "APCP_surface" and t == 0:
+                    # データがないため、+0hのみ0 (kg/m2)
+                    d[n] = 0.0
+                else:
+                    d[n] = points[rec - r0]
+        if verbose:
+            print("read: ", var_name, d.shape)
+        return d
+
+    #
+    def ret_columns(self,
+                    var_name,
+                    plevs,
+                    fcst_times,
+                    weights,
+                    fact=1.0,
+                    offset=0.0):
+        """全ての予報時間・気圧面のデータを、地点の鉛直分布として取り出す
+
+        ファイル毎・気圧面毎に、地点の値を求めるのに使う格子（地点の周囲）だけを
+        必要な予報時間の範囲で読み込み、格子全体のデータは読み込まない
+
+        Parameters:
+        ----------
+        var_name: str
+            読み出す変数名（気圧面の名前は付けない）
+        plevs: list(int, int, ...) or ndarray(int, int, ...)
+            読み出す気圧面レベル（hPa）
+        fcst_times: list(int, int, ...) or ndarray
+            予報時刻からの経過時間のリスト
+        weights: utils.interp.StationWeights
+            地点への内挿の重み
+        fact: float
+            データに掛けるスケールファクター
+        offset: float
+            データに足すオフセット値
+        ----------
+        Returns 
+        ----------
+        d: ndarray
+            取り出したデータ（3次元、(予報時間, 気圧面, 地点)、欠損値はNaN）
+        ----------
+        """
+        if self.msm_lev != "plev":
+            raise ValueError("ret_columns needs plev data")
+        groups = _group_files(_netcdf_msm_plev, self.msm_dir, fcst_times,
+                              self.tsel)
+        d = _read_columns(groups, var_name, plevs, len(fcst_times), weights,
+                          fact, offset)
+        if verbose:
+            print("read: ", var_name, d.shape)
+        return d
+
+    #
+    def ret_cubes(self,
+                  var_name,
+                  fcst_times,
+                  fact=1.0,
+                  offset=0.0,
+                  hours_max=None):
+        """全ての予報時間のデータを、予報時間の塊に分けて順に取り出す
+
+        一度に持つのはhours_max個の予報時間だけなので、予報時間が長くてもメモリは増えない
+
+        Parameters:
+        ----------
+        var_name: str
+            読み出す変数名
+        fcst_times: list(int, int, ...) or ndarray
+            予報時刻からの経過時間のリスト（昇順）
+        fact: float
+            データに掛けるスケールファクター
+        offset: float
+            データに足すオフセット値
+        hours_max: int
+            一度に読み込む予報時間の数の上限（デフォルト：cube_hours_max）
+        ----------
+        Yields:
+        ----------
+        hours: ndarray
+            予報時間（1次元）
+        d: ndarray
+            取り出したデータ（3次元、(予報時間, 緯度, 経度)、float32、欠損値はNaN）
+        ----------
+        """
+        if self.msm_lev == "surf":
+            netcdf_file = _netcdf_msm_surf
+        else:
+            netcdf_file = _netcdf_msm_plev
+        groups = _group_files(netcdf_file, self.msm_dir, fcst_times,
+                              self.tsel)
+        return _read_cubes(groups, var_name, fact, offset, False, hours_max)
+
     #
     def close_netcdf(self):
         """netCDFファイルを閉じる"""
@@ -602,7 +999,13 @@ class ReadGSM():
                     d = nc.variables[var_name][rec_num] * fact + offset
                 else:  # 前１時間降水量
                     # d0、d1には累積降水量(kg/m2)が入っている
-                    d0 = nc.variables[var_name][rec_num - 1] * fact + offset
+                    if rec_num == 0:
+                        # ファイルの最初のデータは、前のファイルの最後のデータとの差
+                        d0 = _gsm_prev_rain(self.gsm_dir, fcst_time, self.tsel,
+                                            var_name) * fact + offset
+                    else:
+                        d0 = nc.variables[var_name][rec_num - 1]
+                        d0 = d0 * fact + offset
                     d1 = nc.variables[var_name][rec_num] * fact + offset
                     # 前１時間降水量(kg/m2) (1000mm->1000kg/m2)
                     d = d1 - d0
@@ -646,6 +1049,189 @@ class ReadGSM():
         print(var_name, d.shape)
         return d
 
+    #
+    def ret_points(self,
+                   var_name,
+                   fcst_times,
+                   ilat=None,
+                   ilon=None,
+                   fact=1.0,
+                   offset=0.0,
+                   cum_rain=False,
+                   weights=None):
+        """全ての予報時間のデータを、地点の格子番号で取り出す
+
+        ファイル毎に必要な予報時間の範囲をまとめて読み込み、全ての地点を一度に取り出す
+
+        Parameters:
+        ----------
+        var_name: str
+            読み出す変数名
+        fcst_times: list(int, int, ...) or ndarray
+            予報時刻からの経過時間のリスト
+        ilat: ndarray
+            地点の緯度方向の格子番号（1次元、weightsを与えた場合は不要）
+        ilon: ndarray
+            地点の経度方向の格子番号（1次元、weightsを与えた場合は不要）
+        fact: float
+            データに掛けるスケールファクター
+        offset: float
+            データに足すオフセット値
+        cum_rain: bool
+            降水量データを累積値で返す場合はTrue、前1時間値で返す場合はFalse
+        weights: utils.interp.StationWeights
+            与えた場合は、格子番号の代わりに地点への内挿の重みで値を求める
+        ----------
+        Returns 
+        ----------
+        d: ndarray
+            取り出したデータ（2次元、(予報時間, 地点)）
+        ----------
+        """
+        if self.gsm_lev == "surf":
+            netcdf_file = _netcdf_gsm_surf
+        else:
+            netcdf_file = _netcdf_gsm_plev
+        rain = var_name == "APCP_surface"
+        nsta = len(ilat) if weights is None else weights.nsta
+
+        def sample(cube):
+            if weights is None:
+                return cube[..., ilat, ilon] * fact + offset
+            return weights.sample(cube) * fact + offset
+
+        d = np.ma.zeros((len(fcst_times), nsta))
+        last = None  # 前のファイルの最後の(予報時間, 地点の累積降水量)
+        for file_dir_name, items in _group_files(netcdf_file, self.gsm_dir,
+                                                 fcst_times, self.tsel):
+            r0 = min(rec for n, t, rec in items)
+            r1 = max(rec for n, t, rec in items)
+            # 前1時間降水量は1つ前の累積降水量との差で求める
+            if rain and not cum_rain:
+                r0 = max(r0 - 1, 0)
+            with netCDF4.Dataset(file_dir_name, 'r') as nc:
+                cube = nc.variables[var_name][r0:r1 + 1]
+            points = sample(cube)
+            for n, t, rec in items:
+                if rain and t == 0:
+                    # データがないため、+0hのみ0 (kg/m2)
+                    d[n] = 0.0
+                elif rain and t >= 2 and rec >= 1 and not cum_rain:
+                    d[n] = points[rec - r0] - points[rec - 1 - r0]
+                elif rain and t >= 2 and not cum_rain:
+                    # ファイルの最初のデータは、前のファイルの最後のデータとの差
+                    t1, rec1, file1 = _gsm_prev_record(self.gsm_dir, t,
+                                                       self.tsel)
+                    if last is not None and last[0] == t1:
+                        prev = last[1]
+                    else:
+                        with netCDF4.Dataset(file1, 'r') as nc:
+                            prev = sample(nc.variables[var_name][rec1])
+                    d[n] = points[rec - r0] - prev
+                else:
+                    d[n] = points[rec - r0]
+            last = (items[-1][1], points[-1])
+        print(var_name, d.shape)
+        return d
+
+    #
+    def ret_columns(self,
+                    var_name,
+                    plevs,
+                    fcst_times,
+                    weights,
+                    fact=1.0,
+                    offset=0.0):
+        """全ての予報時間・気圧面のデータを、地点の鉛直分布として取り出す
+
+        ファイル毎・気圧面毎に、地点の値を求めるのに使う格子（地点の周囲）だけを
+        必要な予報時間の範囲で読み込み、格子全体のデータは読み込まない
+
+        Parameters:
+        ----------
+        var_name: str
+            読み出す変数名（気圧面の名前は付けない）
+        plevs: list(int, int, ...) or ndarray(int, int, ...)
+            読み出す気圧面レベル（hPa）
+        fcst_times: list(int, int, ...) or ndarray
+            予報時刻からの経過時間のリスト
+        weights: utils.interp.StationWeights
+            地点への内挿の重み
+        fact: float
+            データに掛けるスケールファクター
+        offset: float
+            データに足すオフセット値
+        ----------
+        Returns 
+        ----------
+        d: ndarray
+            取り出したデータ（3次元、(予報時間, 気圧面, 地点)、欠損値はNaN）
+        ----------
+        """
+        if self.gsm_lev != "plev":
+            raise ValueError("ret_columns needs plev data")
+        groups = _group_files(_netcdf_gsm_plev, self.gsm_dir, fcst_times,
+                              self.tsel)
+        d = _read_columns(groups, var_name, plevs, len(fcst_times), weights,
+                          fact, offset)
+        if verbose:
+            print("read: ", var_name, d.shape)
+        return d
+
+    #
+    def ret_cubes(self,
+                  var_name,
+                  fcst_times,
+                  fact=1.0,
+                  offset=0.0,
+                  cum_rain=False,
+                  hours_max=None):
+        """全ての予報時間のデータを、予報時間の塊に分けて順に取り出す
+
+        一度に持つのはhours_max個の予報時間だけなので、予報時間が長くてもメモリは増えない
+
+        Parameters:
+        ----------
+        var_name: str
+            読み出す変数名
+        fcst_times: list(int, int, ...) or ndarray
+            予報時刻からの経過時間のリスト（昇順）
+        fact: float
+            データに掛けるスケールファクター
+        offset: float
+            データに足すオフセット値
+        cum_rain: bool
+            降水量データを累積値で返す場合はTrue、前1時間値で返す場合はFalse
+        hours_max: int
+            一度に読み込む予報時間の数の上限（デフォルト：cube_hours_max）
+        ----------
+        Yields:
+        ----------
+        hours: ndarray
+            予報時間（1次元）
+        d: ndarray
+            取り出したデータ（3次元、(予報時間, 緯度, 経度)、float32、欠損値はNaN）
+        ----------
+        """
+        if self.gsm_lev == "surf":
+            netcdf_file = _netcdf_gsm_surf
+        else:
+            netcdf_file = _netcdf_gsm_plev
+        groups = _group_files(netcdf_file, self.gsm_dir, fcst_times,
+                              self.tsel)
+        diff_rain = var_name == "APCP_surface" and not cum_rain
+
+        def prev_record(t):
+            return _gsm_prev_record(self.gsm_dir, t, self.tsel)
+
+        return _read_cubes(groups,
+                           var_name,
+                           fact,
+                           offset,
+                           diff_rain,
+                           hours_max,
+                           prev_record=prev_record)
+
     #
     def close_netcdf(self):
         """netCDFファイルを閉じる"""
@@ -9,15 +9,57 @@ import matplotlib.ticker as mticker
 import cartopy.crs as ccrs
 from jmaloc import MapRegion
 from readgrib import ReadGSM
+from utils import FieldEngine
 from utils import val2col
-from utils import convert_png2gif
 from utils import parse_command
-from utils import post
+from utils import FrameCache
+from utils import savefig
+from utils import tier_list
+from utils import set_quick
+from utils import map_projection
+from utils import quicklook
+from utils import clabel
+from utils import opt_remove_png
+from utils import AnimSink
+from utils import grid_contour
+from utils import cloud_rgba
+from utils import get_encoder
 import utils.common
 
+opt_rgb = True  # 雲量をRGB合成画像で描く（False：層毎に陰影を描く）
+opt_rgb_all = True  # 全ての予報時間の合成画像をまとめて作成する
 
-def plotmap(sta, lons_1d, lats_1d, lons, lats, mslp, cfrl, cfrm, cfrh, title,
-            output_filename):
+# 雲量の陰影を付ける値のリスト（%）
+levelsc = np.arange(0, 100.1, 5)
+# 色テーブル（下層、中層、上層）
+cmaps_cloud = ('Reds', 'Greens', 'Blues')
+# 各層の不透明度
+alpha_cloud = 0.3
+
+
+def composite(cfrl, cfrm, cfrh):
+    """下層・中層・上層雲量のRGB合成画像を作成する（先頭に予報時間の次元があってもよい）"""
+    return cloud_rgba(cfrl,
+                      cfrm,
+                      cfrh,
+                      levels=levelsc,
+                      cmaps=cmaps_cloud,
+                      alpha=alpha_cloud)
+
+
+def plotmap(sta,
+            lons_1d,
+            lats_1d,
+            lons,
+            lats,
+            mslp,
+            cfrl,
+            cfrm,
+            cfrh,
+            title,
+            output_filename,
+            sink=None,
+            rgba=None):
     """作図を行う
 
     Parameters:
@@ -44,6 +86,10 @@ def plotmap(sta, lons_1d, lats_1d, lons, lats, mslp, cfrl, cfrm, cfrh, title,
         タイトル
     output_filename: str
         出力ファイル名
+    sink: AnimSink
+        フレームを渡すアニメーションの出力先（Noneならpngファイルに保存）
+    rgba: ndarray
+        作成済みの雲量のRGB合成画像（3次元、Noneならここで作成する）
     ----------
     """
     #
@@ -67,14 +113,18 @@ def plotmap(sta, lons_1d, lats_1d, lons, lats, mslp, cfrl, cfrm, cfrh, title,
     fig = plt.figure(figsize=(10, 10))
     # cartopy呼び出し
     # ax = fig.add_subplot(1, 1, 1, projection=ccrs.PlateCarree())
-    ax = fig.add_axes((0.1, 0.3, 0.8, 0.6), projection=ccrs.PlateCarree())
+    ax = fig.add_axes((0.1, 0.3, 0.8, 0.6), projection=map_projection())
     ax.set_extent([lon_min, lon_max, lat_min, lat_max])  # 領域の限定
+    # 等値線描画の準備（格子と作図範囲が同じなら使い回す）
+    gcont = grid_contour(lons,
+                         lats, [lon_min, lon_max, lat_min, lat_max],
+                         ax=ax)
 
     # 経度、緯度線を描く
     xticks = np.arange(-180, 180, lon_step)
     yticks = np.arange(-90, 90, lat_step)
     gl = ax.gridlines(crs=ccrs.PlateCarree(),
-                      draw_labels=True,
+                      draw_labels=not quicklook(),
                       linewidth=1,
                       linestyle=':',
                       color='k',
@@ -92,42 +142,59 @@ def plotmap(sta, lons_1d, lats_1d, lons, lats, mslp, cfrl, cfrm, cfrh, title,
         levels1 = range(math.floor(mslp.min() - math.fmod(mslp.min(), 2)),
                         math.ceil(mslp.max()) + 1, 1)
         # 等圧線をひく
-        cr1 = ax.contour(lons,
-                         lats,
-                         mslp,
-                         levels=levels1,
-                         colors='k',
-                         linestyles=['-', ':'],
-                         linewidths=1.2)
+        cr1 = gcont.contour(ax,
+                            mslp,
+                            levels=levels1,
+                            colors='k',
+                            linestyles=['-', ':'],
+                            linewidths=1.2)
         # ラベルを付ける
-        cr1.clabel(cr1.levels[::cstp], fontsize=12, fmt="%d")
+        clabel(cr1, cr1.levels[::cstp], fontsize=12, fmt="%d")
     else:
         # 等圧線をひく間隔(2hPaごと)をlevelsにリストとして入れる
         levels2 = range(math.floor(mslp.min() - math.fmod(mslp.min(), 2)),
                         math.ceil(mslp.max()) + 1, 2)
         # 等圧線をひく
-        cr2 = ax.contour(lons,
-                         lats,
-                         mslp,
-                         levels=levels2,
-                         colors='k',
-                         linewidths=1.2)
+        cr2 = gcont.contour(ax,
+                            mslp,
+                            levels=levels2,
+                            colors='k',
+                            linewidths=1.2)
         # ラベルを付ける
-        cr2.clabel(cr2.levels[::cstp], fontsize=12, fmt="%d")
+        clabel(cr2, cr2.levels[::cstp], fontsize=12, fmt="%d")
     #
     #
-    # 雲量の陰影を付ける値をlevelsrにリストとして入れる
-    levelsc = np.arange(0, 100.1, 5)
     # 色テーブル取得
-    cmapl = plt.get_cmap('Reds')  # 下層
-    cmapm = plt.get_cmap('Greens')  # 中層
-    cmaph = plt.get_cmap('Blues')  # 上層
-    # 陰影を描く（下層雲）
-    ax.contourf(lons, lats, cfrl, levels=levelsc, cmap=cmapl, alpha=0.3)
-    # 陰影を描く（中層雲）
-    ax.contourf(lons, lats, cfrm, levels=levelsc, cmap=cmapm, alpha=0.3)
-    # 陰影を描く（上層雲）
-    ax.contourf(lons, lats, cfrh, levels=levelsc, cmap=cmaph, alpha=0.3)
+    cmapl = plt.get_cmap(cmaps_cloud[0])  # 下層
+    cmapm = plt.get_cmap(cmaps_cloud[1])  # 中層
+    cmaph = plt.get_cmap(cmaps_cloud[2])  # 上層
+    if opt_rgb:
+        # 3層の雲量を重ねたRGBA画像を1枚の画像として描く
+        if rgba is None:
+            rgba = composite(cfrl, cfrm, cfrh)
+        gcont.image(ax, rgba)
+    else:
+        # 陰影を描く（下層雲）
+        gcont.shade(ax,
+                    cfrl,
+                    levels=levelsc,
+                    cmap=cmapl,
+                    alpha=alpha_cloud,
+                    raster=True)
+        # 陰影を描く（中層雲）
+        gcont.shade(ax,
+                    cfrm,
+                    levels=levelsc,
+                    cmap=cmapm,
+                    alpha=alpha_cloud,
+                    raster=True)
+        # 陰影を描く（上層雲）
+        gcont.shade(ax,
+                    cfrh,
+                    levels=levelsc,
+                    cmap=cmaph,
+                    alpha=alpha_cloud,
+                    raster=True)
     #
     # タイトルを付ける
     plt.title(title, fontsize=20)
@@ -155,13 +222,61 @@ def plotmap(sta, lons_1d, lats_1d, lons, lats, mslp, cfrl, cfrm, cfrh, title,
                  text="Low cloud cover")
     #
     # 図を保存
-    plt.savefig(output_filename, dpi=300, bbox_inches='tight')
+    savefig(output_filename, sink=sink)
     plt.close()
 
 
+def read_frames(fields, tinfo, tlab, sta, fcst_times):
+    """予報時間毎にデータを読み込む
+
+    Parameters:
+    ----------
+    fields: FieldEngine
+        データを取り出すFieldEngine
+    tinfo: pandas.Timestamp
+        予報時刻
+    tlab: str
+        タイトルに付ける予報時刻の文字列
+    sta: str
+        地点名
+    fcst_times: ndarray
+        予報時刻からの経過時間のリスト
+    ----------
+    Yields:
+    ----------
+    frame: tuple
+        タイトル、出力ファイル名、経度・緯度と作図に使うデータ
+    ----------
+    """
+    for fcst_time in fcst_times:
+        # fcst時刻
+        tinfo_fcst = tinfo + timedelta(hours=int(fcst_time))
+        tlab_fcst = tinfo_fcst.strftime("%m/%d %H UTC")
+        # 経度・緯度
+        lons_1d, lats_1d, lons, lats = fields.grid(fcst_time)
+        # 変数取り出し
+        # 海面更生気圧を二次元のndarrayで取り出す
+        mslp = fields.get("mslp_hPa", fcst_time)  # (hPa)
+        # 下層雲量を二次元のndarrayで取り出す
+        cfrl = fields.get("cfrl", fcst_time)  # (%)
+        # 中層雲量を二次元のndarrayで取り出す
+        cfrm = fields.get("cfrm", fcst_time)  # (%)
+        # 上層雲量を二次元のndarrayで取り出す
+        cfrh = fields.get("cfrh", fcst_time)  # (%)
+        #
+        # タイトルの設定
+        title = tlab + " GSM forecast, +" + str(
+            fcst_time) + "h (" + tlab_fcst + ")"
+        # 出力ファイル名の設定
+        hh = "{d:02d}".format(d=fcst_time)
+        output_filename = "map_gsm_ccover_" + sta + "_" + str(hh) + ".png"
+        yield (title, output_filename, lons_1d, lats_1d, lons, lats, mslp,
+               cfrl, cfrm, cfrh)
+
+
 if __name__ == '__main__':
     # オプションの読み込み
-    args = parse_command(sys.argv)
+    args = parse_command(sys.argv, opt_tier=True, opt_proj=True)
     # 予報時刻, 作図する地域の指定
     fcst_date = args.fcst_date
     sta = args.sta
@@ -178,41 +293,72 @@ if __name__ == '__main__':
     #
     # ReadGSM初期化
     gsm = ReadGSM(tsel, file_dir, "surf")
+    # 変数を名前で取り出す（読み込んだ変数・求めた変数を使い回す）
+    fields = FieldEngine("GSM", tsel, {"surf": gsm})
     #
-    # fcst_timeを変えてplotmapを実行
-    output_filenames = []
-    for fcst_time in np.arange(fcst_str, fcst_end + 1, fcst_step):
-        # fcst_timeを設定
-        gsm.set_fcst_time(fcst_time)
-        # fcst時刻
-        tinfo_fcst = tinfo + timedelta(hours=int(fcst_time))
-        tlab_fcst = tinfo_fcst.strftime("%m/%d %H UTC")
-        # NetCDFデータ読み込み
-        lons_1d, lats_1d, lons, lats = gsm.readnetcdf()
-        # 変数取り出し
-        # 海面更生気圧を二次元のndarrayで取り出す
-        mslp = gsm.ret_var("PRMSL_meansealevel", fact=0.01)  # (hPa)
-        # 下層雲量を二次元のndarrayで取り出す
-        cfrl = gsm.ret_var("LCDC_surface")  # (%)
-        # 中層雲量を二次元のndarrayで取り出す
-        cfrm = gsm.ret_var("MCDC_surface")  # (%)
-        # 上層雲量を二次元のndarrayで取り出す
-        cfrh = gsm.ret_var("HCDC_surface")  # (%)
-        # ファイルを閉じる
-        gsm.close_netcdf()
+    # 作図する品質（簡易版を先に描いて書き出し、通常版で置き換える）
+    tiers = tier_list(args.tier)
+    #
+    # 予報時間毎のデータ（簡易版と通常版を描く場合は読み込んだデータを使い回す）
+    frames = read_frames(fields,
+                         tinfo,
+                         tlab,
+                         sta,
+                         np.arange(fcst_str, fcst_end + 1, fcst_step))
+    if len(tiers) > 1 or (opt_rgb and opt_rgb_all):
+        frames = list(frames)
+    #
+    # 雲量のRGB合成画像（作図が必要になった時に全ての予報時間をまとめて作成する）
+    rgbas = None
+    #
+    # 作図結果のキャッシュ
+    cache = FrameCache("gsm_ccover")
+    #
+    # 品質毎に作図する
+    for quick in tiers:
+        set_quick(quick)
+        # アニメーションの出力先（フレームを直接gif/mp4に変換する）
+        sink = AnimSink(gif_filename="anim_gsm_ccover_" + sta + ".gif",
+                        delay="80",
+                        save_png=not opt_remove_png)
         #
-        # タイトルの設定
-        title = tlab + " GSM forecast, +" + str(
-            fcst_time) + "h (" + tlab_fcst + ")"
-        # 出力ファイル名の設定
-        hh = "{d:02d}".format(d=fcst_time)
-        output_filename = "map_gsm_ccover_" + sta + "_" + str(hh) + ".png"
-        plotmap(sta, lons_1d, lats_1d, lons, lats, mslp, cfrl, cfrm, cfrh,
-                title, output_filename)
-        output_filenames.append(output_filename)
-    # pngからgifアニメーションに変換
-    convert_png2gif(input_filenames=output_filenames,
-                    delay="80",
-                    output_filename="anim_gsm_ccover_" + sta + ".gif")
-    # 後処理
-    post(output_filenames)
+        # 予報時間を変えてplotmapを実行
+        for i, (title, output_filename, lons_1d, lats_1d, lons, lats, mslp,
+                cfrl, cfrm, cfrh) in enumerate(frames):
+            # 作図（入力データが同じ場合はキャッシュを使う）
+            key = cache.key(sta,
+                            title,
+                            lons_1d,
+                            lats_1d,
+                            mslp,
+                            cfrl,
+                            cfrm,
+                            cfrh,
+                            quick=quick)
+            if not cache.get(key, output_filename, sink=sink):
+                if opt_rgb and opt_rgb_all and rgbas is None:
+                    # (予報時間, 層, 緯度, 経度)
+                    cfrs = np.ma.stack(
+                        [np.ma.stack(frame[-3:]) for frame in frames])
+                    rgbas = composite(cfrs[:, 0], cfrs[:, 1], cfrs[:, 2])
+                plotmap(sta,
+                        lons_1d,
+                        lats_1d,
+                        lons,
+                        lats,
+                        mslp,
+                        cfrl,
+                        cfrm,
+                        cfrh,
+                        title,
+                        output_filename,
+                        sink=sink,
+                        rgba=None if rgbas is None else rgbas[i])
+                cache.put(key, output_filename, sink=sink)
+        # アニメーションを書き出す
+        sink.close()
+    # ファイルを閉じる
+    fields.close()
+    #
+    # 画像ファイルの書き出しが終わるまで待つ（エラーがあれば送出する）
+    get_encoder().close()
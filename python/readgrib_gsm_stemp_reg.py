@@ -9,15 +9,24 @@ import matplotlib.ticker as mticker
 import cartopy.crs as ccrs
 from jmaloc import MapRegion
 from readgrib import ReadGSM
+from utils import FieldEngine
 from utils import ColUtils
-from utils import convert_png2gif
-from utils import convert_png2mp4
 from utils import parse_command
-from utils import post
+from utils import FrameCache
+from utils import savefig
+from utils import tier_list
+from utils import set_quick
+from utils import map_projection
+from utils import quicklook
+from utils import clabel
+from utils import opt_remove_png
+from utils import AnimSink
+from utils import grid_contour
+from utils import get_encoder
 import utils.common
 
 
-def plotmap(sta, lons, lats, tmp, rain, title, output_filename):
+def plotmap(sta, lons, lats, tmp, rain, title, output_filename, sink=None):
     """作図を行う
 
     Parameters:
@@ -36,6 +45,8 @@ def plotmap(sta, lons, lats, tmp, rain, title, output_filename):
         タイトル
     output_filename: str
         出力ファイル名
+    sink: AnimSink
+        フレームを渡すアニメーションの出力先（Noneならpngファイルに保存）
     ----------
     """
     #
@@ -58,14 +69,18 @@ def plotmap(sta, lons, lats, tmp, rain, title, output_filename):
     # マップを作成
     fig = plt.figure(figsize=(10, 10))
     # cartopy呼び出し
-    ax = fig.add_subplot(1, 1, 1, projection=ccrs.PlateCarree())
+    ax = fig.add_subplot(1, 1, 1, projection=map_projection())
     ax.set_extent([lon_min, lon_max, lat_min, lat_max])  # 領域の限定
+    # 等値線描画の準備（格子と作図範囲が同じなら使い回す）
+    gcont = grid_contour(lons,
+                         lats, [lon_min, lon_max, lat_min, lat_max],
+                         ax=ax)
 
     # 経度、緯度線を描く
     xticks = np.arange(-180, 180, lon_step)
     yticks = np.arange(-90, 90, lat_step)
     gl = ax.gridlines(crs=ccrs.PlateCarree(),
-                      draw_labels=True,
+                      draw_labels=not quicklook(),
                       linewidth=1,
                       linestyle=':',
                       color='k',
@@ -84,41 +99,40 @@ def plotmap(sta, lons, lats, tmp, rain, title, output_filename):
         levels1 = range(math.floor(tmp.min() - math.fmod(tmp.min(), 2)),
                         math.ceil(tmp.max()) + 1, 1)
         # 等温線をひく
-        cr1 = ax.contour(lons,
-                         lats,
-                         tmp,
-                         levels=levels1,
-                         linestyles=['-', ':'],
-                         cmap=cmap,
-                         linewidths=0.8)
+        cr1 = gcont.contour(ax,
+                            tmp,
+                            levels=levels1,
+                            linestyles=['-', ':'],
+                            cmap=cmap,
+                            linewidths=0.8)
         # ラベルを付ける
-        cr1.clabel(cr1.levels[::cstp], fontsize=12, fmt="%d")
+        clabel(cr1, cr1.levels[::cstp], fontsize=12, fmt="%d")
     else:
         # 等温線をひく間隔(2Kごと)をlevelsにリストとして入れる
         levels2 = range(math.floor(tmp.min() - math.fmod(tmp.min(), 2)),
                         math.ceil(tmp.max()) + 1, 2)
         # 等温線をひく
-        cr2 = ax.contour(lons,
-                         lats,
-                         tmp,
-                         levels=levels2,
-                         cmap=cmap,
-                         linewidths=0.8)
+        cr2 = gcont.contour(ax,
+                            tmp,
+                            levels=levels2,
+                            cmap=cmap,
+                            linewidths=0.8)
         # ラベルを付ける
-        cr2.clabel(cr2.levels[::cstp], fontsize=12, fmt="%d")
+        clabel(cr2, cr2.levels[::cstp], fontsize=12, fmt="%d")
     #
     # 色テーブルの設定
     cutils = ColUtils('s3pcpn_l')  # 色テーブルの選択
     cmap = cutils.get_ctable(under='gray', over='brown')  # 色テーブルの取得
     # 降水量の陰影を付ける値をlevelsrにリストとして入れる
     levelsr = [0.2, 1, 5, 10, 20, 50, 80, 100]
-    # 陰影を描く
-    cs = ax.contourf(lons,
-                     lats,
+    # 陰影を描く（間引く場合には極値を残す）
+    cs = gcont.shade(ax,
                      rain,
                      levels=levelsr,
+                     pooling="max",
                      cmap=cmap,
-                     extend='both')
+                     extend='both',
+                     raster=True)
     # カラーバーを付ける
     cbar = plt.colorbar(cs, orientation='horizontal', shrink=0.9, pad=0.05)
     cbar.set_label('precipitation (mm/hr)')
@@ -127,13 +141,56 @@ def plotmap(sta, lons, lats, tmp, rain, title, output_filename):
     # タイトルを付ける
     plt.title(title, fontsize=20)
     # 図を保存
-    plt.savefig(output_filename, dpi=300, bbox_inches='tight')
+    savefig(output_filename, sink=sink)
     plt.close()
 
 
+def read_frames(fields, tinfo, tlab, sta, fcst_times):
+    """予報時間毎にデータを読み込む
+
+    Parameters:
+    ----------
+    fields: FieldEngine
+        データを取り出すFieldEngine
+    tinfo: pandas.Timestamp
+        予報時刻
+    tlab: str
+        タイトルに付ける予報時刻の文字列
+    sta: str
+        地点名
+    fcst_times: ndarray
+        予報時刻からの経過時間のリスト
+    ----------
+    Yields:
+    ----------
+    frame: tuple
+        タイトル、出力ファイル名、経度・緯度と作図に使うデータ
+    ----------
+    """
+    for fcst_time in fcst_times:
+        # fcst時刻
+        tinfo_fcst = tinfo + timedelta(hours=int(fcst_time))
+        tlab_fcst = tinfo_fcst.strftime("%m/%d %H UTC")
+        # 経度・緯度
+        lons_1d, lats_1d, lons, lats = fields.grid(fcst_time)
+        # 変数取り出し
+        # 降水量を二次元のndarrayで取り出す
+        rain = fields.get("rain_1h", fcst_time)  # (mm/h)
+        # 気温を二次元のndarrayで取り出す (K->℃)
+        tmp = fields.get("t2m_C", fcst_time)  # (℃)
+        #
+        # タイトルの設定
+        title = tlab + " GSM forecast, +" + str(
+            fcst_time) + "h (" + tlab_fcst + ")"
+        # 出力ファイル名の設定
+        hh = "{d:02d}".format(d=fcst_time)
+        output_filename = "map_gsm_stemp_" + sta + "_" + str(hh) + ".png"
+        yield (title, output_filename, lons_1d, lats_1d, lons, lats, tmp, rain)
+
+
 if __name__ == '__main__':
     # オプションの読み込み
-    args = parse_command(sys.argv)
+    args = parse_command(sys.argv, opt_tier=True, opt_proj=True)
     # 予報時刻, 作図する地域の指定
     fcst_date = args.fcst_date
     sta = args.sta
@@ -150,40 +207,58 @@ if __name__ == '__main__':
     #
     # ReadGSM初期化
     gsm = ReadGSM(tsel, file_dir, "surf")
+    # 変数を名前で取り出す（読み込んだ変数・求めた変数を使い回す）
+    fields = FieldEngine("GSM", tsel, {"surf": gsm})
     #
-    # fcst_timeを変えてplotmapを実行
-    output_filenames = []
-    for fcst_time in np.arange(fcst_str, fcst_end + 1, fcst_step):
-        # fcst_timeを設定
-        gsm.set_fcst_time(fcst_time)
-        # fcst時刻
-        tinfo_fcst = tinfo + timedelta(hours=int(fcst_time))
-        tlab_fcst = tinfo_fcst.strftime("%m/%d %H UTC")
-        # NetCDFデータ読み込み
-        lons_1d, lats_1d, lons, lats = gsm.readnetcdf()
-        # 変数取り出し
-        # 降水量を二次元のndarrayで取り出す
-        rain = gsm.ret_var("APCP_surface")  # (mm/h)
-        # 気温を二次元のndarrayで取り出す (K->℃)
-        tmp = gsm.ret_var("TMP_2maboveground", offset=-273.15)  # (℃)
-        # ファイルを閉じる
-        gsm.close_netcdf()
+    # 作図する品質（簡易版を先に描いて書き出し、通常版で置き換える）
+    tiers = tier_list(args.tier)
+    #
+    # 予報時間毎のデータ（簡易版と通常版を描く場合は読み込んだデータを使い回す）
+    frames = read_frames(fields,
+                         tinfo,
+                         tlab,
+                         sta,
+                         np.arange(fcst_str, fcst_end + 1, fcst_step))
+    if len(tiers) > 1:
+        frames = list(frames)
+    #
+    # 作図結果のキャッシュ
+    cache = FrameCache("gsm_stemp")
+    #
+    # 品質毎に作図する
+    for quick in tiers:
+        set_quick(quick)
+        # アニメーションの出力先（フレームを直接gif/mp4に変換する）
+        sink = AnimSink(gif_filename="anim_gsm_stemp_" + sta + ".gif",
+                        mp4_filename="anim_gsm_stemp_" + sta + ".mp4",
+                        delay="80",
+                        save_png=not opt_remove_png)
         #
-        # タイトルの設定
-        title = tlab + " GSM forecast, +" + str(
-            fcst_time) + "h (" + tlab_fcst + ")"
-        # 出力ファイル名の設定
-        hh = "{d:02d}".format(d=fcst_time)
-        output_filename = "map_gsm_stemp_" + sta + "_" + str(hh) + ".png"
-        # 作図
-        plotmap(sta, lons, lats, tmp, rain, title, output_filename)
-        output_filenames.append(output_filename)
-    # pngからgifアニメーションに変換
-    convert_png2gif(input_filenames=output_filenames,
-                    delay="80",
-                    output_filename="anim_gsm_stemp_" + sta + ".gif")
-    # pngからmp4アニメーションに変換
-    convert_png2mp4(input_file="map_gsm_stemp_" + sta + "_%02d.png",
-                    output_filename="anim_gsm_stemp_" + sta + ".mp4")
-    # 後処理
-    post(output_filenames)
+        # 予報時間を変えてplotmapを実行
+        for (title, output_filename, lons_1d, lats_1d, lons, lats, tmp,
+             rain) in frames:
+            # 作図（入力データが同じ場合はキャッシュを使う）
+            key = cache.key(sta,
+                            title,
+                            lons_1d,
+                            lats_1d,
+                            tmp,
+                            rain,
+                            quick=quick)
+            if not cache.get(key, output_filename, sink=sink):
+                plotmap(sta,
+                        lons,
+                        lats,
+                        tmp,
+                        rain,
+                        title,
+                        output_filename,
+                        sink=sink)
+                cache.put(key, output_filename, sink=sink)
+        # アニメーションを書き出す
+        sink.close()
+    # ファイルを閉じる
+    fields.close()
+    #
+    # 画像ファイルの書き出しが終わるまで待つ（エラーがあれば送出する）
+    get_encoder().close()
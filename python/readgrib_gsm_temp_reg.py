@@ -8,14 +8,33 @@ import matplotlib.ticker as mticker
 import cartopy.crs as ccrs
 from jmaloc import MapRegion
 from readgrib import ReadGSM
+from utils import FieldEngine
 from utils import ColUtils
-from utils import convert_png2gif
 from utils import parse_command
-from utils import post
+from utils import FrameCache
+from utils import savefig
+from utils import tier_list
+from utils import set_quick
+from utils import map_projection
+from utils import quicklook
+from utils import clabel
+from utils import opt_remove_png
+from utils import AnimSink
+from utils import grid_contour
+from utils import get_encoder
 import utils.common
 
 
-def plotmap(sta, lons, lats, uwnd, vwnd, tmp, rh, title, output_filename):
+def plotmap(sta,
+            lons,
+            lats,
+            uwnd,
+            vwnd,
+            tmp,
+            rh,
+            title,
+            output_filename,
+            sink=None):
     """作図を行う
 
     Parameters:
@@ -38,6 +57,8 @@ def plotmap(sta, lons, lats, uwnd, vwnd, tmp, rh, title, output_filename):
         タイトル
     output_filename: str
         出力ファイル名
+    sink: AnimSink
+        フレームを渡すアニメーションの出力先（Noneならpngファイルに保存）
     ----------
     """
     #
@@ -64,14 +85,18 @@ def plotmap(sta, lons, lats, uwnd, vwnd, tmp, rh, title, output_filename):
     # マップを作成
     fig = plt.figure(figsize=(10, 10))
     # cartopy呼び出し
-    ax = fig.add_subplot(1, 1, 1, projection=ccrs.PlateCarree())
+    ax = fig.add_subplot(1, 1, 1, projection=map_projection())
     ax.set_extent([lon_min, lon_max, lat_min, lat_max])  # 領域の限定
+    # 等値線描画の準備（格子と作図範囲が同じなら使い回す）
+    gcont = grid_contour(lons,
+                         lats, [lon_min, lon_max, lat_min, lat_max],
+                         ax=ax)
 
     # 経度、緯度線を描く
     xticks = np.arange(-180, 180, lon_step)
     yticks = np.arange(-90, 90, lat_step)
     gl = ax.gridlines(crs=ccrs.PlateCarree(),
-                      draw_labels=True,
+                      draw_labels=not quicklook(),
                       linewidth=1,
                       linestyle=':',
                       color='k',
@@ -90,28 +115,26 @@ def plotmap(sta, lons, lats, uwnd, vwnd, tmp, rh, title, output_filename):
         # 等温線を描く値のリスト（1Kごと）
         levels_t = np.arange(-90, 61, 1)
         # 等温線を描く
-        cr1 = ax.contour(lons,
-                         lats,
-                         tmp,
-                         levels=levels_t,
-                         colors='k',
-                         linestyles=['-', ':', ':'],
-                         linewidths=[1.8, 1.2, 1.2])
+        cr1 = gcont.contour(ax,
+                            tmp,
+                            levels=levels_t,
+                            colors='k',
+                            linestyles=['-', ':', ':'],
+                            linewidths=[1.8, 1.2, 1.2])
         # ラベルを付ける（3Kごと）
-        cr1.clabel(cr1.levels[::cstp], fontsize=12, fmt="%d")
+        clabel(cr1, cr1.levels[::cstp], fontsize=12, fmt="%d")
     else:
         # 等温線を描く値のリスト（3Kごと）
         levels_t = np.arange(-90, 61, 3)
         # 等温線を描く
-        cr2 = ax.contour(lons,
-                         lats,
-                         tmp,
-                         levels=levels_t,
-                         colors='k',
-                         linestyles='-',
-                         linewidths=1.8)
+        cr2 = gcont.contour(ax,
+                            tmp,
+                            levels=levels_t,
+                            colors='k',
+                            linestyles='-',
+                            linewidths=1.8)
         # ラベルを付ける
-        cr2.clabel(cr2.levels[::cstp], fontsize=12, fmt="%d")
+        clabel(cr2, cr2.levels[::cstp], fontsize=12, fmt="%d")
     #
     # 色テーブルの設定
     cutils = ColUtils('drywet')  # 色テーブルの選択
@@ -119,7 +142,7 @@ def plotmap(sta, lons, lats, uwnd, vwnd, tmp, rh, title, output_filename):
     # 相対湿度の陰影を付ける値をlevelsrにリストとして入れる
     levelsr = [60, 75, 80, 90, 100]
     # 陰影を描く
-    cs = ax.contourf(lons, lats, rh, levels=levelsr, cmap=cmap, extend='min')
+    cs = gcont.shade(ax, rh, levels=levelsr, cmap=cmap, extend='min')
     # カラーバーを付ける
     cbar = plt.colorbar(cs, orientation='horizontal', shrink=0.9, pad=0.05)
     cbar.set_label('RH (%)')
@@ -133,19 +156,76 @@ def plotmap(sta, lons, lats, uwnd, vwnd, tmp, rh, title, output_filename):
                  color='r',
                  length=5,
                  linewidth=1.5,
-                 sizes=dict(emptybarb=0.01, spacing=0.16, height=0.4))
+                 sizes=dict(emptybarb=0.01, spacing=0.16, height=0.4),
+                 transform=ccrs.PlateCarree())
     #
     #
     # タイトルを付ける
     plt.title(title, fontsize=20)
     # 図を保存
-    plt.savefig(output_filename, dpi=300, bbox_inches='tight')
+    savefig(output_filename, sink=sink)
     plt.close()
 
 
+def read_frames(fields, tinfo, tlab, sta, fcst_times, level):
+    """予報時間毎にデータを読み込む
+
+    Parameters:
+    ----------
+    fields: FieldEngine
+        データを取り出すFieldEngine
+    tinfo: pandas.Timestamp
+        予報時刻
+    tlab: str
+        タイトルに付ける予報時刻の文字列
+    sta: str
+        地点名
+    fcst_times: ndarray
+        予報時刻からの経過時間のリスト
+    level: int
+        気圧面（hPa）
+    ----------
+    Yields:
+    ----------
+    frame: tuple
+        タイトル、出力ファイル名、経度・緯度と作図に使うデータ
+    ----------
+    """
+    for fcst_time in fcst_times:
+        # fcst時刻
+        tinfo_fcst = tinfo + timedelta(hours=int(fcst_time))
+        tlab_fcst = tinfo_fcst.strftime("%m/%d %H UTC")
+        # 経度・緯度
+        lons_1d, lats_1d, lons, lats = fields.grid(fcst_time, "plev")
+        # 指定気圧面の東西風、南北風データを二次元のndarrayで取り出す
+        uwnd = fields.get("u_" + str(level), fcst_time)  # (m/s)
+        vwnd = fields.get("v_" + str(level), fcst_time)  # (m/s)
+        # 指定気圧面の気温データを二次元のndarrayで取り出す (K->℃)
+        tmp = fields.get("tc_" + str(level), fcst_time)  # (℃)
+        # 指定気圧面の相対湿度データを二次元のndarrayで取り出す ()
+        if int(level) >= 300:
+            rh = fields.get("rh_" + str(level), fcst_time)  # ()
+        else:
+            rh = np.zeros(tmp.shape)
+        # 指定気圧面の相対湿度データを二次元のndarrayで取り出す ()
+        #
+        # タイトルの設定
+        title = str(level) + "hPa " + tlab + " GSM forecast, +" + str(
+            fcst_time) + "h (" + tlab_fcst + ")"
+        # 出力ファイル名の設定
+        hh = "{d:02d}".format(d=fcst_time)
+        output_filename = "map_gsm_temp_" + str(
+            level) + "hPa_" + sta + "_" + str(hh) + ".png"
+        yield (title, output_filename, lons_1d, lats_1d, lons, lats, uwnd,
+               vwnd, tmp, rh)
+
+
 if __name__ == '__main__':
     # オプションの読み込み
-    args = parse_command(sys.argv, opt_lev=True)
+    args = parse_command(sys.argv,
+                         opt_lev=True,
+                         opt_tier=True,
+                         opt_proj=True)
     # 予報時刻, 作図する地域の指定
     fcst_date = args.fcst_date
     sta = args.sta
@@ -163,45 +243,63 @@ if __name__ == '__main__':
     #
     # ReadGSM初期化
     gsm = ReadGSM(tsel, file_dir, "plev")
+    # 変数を名前で取り出す（読み込んだ変数・求めた変数を使い回す）
+    fields = FieldEngine("GSM", tsel, {"plev": gsm})
     #
-    # fcst_timeを変えてplotmapを実行
-    output_filenames = []
-    for fcst_time in np.arange(fcst_str, fcst_end + 1, fcst_step):
-        # fcst_timeを設定
-        gsm.set_fcst_time(fcst_time)
-        # fcst時刻
-        tinfo_fcst = tinfo + timedelta(hours=int(fcst_time))
-        tlab_fcst = tinfo_fcst.strftime("%m/%d %H UTC")
-        # NetCDFデータ読み込み
-        lons_1d, lats_1d, lons, lats = gsm.readnetcdf()
-        # 指定気圧面の東西風、南北風データを二次元のndarrayで取り出す
-        uwnd = gsm.ret_var("UGRD_" + str(level) + "mb")  # (m/s)
-        vwnd = gsm.ret_var("VGRD_" + str(level) + "mb")  # (m/s)
-        # 指定気圧面の気温データを二次元のndarrayで取り出す (K->℃)
-        tmp = gsm.ret_var("TMP_" + str(level) + "mb", offset=-273.15)  # (℃)
-        # 指定気圧面の相対湿度データを二次元のndarrayで取り出す ()
-        if int(level) >= 300:
-            rh = gsm.ret_var("RH_" + str(level) + "mb")  # ()
-        else:
-            rh = np.zeros(tmp.shape)
-        # 指定気圧面の相対湿度データを二次元のndarrayで取り出す ()
-        # ファイルを閉じる
-        gsm.close_netcdf()
+    # 作図する品質（簡易版を先に描いて書き出し、通常版で置き換える）
+    tiers = tier_list(args.tier)
+    #
+    # 予報時間毎のデータ（簡易版と通常版を描く場合は読み込んだデータを使い回す）
+    frames = read_frames(fields,
+                         tinfo,
+                         tlab,
+                         sta,
+                         np.arange(fcst_str, fcst_end + 1, fcst_step),
+                         level)
+    if len(tiers) > 1:
+        frames = list(frames)
+    #
+    # 作図結果のキャッシュ
+    cache = FrameCache("gsm_temp")
+    #
+    # 品質毎に作図する
+    for quick in tiers:
+        set_quick(quick)
+        # アニメーションの出力先（フレームを直接gif/mp4に変換する）
+        sink = AnimSink(gif_filename="anim_gsm_temp_" + str(level) + "hPa_" +
+                        sta + ".gif",
+                        delay="80",
+                        save_png=not opt_remove_png)
         #
-        # タイトルの設定
-        title = str(level) + "hPa " + tlab + " GSM forecast, +" + str(
-            fcst_time) + "h (" + tlab_fcst + ")"
-        # 出力ファイル名の設定
-        hh = "{d:02d}".format(d=fcst_time)
-        output_filename = "map_gsm_temp_" + str(
-            level) + "hPa_" + sta + "_" + str(hh) + ".png"
-        # 作図
-        plotmap(sta, lons, lats, uwnd, vwnd, tmp, rh, title, output_filename)
-        output_filenames.append(output_filename)
-    # pngからgifアニメーションに変換
-    convert_png2gif(input_filenames=output_filenames,
-                    delay="80",
-                    output_filename="anim_gsm_temp_" + str(level) + "hPa_" +
-                    sta + ".gif")
-    # 後処理
-    post(output_filenames)
+        # 予報時間を変えてplotmapを実行
+        for (title, output_filename, lons_1d, lats_1d, lons, lats, uwnd, vwnd,
+             tmp, rh) in frames:
+            # 作図（入力データが同じ場合はキャッシュを使う）
+            key = cache.key(sta,
+                            title,
+                            lons_1d,
+                            lats_1d,
+                            uwnd,
+                            vwnd,
+                            tmp,
+                            rh,
+                            quick=quick)
+            if not cache.get(key, output_filename, sink=sink):
+                plotmap(sta,
+                        lons,
+                        lats,
+                        uwnd,
+                        vwnd,
+                        tmp,
+                        rh,
+                        title,
+                        output_filename,
+                        sink=sink)
+                cache.put(key, output_filename, sink=sink)
+        # アニメーションを書き出す
+        sink.close()
+    # ファイルを閉じる
+    fields.close()
+    #
+    # 画像ファイルの書き出しが終わるまで待つ（エラーがあれば送出する）
+    get_encoder().close()
@@ -1,16 +1,19 @@
 #!/opt/local/bin/python3
 import pandas as pd
 import numpy as np
-import math
+import os
+import re
 import sys
 import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-import matplotlib.ticker as mticker
 from jmaloc import AmedasStation
 from readgrib import ReadGSM
 from datetime import timedelta
 from utils import parse_command
-from utils import get_gridloc
+from utils import get_gridlocs
+from utils import StationWeights
+from utils import Meteogram
+from utils import render_meteograms
+from utils import get_encoder
 import utils.common
 
 plt.rcParams['xtick.direction'] = 'in'  # x軸目盛線を内側
@@ -27,6 +30,9 @@ plt_barbs = True  # true: 矢羽を描く
 # barbs_kt = False # true: kt, false: m/s
 barbs_kt = True  # true: kt, false: m/s
 
+# --sta allの場合に全てのアメダス地点の時系列図を作成する
+sta_all = "all"
+
 
 def plotmap(index, mslp, prep, temp, uwnd, vwnd, relh, cfrl, cfrm, cfrh, cfrt,
             title, output_filename):
@@ -61,134 +67,18 @@ def plotmap(index, mslp, prep, temp, uwnd, vwnd, relh, cfrl, cfrm, cfrh, cfrt,
     ----------
     """
     #
-    # 作図
-    # (0) プロットエリアの定義
-    fig = plt.figure(figsize=(10, 10))
-    ax1 = fig.add_subplot(3, 1, 1)
-    # タイトルを付ける
-    plt.title(title, fontsize=20)
+    # 作図（図のレイアウトはutils.Meteogramで作成する）
+    meteogram = Meteogram(index, plt_barbs=plt_barbs, barbs_kt=barbs_kt)
+    meteogram.update(mslp, prep, temp, uwnd, vwnd, relh, cfrl, cfrm, cfrh,
+                     cfrt, title)
+    # ファイルへの書き出し
+    meteogram.savefig(output_filename)
+    meteogram.close()
 
-    # (1) 降水量と気温
-    # (1-1) 降水量(mm)
-    ax1.set_ylim([0, math.ceil(prep.max() + math.fmod(prep.max(), 10)) + 1])
-    ax1.bar(index,
-            prep,
-            color='b',
-            width=0.03,
-            alpha=0.4,
-            label='Precipitation')
-    ax1.set_ylabel('Precipitation (mm)')
-    # 凡例
-    ax1.legend(loc='upper left')
-    #
-    # (1-2) 気温（K）
-    ax2 = ax1.twinx()  # 2つのプロットを関連付ける
-    ax2.set_ylim([math.floor(temp.min() - 1), math.ceil(temp.max()) + 2])
-    ax2.plot(index, temp, color='r', label='Temperature')
-    ax2.set_ylabel('Temperature (K)')
-    # 凡例
-    ax2.legend(loc='upper right')
-    #
-    # (2) RH（%）& wind
-    # (2-1) RH（%）
-    ax3 = fig.add_subplot(3, 1, 2)
-    ax3.set_ylim([0, 100])
-    ax3.plot(index, relh, color='b', label='RH')
-    ax3.set_ylabel('RH (%)')
-    # 凡例
-    ax3.legend(loc='best')
-    #
-    # (2-2) 矢羽
-    y = 50
-    if plt_barbs:
-        if barbs_kt:
-            # kt
-            ax3.barbs(index,
-                      y,
-                      uwnd,
-                      vwnd,
-                      color='k',
-                      length=5,
-                      sizes=dict(emptybarb=0.001),
-                      barb_increments=dict(half=2.57222,
-                                           full=5.14444,
-                                           flag=25.7222))
-        else:
-            # m/s
-            ax3.barbs(index,
-                      y,
-                      uwnd,
-                      vwnd,
-                      color='k',
-                      length=5,
-                      sizes=dict(emptybarb=0.001))
-    #
-    # (3) 地表気圧と気温
-    # (3-1) 地表気圧（hPa）
-    ax5 = fig.add_subplot(3, 1, 3)
-    #
-    ax5.set_ylim([
-        math.floor(mslp.min() - math.fmod(mslp.min(), 2)) - 1,
-        math.ceil(mslp.max()) + 1
-    ])
-    ax5.plot(index, mslp, color='k', label='Pressure')
-    ax5.set_ylabel('pressure (hPa)')
-    #
-    # 凡例
-    ax5.legend(loc='upper left')
-    #
-    # (3-2) 気温（K）
-    ax6 = ax5.twinx()  # 2つのプロットを関連付ける
-    ax6.set_ylim([0, 100])
-    ind_l = index - timedelta(minutes=20)
-    ind_m = index - timedelta(minutes=5)
-    ind_h = index + timedelta(minutes=10)
-    ind_t = index + timedelta(minutes=25)
-    ax6.bar(ind_l, cfrl, color='r', width=0.01, alpha=0.4, label='low')
-    ax6.bar(ind_m, cfrm, color='g', width=0.01, alpha=0.4, label='middle')
-    ax6.bar(ind_h, cfrh, color='b', width=0.01, alpha=0.4, label='high')
-    ax6.bar(ind_t, cfrt, color='k', width=0.01, alpha=0.4, label='total')
-    ax6.set_ylabel('Cloud Cover (%)')
-    # 凡例
-    ax6.legend(loc='lower left')
-    #
-    # y軸の目盛り
-    ax1.yaxis.set_major_locator(mticker.AutoLocator())
-    ax1.yaxis.set_minor_locator(mticker.AutoMinorLocator())
-    ax2.yaxis.set_major_locator(mticker.AutoLocator())
-    ax2.yaxis.set_minor_locator(mticker.AutoMinorLocator())
-    ax3.yaxis.set_major_locator(mticker.AutoLocator())
-    ax3.yaxis.set_minor_locator(mticker.AutoMinorLocator())
-    ax5.yaxis.set_major_locator(mticker.AutoLocator())
-    ax5.yaxis.set_minor_locator(mticker.AutoMinorLocator())
-    ax6.yaxis.set_major_locator(mticker.AutoLocator())
-    ax6.yaxis.set_minor_locator(mticker.AutoMinorLocator())
-    #
-    # x軸の目盛り
-    ax1.xaxis.set_major_locator(mticker.AutoLocator())
-    ax1.xaxis.set_minor_locator(mticker.AutoMinorLocator())
-    ax3.xaxis.set_major_locator(mticker.AutoLocator())
-    ax3.xaxis.set_minor_locator(mticker.AutoMinorLocator())
-    ax5.xaxis.set_major_locator(mticker.AutoLocator())
-    ax5.xaxis.set_minor_locator(mticker.AutoMinorLocator())
-    #
-    ax1.xaxis.set_major_formatter(mticker.NullFormatter())
-    ax1.xaxis.set_minor_formatter(mticker.NullFormatter())
-    ax3.xaxis.set_major_formatter(mticker.NullFormatter())
-    ax3.xaxis.set_minor_formatter(mticker.NullFormatter())
-    #
-    ax5.xaxis.set_major_locator(mticker.FixedLocator(
-        ax5.get_xticks().tolist()))
-    ax5.set_xticklabels(ax5.get_xticklabels(), rotation=70, size="small")
-    ax5.xaxis.set_major_formatter(mdates.DateFormatter('%m/%d %HUTC'))
-    ax5.xaxis.set_minor_formatter(mticker.NullFormatter())
-    #
-    # プロット範囲の調整
-    plt.subplots_adjust(top=None, bottom=0.15, wspace=0.25, hspace=0.15)
 
-    # (4) ファイルへの書き出し
-    plt.savefig(output_filename, dpi=300, bbox_inches='tight')
-    plt.close()
+def station_filename(staid, en_name):
+    """全地点を作図する場合の地点毎のファイル名（地点番号_英語の地点名）"""
+    return staid + "_" + re.sub(r"[^0-9A-Za-z-]", "_", en_name) + ".png"
 
 
 if __name__ == '__main__':
@@ -213,8 +103,14 @@ if __name__ == '__main__':
     #
     # アメダス地点の位置を取得
     amedas = AmedasStation()
-    rlon, rlat = amedas.get_staloc(en_name=sta)
-    print(sta, ": lon, lat = ", rlon, rlat)
+    if sta == sta_all:
+        # 全てのアメダス地点
+        staids, en_names, rlon, rlat = amedas.get_all_staloc()
+    else:
+        rlon, rlat = amedas.get_staloc(en_name=sta)
+        print(sta, ": lon, lat = ", rlon, rlat)
+        staids, en_names = [sta], [sta]
+        rlon, rlat = np.array([rlon]), np.array([rlat])
     #
     #
     # 時系列データの準備
@@ -236,44 +132,53 @@ if __name__ == '__main__':
         gsm.set_fcst_time(fcst_time)
         # NetCDFデータ読み込み
         lons_1d, lats_1d, lons, lats = gsm.readnetcdf()
-        # グリッド番号の取得
+        # 地点への内挿の重みの取得（全ての地点をまとめて求め、保存して使い回す）
         if fcst_time == fcst_str:
-            ilon = get_gridloc(lons_1d, rlon)
-            ilat = get_gridloc(lats_1d, rlat)
-            print("lon grid, lat grid, lon, lat = ", ilon, ilat,
-                  np.array(lons_1d)[ilon],
-                  np.array(lats_1d)[ilat])
+            # 格子の範囲外の地点は除く
+            inside = ((rlon >= np.min(lons_1d)) & (rlon <= np.max(lons_1d)) &
+                      (rlat >= np.min(lats_1d)) & (rlat <= np.max(lats_1d)))
+            if sta == sta_all:
+                staids = np.asarray(staids)[inside]
+                en_names = np.asarray(en_names)[inside]
+                rlon, rlat = rlon[inside], rlat[inside]
+            weights = StationWeights("gsm", lons_1d, lats_1d, rlon, rlat)
+            if sta != sta_all:
+                ilon = get_gridlocs(lons_1d, rlon)
+                ilat = get_gridlocs(lats_1d, rlat)
+                print("lon grid, lat grid, lon, lat = ", ilon[0], ilat[0],
+                      np.array(lons_1d)[ilon[0]],
+                      np.array(lats_1d)[ilat[0]])
         # 変数取り出し
         # 海面更生気圧を二次元のndarrayで取り出す
         mslp = gsm.ret_var("PRMSL_meansealevel", fact=0.01)  # (hPa)
-        mslp_add.append(mslp[ilat, ilon])
+        mslp_add.append(weights.sample(mslp))
         # 降水量を二次元のndarrayで取り出す
         rain = gsm.ret_var("APCP_surface")  # (mm/h)
-        rain_add.append(rain[ilat, ilon])
+        rain_add.append(weights.sample(rain))
         # 気温を二次元のndarrayで取り出す (K->℃)
         temp = gsm.ret_var("TMP_2maboveground", offset=-273.15)  # (℃)
-        temp_add.append(temp[ilat, ilon])
+        temp_add.append(weights.sample(temp))
         # 東西風を二次元のndarrayで取り出す
         uwnd = gsm.ret_var("UGRD_10maboveground")  # (m/s)
-        uwnd_add.append(uwnd[ilat, ilon])
+        uwnd_add.append(weights.sample(uwnd))
         # 南北風を二次元のndarrayで取り出す
         vwnd = gsm.ret_var("VGRD_10maboveground")  # (m/s)
-        vwnd_add.append(vwnd[ilat, ilon])
+        vwnd_add.append(weights.sample(vwnd))
         # 相対湿度を二次元のndarrayで取り出す
         relh = gsm.ret_var("RH_2maboveground")  # ()
-        relh_add.append(relh[ilat, ilon])
+        relh_add.append(weights.sample(relh))
         # 下層雲量を二次元のndarrayで取り出す
         cfrl = gsm.ret_var("LCDC_surface")  # ()
-        cfrl_add.append(cfrl[ilat, ilon])
+        cfrl_add.append(weights.sample(cfrl))
         # 中層雲量を二次元のndarrayで取り出す
         cfrm = gsm.ret_var("MCDC_surface")  # ()
-        cfrm_add.append(cfrm[ilat, ilon])
+        cfrm_add.append(weights.sample(cfrm))
         # 上層雲量を二次元のndarrayで取り出す
         cfrh = gsm.ret_var("HCDC_surface")  # ()
-        cfrh_add.append(cfrh[ilat, ilon])
+        cfrh_add.append(weights.sample(cfrh))
         # 全雲量を二次元のndarrayで取り出す
         cfrt = gsm.ret_var("TCDC_surface")  # ()
-        cfrt_add.append(cfrt[ilat, ilon])
+        cfrt_add.append(weights.sample(cfrt))
         # ファイルを閉じる
         gsm.close_netcdf()
         #
@@ -286,19 +191,58 @@ if __name__ == '__main__':
         fcst_end) + "_" + sta + ".png"
     nt = len(index_add)
 
+    # (時刻, 地点)の2次元のndarrayにする
     index = np.vstack(index_add).reshape(nt)
-    mslp = np.vstack(mslp_add).reshape(nt)
-    rain = np.vstack(rain_add).reshape(nt)
-    temp = np.vstack(temp_add).reshape(nt)
-    uwnd = np.vstack(uwnd_add).reshape(nt)
-    vwnd = np.vstack(vwnd_add).reshape(nt)
-    relh = np.vstack(relh_add).reshape(nt)
-    cfrl = np.vstack(cfrl_add).reshape(nt)
-    cfrm = np.vstack(cfrm_add).reshape(nt)
-    cfrh = np.vstack(cfrh_add).reshape(nt)
-    cfrt = np.vstack(cfrt_add).reshape(nt)
+    mslp = np.vstack(mslp_add)
+    rain = np.vstack(rain_add)
+    temp = np.vstack(temp_add)
+    uwnd = np.vstack(uwnd_add)
+    vwnd = np.vstack(vwnd_add)
+    relh = np.vstack(relh_add)
+    cfrl = np.vstack(cfrl_add)
+    cfrm = np.vstack(cfrm_add)
+    cfrh = np.vstack(cfrh_add)
+    cfrt = np.vstack(cfrt_add)
     print(rain.shape)
     #
     # 作図
-    plotmap(index, mslp, rain, temp, uwnd, vwnd, relh, cfrl, cfrm, cfrh, cfrt,
-            title, output_filename)
+    if sta == sta_all:
+        # 地点毎のファイルはディレクトリにまとめる
+        output_dir = os.path.splitext(output_filename)[0]
+        os.makedirs(output_dir, exist_ok=True)
+        output_filenames = [
+            os.path.join(output_dir, station_filename(staid, en_name))
+            for staid, en_name in zip(staids, en_names)
+        ]
+        # 地点毎のタイトル（地点名と地点番号を付ける）
+        titles = [
+            title + " " + str(en_name) + " (" + str(staid) + ")"
+            for staid, en_name in zip(staids, en_names)
+        ]
+        series = {
+            "mslp": mslp,
+            "prep": rain,
+            "temp": temp,
+            "uwnd": uwnd,
+            "vwnd": vwnd,
+            "relh": relh,
+            "cfrl": cfrl,
+            "cfrm": cfrm,
+            "cfrh": cfrh,
+            "cfrt": cfrt
+        }
+        # 地点を分けて複数のプロセスで作図する
+        num = render_meteograms(index,
+                                series,
+                                titles,
+                                output_filenames,
+                                plt_barbs=plt_barbs,
+                                barbs_kt=barbs_kt)
+        print("write: ", output_dir, num)
+    else:
+        plotmap(index, mslp[:, 0], rain[:, 0], temp[:, 0], uwnd[:, 0],
+                vwnd[:, 0], relh[:, 0], cfrl[:, 0], cfrm[:, 0], cfrh[:, 0],
+                cfrt[:, 0], title, output_filename)
+    #
+    # 画像ファイルの書き出しが終わるまで待つ（エラーがあれば送出する）
+    get_encoder().close()
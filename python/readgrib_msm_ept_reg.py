@@ -8,15 +8,33 @@ import matplotlib.ticker as mticker
 import cartopy.crs as ccrs
 from jmaloc import MapRegion
 from readgrib import ReadMSM
+from utils import FieldEngine
 from utils import ColUtils
-from utils import mktheta
-from utils import convert_png2gif
 from utils import parse_command
-from utils import post
+from utils import FrameCache
+from utils import savefig
+from utils import tier_list
+from utils import set_quick
+from utils import map_projection
+from utils import quicklook
+from utils import clabel
+from utils import opt_remove_png
+from utils import AnimSink
+from utils import grid_contour
+from utils import get_encoder
 import utils.common
 
 
-def plotmap(sta, lons, lats, z50, the85, the50, dthdz, title, output_filename):
+def plotmap(sta,
+            lons,
+            lats,
+            z50,
+            the85,
+            the50,
+            dthdz,
+            title,
+            output_filename,
+            sink=None):
     """作図を行う
 
     Parameters:
@@ -39,6 +57,8 @@ def plotmap(sta, lons, lats, z50, the85, the50, dthdz, title, output_filename):
         タイトル
     output_filename: str
         出力ファイル名
+    sink: AnimSink
+        フレームを渡すアニメーションの出力先（Noneならpngファイルに保存）
     ----------
     """
     #
@@ -59,14 +79,18 @@ def plotmap(sta, lons, lats, z50, the85, the50, dthdz, title, output_filename):
     # マップを作成
     fig = plt.figure(figsize=(10, 10))
     # cartopy呼び出し
-    ax = fig.add_subplot(1, 1, 1, projection=ccrs.PlateCarree())
+    ax = fig.add_subplot(1, 1, 1, projection=map_projection())
     ax.set_extent([lon_min, lon_max, lat_min, lat_max])  # 領域の限定
+    # 等値線描画の準備（格子と作図範囲が同じなら使い回す）
+    gcont = grid_contour(lons,
+                         lats, [lon_min, lon_max, lat_min, lat_max],
+                         ax=ax)
 
     # 経度、緯度線を描く
     xticks = np.arange(-180, 180, lon_step)
     yticks = np.arange(-90, 90, lat_step)
     gl = ax.gridlines(crs=ccrs.PlateCarree(),
-                      draw_labels=True,
+                      draw_labels=not quicklook(),
                       linewidth=1,
                       linestyle=':',
                       color='k',
@@ -84,15 +108,14 @@ def plotmap(sta, lons, lats, z50, the85, the50, dthdz, title, output_filename):
     # 3Kごとに等値線を描く、15Kごとにラベルを付ける
     levels_t = range(210, 390, 3)
     # 等温位線をひく
-    cr1 = ax.contour(lons,
-                     lats,
-                     the85,
-                     levels=levels_t,
-                     colors='k',
-                     linewidths=[1.2, 0.8, 0.8, 0.8, 0.8])
+    cr1 = gcont.contour(ax,
+                        the85,
+                        levels=levels_t,
+                        colors='k',
+                        linewidths=[1.2, 0.8, 0.8, 0.8, 0.8])
     # ラベルを付ける
     try:
-        cr1.clabel(cr1.levels[::cstp], fontsize=12, fmt="%d")  # ラベル
+        clabel(cr1, cr1.levels[::cstp], fontsize=12, fmt="%d")  # ラベル
     except Exception as e:
         print(str(e))
     #
@@ -101,15 +124,14 @@ def plotmap(sta, lons, lats, z50, the85, the50, dthdz, title, output_filename):
     # 60mごとに等値線を描く、300mごとにラベルを付ける
     levels_z = range(4800, 6000, 60)
     # 等高線を描く
-    cr2 = ax.contour(lons,
-                     lats,
-                     z50,
-                     levels=levels_z,
-                     colors='gray',
-                     linewidths=[1.2, 0.8, 0.8, 0.8, 0.8])
+    cr2 = gcont.contour(ax,
+                        z50,
+                        levels=levels_z,
+                        colors='gray',
+                        linewidths=[1.2, 0.8, 0.8, 0.8, 0.8])
     # ラベルを付ける
     try:
-        cr2.clabel(cr2.levels[::cstp], fontsize=12, fmt="%d")  # ラベル
+        clabel(cr2, cr2.levels[::cstp], fontsize=12, fmt="%d")  # ラベル
     except Exception as e:
         print(str(e))
     #
@@ -121,12 +143,12 @@ def plotmap(sta, lons, lats, z50, the85, the50, dthdz, title, output_filename):
     # 陰影を描く値のリスト
     levels_r = [-9, -6, -3, 0, 3, 6, 9]
     # 陰影を描く
-    cs = ax.contourf(lons,
-                     lats,
+    cs = gcont.shade(ax,
                      dthdz,
                      levels=levels_r,
                      cmap=cmap,
-                     extend='both')
+                     extend='both',
+                     raster=True)
     # カラーバーを付ける
     cbar = plt.colorbar(cs, orientation='horizontal', shrink=0.9, pad=0.05)
     cbar.set_label(
@@ -135,15 +157,62 @@ def plotmap(sta, lons, lats, z50, the85, the50, dthdz, title, output_filename):
     # タイトルを付ける
     plt.title(title, fontsize=20)
     # 図を保存
-    plt.savefig(output_filename, dpi=300, bbox_inches='tight')
+    savefig(output_filename, sink=sink)
     plt.close()
 
 
+def read_frames(fields, tinfo, tlab, sta, fcst_times):
+    """予報時間毎にデータを読み込む
+
+    Parameters:
+    ----------
+    fields: FieldEngine
+        データを取り出すFieldEngine
+    tinfo: pandas.Timestamp
+        予報時刻
+    tlab: str
+        タイトルに付ける予報時刻の文字列
+    sta: str
+        地点名
+    fcst_times: ndarray
+        予報時刻からの経過時間のリスト
+    ----------
+    Yields:
+    ----------
+    frame: tuple
+        タイトル、出力ファイル名、経度・緯度と作図に使うデータ
+    ----------
+    """
+    for fcst_time in fcst_times:
+        # fcst時刻
+        tinfo_fcst = tinfo + timedelta(hours=int(fcst_time))
+        tlab_fcst = tinfo_fcst.strftime("%m/%d %H UTC")
+        # 経度・緯度
+        lons_1d, lats_1d, lons, lats = fields.grid(fcst_time, "plev")
+        # 変数取り出し
+        # 500 hPa ジオポテンシャル高度データを二次元のndarrayで取り出す
+        z50 = fields.get("z_500", fcst_time)  # (m)
+        #
+        # 850 hPa、500 hPaの相当温位（気温、相対湿度から求める）
+        the85 = fields.get("thetae_850", fcst_time)  # (K)
+        the50 = fields.get("thetae_500", fcst_time)  # (K)
+        #
+        # 500 hPaの相当温位から850 hPaの相当温位を引いて安定度を調べる
+        dthdz = the50 - the85
+        #
+        # タイトルの設定
+        title = tlab + " MSM forecast, +" + str(
+            fcst_time) + "h (" + tlab_fcst + ")"
+        # 出力ファイル名の設定
+        hh = "{d:02d}".format(d=fcst_time)
+        output_filename = "map_msm_ept_" + sta + "_" + str(hh) + ".png"
+        yield (title, output_filename, lons_1d, lats_1d, lons, lats, z50,
+               the85, the50, dthdz)
+
+
 if __name__ == '__main__':
-    pr85 = 85000.0  # pressure (Pa) for 850 hPa
-    pr50 = 50000.0  # pressure (Pa) for 500 hPa
     # オプションの読み込み
-    args = parse_command(sys.argv)
+    args = parse_command(sys.argv, opt_tier=True, opt_proj=True)
     # 予報時刻, 作図する地域の指定
     fcst_date = args.fcst_date
     sta = args.sta
@@ -160,52 +229,53 @@ if __name__ == '__main__':
     #
     # ReadMSM初期化
     msm = ReadMSM(tsel, file_dir, "plev")
+    # 変数を名前で取り出す（読み込んだ変数・求めた変数を使い回す）
+    fields = FieldEngine("MSM", tsel, {"plev": msm})
     #
-    # fcst_timeを変えてplotmapを実行
-    output_filenames = []
-    for fcst_time in np.arange(fcst_str, fcst_end + 1, fcst_step):
-        # fcst_timeを設定
-        msm.set_fcst_time(fcst_time)
-        # fcst時刻
-        tinfo_fcst = tinfo + timedelta(hours=int(fcst_time))
-        tlab_fcst = tinfo_fcst.strftime("%m/%d %H UTC")
-        # NetCDFデータ読み込み
-        lons_1d, lats_1d, lons, lats = msm.readnetcdf()
-        # 変数取り出し
-        # 850 hPa 気温データを二次元のndarrayで取り出す
-        t85 = msm.ret_var("TMP_850mb")  # (K)
-        # 500 hPa 気温データを二次元のndarrayで取り出す
-        t50 = msm.ret_var("TMP_500mb")  # (K)
-        # 850 hPa 相対湿度データを二次元のndarrayで取り出す
-        rh85 = msm.ret_var("RH_850mb")  # ()
-        # 500 hPa 相対湿度データを二次元のndarrayで取り出す
-        rh50 = msm.ret_var("RH_500mb")  # ()
-        # 500 hPa ジオポテンシャル高度データを二次元のndarrayで取り出す
-        z50 = msm.ret_var("HGT_500mb")  # (m)
-        #
-        # 850 hPaの相当温位と飽和相当温位を求める
-        the85, thes85 = mktheta(pr85, t85, rh85)
-        #
-        # 500 hPaの相当温位と飽和相当温位を求める
-        the50, thes50 = mktheta(pr50, t50, rh50)
-        #
-        # 500 hPaの飽和相当温位から850 hPaの相当温位を引いて安定度を調べる
-        dthdz = the50 - the85
-        # ファイルを閉じる
-        msm.close_netcdf()
+    # 作図する品質（簡易版を先に描いて書き出し、通常版で置き換える）
+    tiers = tier_list(args.tier)
+    #
+    # 予報時間毎のデータ（簡易版と通常版を描く場合は読み込んだデータを使い回す）
+    frames = read_frames(fields,
+                         tinfo,
+                         tlab,
+                         sta,
+                         np.arange(fcst_str, fcst_end + 1, fcst_step))
+    if len(tiers) > 1:
+        frames = list(frames)
+    #
+    # 作図結果のキャッシュ
+    cache = FrameCache("msm_ept")
+    #
+    # 品質毎に作図する
+    for quick in tiers:
+        set_quick(quick)
+        # アニメーションの出力先（フレームを直接gif/mp4に変換する）
+        sink = AnimSink(gif_filename="anim_msm_ept_" + sta + ".gif",
+                        delay="80",
+                        save_png=not opt_remove_png)
         #
-        # タイトルの設定
-        title = tlab + " MSM forecast, +" + str(
-            fcst_time) + "h (" + tlab_fcst + ")"
-        # 出力ファイル名の設定
-        hh = "{d:02d}".format(d=fcst_time)
-        output_filename = "map_msm_ept_" + sta + "_" + str(hh) + ".png"
-        plotmap(sta, lons, lats, z50, the85, the50, dthdz, title,
-                output_filename)
-        output_filenames.append(output_filename)
-    # pngからgifアニメーションに変換
-    convert_png2gif(input_filenames=output_filenames,
-                    delay="80",
-                    output_filename="anim_msm_ept_" + sta + ".gif")
-    # 後処理
-    post(output_filenames)
+        # 予報時間を変えてplotmapを実行
+        for (title, output_filename, lons_1d, lats_1d, lons, lats, z50, the85,
+             the50, dthdz) in frames:
+            # 作図（入力データが同じ場合はキャッシュを使う）
+            key = cache.key(sta,
+                            title,
+                            lons_1d,
+                            lats_1d,
+                            z50,
+                            the85,
+                            the50,
+                            dthdz,
+                            quick=quick)
+            if not cache.get(key, output_filename, sink=sink):
+                plotmap(sta, lons, lats, z50, the85, the50, dthdz, title,
+                        output_filename, sink=sink)
+                cache.put(key, output_filename, sink=sink)
+        # アニメーションを書き出す
+        sink.close()
+    # ファイルを閉じる
+    fields.close()
+    #
+    # 画像ファイルの書き出しが終わるまで待つ（エラーがあれば送出する）
+    get_encoder().close()
@@ -1,4 +1,5 @@
 #!/opt/local/bin/python3
+import os
 import pandas as pd
 import numpy as np
 import math
@@ -9,18 +10,30 @@ import matplotlib.ticker as mticker
 import cartopy.crs as ccrs
 from jmaloc import MapRegion
 from readgrib import ReadMSM
+from utils import FieldEngine
 from utils import ColUtils
-from utils import convert_png2gif
-from utils import convert_png2mp4
 from utils import parse_command
-from utils import post
+from utils import FrameCache
+from utils import savefig
+from utils import tier_list
+from utils import set_quick
+from utils import map_projection
+from utils import quicklook
+from utils import clabel
+from utils import opt_remove_png
+from utils import AnimSink
+from utils import grid_contour
+from utils import get_encoder
+from utils import GeoJSONLayers
 import utils.common
 
 opt_stmp = False  # 等温線を引く（-2、2℃）
 
+opt_geojson = False  # 等圧線・等温線・降水量の陰影をGeoJSONでも書き出す
+
 
 def plotmap(sta, lons, lats, mslp, rain, tmp, uwnd, vwnd, title,
-            output_filename):
+            output_filename, sink=None):
     """作図を行う
 
     Parameters:
@@ -41,6 +54,8 @@ def plotmap(sta, lons, lats, mslp, rain, tmp, uwnd, vwnd, title,
         タイトル
     output_filename: str
         出力ファイル名
+    sink: AnimSink
+        フレームを渡すアニメーションの出力先（Noneならpngファイルに保存）
     ----------
     """
     #
@@ -67,14 +82,18 @@ def plotmap(sta, lons, lats, mslp, rain, tmp, uwnd, vwnd, title,
     # マップを作成
     fig = plt.figure(figsize=(10, 10))
     # cartopy呼び出し
-    ax = fig.add_subplot(1, 1, 1, projection=ccrs.PlateCarree())
+    ax = fig.add_subplot(1, 1, 1, projection=map_projection())
     ax.set_extent([lon_min, lon_max, lat_min, lat_max])  # 領域の限定
+    # 等値線描画の準備（格子と作図範囲が同じなら使い回す）
+    gcont = grid_contour(lons,
+                         lats, [lon_min, lon_max, lat_min, lat_max],
+                         ax=ax)
 
     # 経度、緯度線を描く
     xticks = np.arange(-180, 180, lon_step)
     yticks = np.arange(-90, 90, lat_step)
     gl = ax.gridlines(crs=ccrs.PlateCarree(),
-                      draw_labels=True,
+                      draw_labels=not quicklook(),
                       linewidth=1,
                       linestyle=':',
                       color='k',
@@ -92,51 +111,47 @@ def plotmap(sta, lons, lats, mslp, rain, tmp, uwnd, vwnd, title,
         levels1 = range(math.floor(mslp.min() - math.fmod(mslp.min(), 2)),
                         math.ceil(mslp.max()) + 1, 1)
         # 等圧線をひく
-        cr1 = ax.contour(lons,
-                         lats,
-                         mslp,
-                         levels=levels1,
-                         colors='k',
-                         linestyles=['-', ':'],
-                         linewidths=1.2)
+        cr1 = gcont.contour(ax,
+                            mslp,
+                            levels=levels1,
+                            colors='k',
+                            linestyles=['-', ':'],
+                            linewidths=1.2)
         # ラベルを付ける
-        cr1.clabel(cr1.levels[::cstp], fontsize=12, fmt="%d")
+        clabel(cr1, cr1.levels[::cstp], fontsize=12, fmt="%d")
     else:
         # 等圧線をひく間隔(2hPaごと)をlevelsにリストとして入れる
         levels2 = range(math.floor(mslp.min() - math.fmod(mslp.min(), 2)),
                         math.ceil(mslp.max()) + 1, 2)
         # 等圧線をひく
-        cr2 = ax.contour(lons,
-                         lats,
-                         mslp,
-                         levels=levels2,
-                         colors='k',
-                         linewidths=1.2)
+        cr2 = gcont.contour(ax,
+                            mslp,
+                            levels=levels2,
+                            colors='k',
+                            linewidths=1.2)
         # ラベルを付ける
-        cr2.clabel(cr2.levels[::cstp], fontsize=12, fmt="%d")
+        clabel(cr2, cr2.levels[::cstp], fontsize=12, fmt="%d")
     #
     #
     if opt_stmp:
         # 等温線をひく（2℃）
-        cr3 = ax.contour(lons,
-                         lats,
-                         tmp,
-                         levels=[2],
-                         colors='cornflowerblue',
-                         linestyles='-',
-                         linewidths=0.8)
-        cr3.clabel(cr3.levels[::1], fontsize=12, fmt="%d")
+        cr3 = gcont.contour(ax,
+                            tmp,
+                            levels=[2],
+                            colors='cornflowerblue',
+                            linestyles='-',
+                            linewidths=0.8)
+        clabel(cr3, cr3.levels[::1], fontsize=12, fmt="%d")
         #
         # 等温線をひく（-2℃）
-        cr4 = ax.contour(lons,
-                         lats,
-                         tmp,
-                         levels=[-2],
-                         colors='blue',
-                         linestyles='-',
-                         linewidths=0.8)
+        cr4 = gcont.contour(ax,
+                            tmp,
+                            levels=[-2],
+                            colors='blue',
+                            linestyles='-',
+                            linewidths=0.8)
         # ラベルを付ける
-        cr4.clabel(cr4.levels[::1], fontsize=12, fmt="%d")
+        clabel(cr4, cr4.levels[::1], fontsize=12, fmt="%d")
 
     #
     # 色テーブルの設定
@@ -144,13 +159,14 @@ def plotmap(sta, lons, lats, mslp, rain, tmp, uwnd, vwnd, title,
     cmap = cutils.get_ctable(under='gray', over='brown')  # 色テーブルの取得
     # 降水量の陰影を付ける値をlevelsrにリストとして入れる
     levelsr = [0.2, 1, 5, 10, 20, 50, 80, 100]
-    # 陰影を描く
-    cs = ax.contourf(lons,
-                     lats,
+    # 陰影を描く（間引く場合には極値を残す）
+    cs = gcont.shade(ax,
                      rain,
                      levels=levelsr,
+                     pooling="max",
                      cmap=cmap,
-                     extend='both')
+                     extend='both',
+                     raster=True)
     # カラーバーを付ける
     cbar = plt.colorbar(cs, orientation='horizontal', shrink=0.9, pad=0.05)
     cbar.set_label('precipitation (mm/hr)')
@@ -164,19 +180,129 @@ def plotmap(sta, lons, lats, mslp, rain, tmp, uwnd, vwnd, title,
                  color='r',
                  length=5,
                  linewidth=1.5,
-                 sizes=dict(emptybarb=0.01, spacing=0.16, height=0.4))
+                 sizes=dict(emptybarb=0.01, spacing=0.16, height=0.4),
+                 transform=ccrs.PlateCarree())
     #
     #
     # タイトルを付ける
     plt.title(title, fontsize=20)
     # 図を保存
-    plt.savefig(output_filename, dpi=300, bbox_inches='tight')
+    savefig(output_filename, sink=sink)
     plt.close()
 
 
+def write_geojson(sta, lons_1d, lats_1d, mslp, rain, tmp, title,
+                  output_filename):
+    """等圧線・等温線（-2、2℃）・降水量の陰影をGeoJSONで書き出す
+
+    線はplotmapと同じ値で引き、間引かない格子から求めて点を間引く
+
+    Parameters:
+    ----------
+    sta: str
+        地点名
+    lons_1d: ndarray
+        経度データ（1次元、度）
+    lats_1d: ndarray
+        緯度データ（1次元、度）
+    mslp: ndarray
+        SLPデータ（2次元、hPa）
+    rain: ndarray
+        降水量データ（2次元、mm/h）
+    tmp: ndarray
+        気温データ（2次元、℃）
+    title: str
+        タイトル
+    output_filename: str
+        出力ファイル名（拡張子を.geojsonに変える）
+    ----------
+    """
+    region = MapRegion(sta)
+    gcont = grid_contour(
+        lons_1d, lats_1d,
+        [region.lon_min, region.lon_max, region.lat_min, region.lat_max])
+    layers = GeoJSONLayers(title=title)
+    # 等圧線（Japanは2hPa、それ以外は1hPaごと）
+    step = 2 if sta == "Japan" else 1
+    levels = range(math.floor(mslp.min() - math.fmod(mslp.min(), 2)),
+                   math.ceil(mslp.max()) + 1, step)
+    layers.lines("mslp",
+                 gcont.x,
+                 gcont.y,
+                 gcont.window(mslp),
+                 levels,
+                 stroke="#000000")
+    # 等温線
+    layers.lines("tmp",
+                 gcont.x,
+                 gcont.y,
+                 gcont.window(tmp), [-2, 2],
+                 stroke="#0000ff")
+    # 降水量の陰影（plotmapと同じ色テーブル）
+    cutils = ColUtils('s3pcpn_l')
+    cmap = cutils.get_ctable(under='gray', over='brown')
+    layers.bands("rain",
+                 gcont.x,
+                 gcont.y,
+                 gcont.window(rain), [0.2, 1, 5, 10, 20, 50, 80, 100],
+                 extend='both',
+                 cmap=cmap)
+    layers.write(os.path.splitext(output_filename)[0] + ".geojson")
+
+
+def read_frames(fields, tinfo, tlab, sta, fcst_times):
+    """予報時間毎にデータを読み込む
+
+    Parameters:
+    ----------
+    fields: FieldEngine
+        データを取り出すFieldEngine
+    tinfo: pandas.Timestamp
+        予報時刻
+    tlab: str
+        タイトルに付ける予報時刻の文字列
+    sta: str
+        地点名
+    fcst_times: ndarray
+        予報時刻からの経過時間のリスト
+    ----------
+    Yields:
+    ----------
+    frame: tuple
+        タイトル、出力ファイル名、経度・緯度と作図に使うデータ
+    ----------
+    """
+    for fcst_time in fcst_times:
+        # fcst時刻
+        tinfo_fcst = tinfo + timedelta(hours=int(fcst_time))
+        tlab_fcst = tinfo_fcst.strftime("%m/%d %H UTC")
+        # 経度・緯度
+        lons_1d, lats_1d, lons, lats = fields.grid(fcst_time)
+        # 変数取り出し
+        # 海面更生気圧を二次元のndarrayで取り出す
+        mslp = fields.get("mslp_hPa", fcst_time)  # (hPa)
+        # 降水量を二次元のndarrayで取り出す
+        rain = fields.get("rain_1h", fcst_time)  # (mm/h)
+        # 気温を二次元のndarrayで取り出す (K->℃)
+        tmp = fields.get("t2m_C", fcst_time)  # (℃)
+        # 東西風を二次元のndarrayで取り出す
+        uwnd = fields.get("u10", fcst_time)  # (m/s)
+        # 南北風を二次元のndarrayで取り出す
+        vwnd = fields.get("v10", fcst_time)  # (m/s)
+        #
+        # タイトルの設定
+        title = tlab + " MSM forecast, +" + str(
+            fcst_time) + "h (" + tlab_fcst + ")"
+        # 出力ファイル名の設定
+        hh = "{d:02d}".format(d=fcst_time)
+        output_filename = "map_msm_mslp_" + sta + "_" + str(hh) + ".png"
+        yield (title, output_filename, lons_1d, lats_1d, lons, lats, mslp,
+               rain, tmp, uwnd, vwnd)
+
+
 if __name__ == '__main__':
     # オプションの読み込み
-    args = parse_command(sys.argv)
+    args = parse_command(sys.argv, opt_tier=True, opt_proj=True)
     # 予報時刻, 作図する地域の指定
     fcst_date = args.fcst_date
     sta = args.sta
@@ -193,48 +319,60 @@ if __name__ == '__main__':
     #
     # ReadMSM初期化
     msm = ReadMSM(tsel, file_dir, "surf")
+    # 変数を名前で取り出す（読み込んだ変数・求めた変数を使い回す）
+    fields = FieldEngine("MSM", tsel, {"surf": msm})
     #
-    # fcst_timeを変えてplotmapを実行
-    output_filenames = []
-    for fcst_time in np.arange(fcst_str, fcst_end + 1, fcst_step):
-        # fcst_timeを設定
-        msm.set_fcst_time(fcst_time)
-        # fcst時刻
-        tinfo_fcst = tinfo + timedelta(hours=int(fcst_time))
-        tlab_fcst = tinfo_fcst.strftime("%m/%d %H UTC")
-        # NetCDFデータ読み込み
-        lons_1d, lats_1d, lons, lats = msm.readnetcdf()
-        # 変数取り出し
-        # 海面更生気圧を二次元のndarrayで取り出す
-        mslp = msm.ret_var("PRMSL_meansealevel", fact=0.01)  # (hPa)
-        # 降水量を二次元のndarrayで取り出す
-        rain = msm.ret_var("APCP_surface")  # (mm/h)
-        # 気温を二次元のndarrayで取り出す (K->℃)
-        tmp = msm.ret_var("TMP_1D5maboveground", offset=-273.15)  # (℃)
-        # 東西風を二次元のndarrayで取り出す
-        uwnd = msm.ret_var("UGRD_10maboveground")  # (m/s)
-        # 南北風を二次元のndarrayで取り出す
-        vwnd = msm.ret_var("VGRD_10maboveground")  # (m/s)
-        wspd = np.sqrt(uwnd**2 + vwnd**2)
-        # ファイルを閉じる
-        msm.close_netcdf()
+    # 作図する品質（簡易版を先に描いて書き出し、通常版で置き換える）
+    tiers = tier_list(args.tier)
+    #
+    # 予報時間毎のデータ（簡易版と通常版を描く場合は読み込んだデータを使い回す）
+    frames = read_frames(fields,
+                         tinfo,
+                         tlab,
+                         sta,
+                         np.arange(fcst_str, fcst_end + 1, fcst_step))
+    if len(tiers) > 1:
+        frames = list(frames)
+    #
+    # 作図結果のキャッシュ
+    cache = FrameCache("msm_mslp")
+    #
+    # 品質毎に作図する
+    for quick in tiers:
+        set_quick(quick)
+        # アニメーションの出力先（フレームを直接gif/mp4に変換する）
+        sink = AnimSink(gif_filename="anim_msm_mslp_" + sta + ".gif",
+                        mp4_filename="anim_msm_mslp_" + sta + ".mp4",
+                        delay="80",
+                        save_png=not opt_remove_png)
         #
-        # タイトルの設定
-        title = tlab + " MSM forecast, +" + str(
-            fcst_time) + "h (" + tlab_fcst + ")"
-        # 出力ファイル名の設定
-        hh = "{d:02d}".format(d=fcst_time)
-        output_filename = "map_msm_mslp_" + sta + "_" + str(hh) + ".png"
-        # 作図
-        plotmap(sta, lons, lats, mslp, rain, tmp, uwnd, vwnd, title,
-                output_filename)
-        output_filenames.append(output_filename)
-    # pngからgifアニメーションに変換
-    convert_png2gif(input_filenames=output_filenames,
-                    delay="80",
-                    output_filename="anim_msm_mslp_" + sta + ".gif")
-    # pngからmp4アニメーションに変換
-    convert_png2mp4(input_file="map_msm_mslp_" + sta + "_%02d.png",
-                    output_filename="anim_msm_mslp_" + sta + ".mp4")
-    # 後処理
-    post(output_filenames)
+        # 予報時間を変えてplotmapを実行
+        for (title, output_filename, lons_1d, lats_1d, lons, lats, mslp, rain,
+             tmp, uwnd, vwnd) in frames:
+            # 作図（入力データが同じ場合はキャッシュを使う）
+            key = cache.key(sta,
+                            title,
+                            lons_1d,
+                            lats_1d,
+                            mslp,
+                            rain,
+                            tmp,
+                            uwnd,
+                            vwnd,
+                            opt_stmp=opt_stmp,
+                            quick=quick)
+            if not cache.get(key, output_filename, sink=sink):
+                plotmap(sta, lons, lats, mslp, rain, tmp, uwnd, vwnd, title,
+                        output_filename, sink=sink)
+                cache.put(key, output_filename, sink=sink)
+            # GeoJSONは最後の品質の作図時に書き出す
+            if opt_geojson and quick == tiers[-1]:
+                write_geojson(sta, lons_1d, lats_1d, mslp, rain, tmp, title,
+                              output_filename)
+        # アニメーションを書き出す
+        sink.close()
+    # ファイルを閉じる
+    fields.close()
+    #
+    # 画像ファイルの書き出しが終わるまで待つ（エラーがあれば送出する）
+    get_encoder().close()
@@ -10,6 +10,17 @@ from jmaloc import MapRegion
 from readgrib import ReadMSM
 from utils import ColUtils
 from utils import parse_command
+from utils import savefig
+from utils import tier_list
+from utils import set_quick
+from utils import map_projection
+from utils import quicklook
+from utils import clabel
+from utils import FrameCache
+from utils import grid_contour
+from utils import get_encoder
+from utils import RainAccum
+from utils import accum_windows
 import utils.common
 
 
@@ -54,14 +65,18 @@ def plotmap(sta, lons, lats, mslp, rain, title, output_filename):
     # マップを作成
     fig = plt.figure(figsize=(10, 10))
     # cartopy呼び出し
-    ax = fig.add_subplot(1, 1, 1, projection=ccrs.PlateCarree())
+    ax = fig.add_subplot(1, 1, 1, projection=map_projection())
     ax.set_extent([lon_min, lon_max, lat_min, lat_max])  # 領域の限定
+    # 等値線描画の準備（格子と作図範囲が同じなら使い回す）
+    gcont = grid_contour(lons,
+                         lats, [lon_min, lon_max, lat_min, lat_max],
+                         ax=ax)
 
     # 経度、緯度線を描く
     xticks = np.arange(-180, 180, lon_step)
     yticks = np.arange(-90, 90, lat_step)
     gl = ax.gridlines(crs=ccrs.PlateCarree(),
-                      draw_labels=True,
+                      draw_labels=not quicklook(),
                       linewidth=1,
                       linestyle=':',
                       color='k',
@@ -79,28 +94,26 @@ def plotmap(sta, lons, lats, mslp, rain, title, output_filename):
         levels1 = range(math.floor(mslp.min() - math.fmod(mslp.min(), 2)),
                         math.ceil(mslp.max()) + 1, 1)
         # 等圧線をひく
-        cr1 = ax.contour(lons,
-                         lats,
-                         mslp,
-                         levels=levels1,
-                         colors='k',
-                         linestyles=['-', ':'],
-                         linewidths=1.2)
+        cr1 = gcont.contour(ax,
+                            mslp,
+                            levels=levels1,
+                            colors='k',
+                            linestyles=['-', ':'],
+                            linewidths=1.2)
         # ラベルを付ける
-        cr1.clabel(cr1.levels[::cstp], fontsize=12, fmt="%d")
+        clabel(cr1, cr1.levels[::cstp], fontsize=12, fmt="%d")
     else:
         # 等圧線をひく間隔(2hPaごと)をlevelsにリストとして入れる
         levels2 = range(math.floor(mslp.min() - math.fmod(mslp.min(), 2)),
                         math.ceil(mslp.max()) + 1, 2)
         # 等圧線をひく
-        cr2 = ax.contour(lons,
-                         lats,
-                         mslp,
-                         levels=levels2,
-                         colors='k',
-                         linewidths=1.2)
+        cr2 = gcont.contour(ax,
+                            mslp,
+                            levels=levels2,
+                            colors='k',
+                            linewidths=1.2)
         # ラベルを付ける
-        cr2.clabel(cr2.levels[::cstp], fontsize=12, fmt="%d")
+        clabel(cr2, cr2.levels[::cstp], fontsize=12, fmt="%d")
     #
     #
     # 色テーブルの設定
@@ -108,13 +121,14 @@ def plotmap(sta, lons, lats, mslp, rain, title, output_filename):
     cmap = cutils.get_ctable(under='gray', over='r')  # 色テーブルの取得
     # 降水量の陰影を付ける値をlevelsrにリストとして入れる
     levelsr = [1, 5, 10, 20, 50, 80, 100, 200, 400, 600]
-    # 陰影を描く
-    cs = ax.contourf(lons,
-                     lats,
+    # 陰影を描く（間引く場合には極値を残す）
+    cs = gcont.shade(ax,
                      rain,
                      levels=levelsr,
+                     pooling="max",
                      cmap=cmap,
-                     extend='both')
+                     extend='both',
+                     raster=True)
     # カラーバーを付ける
     cbar = plt.colorbar(cs, orientation='horizontal', shrink=0.9, pad=0.05)
     cbar.set_label('precipitation (mm)')
@@ -122,13 +136,13 @@ def plotmap(sta, lons, lats, mslp, rain, title, output_filename):
     # タイトルを付ける
     plt.title(title, fontsize=20)
     # 図を保存
-    plt.savefig(output_filename, dpi=300, bbox_inches='tight')
+    savefig(output_filename)
     plt.close()
 
 
 if __name__ == '__main__':
     # オプションの読み込み
-    args = parse_command(sys.argv)
+    args = parse_command(sys.argv, opt_tier=True, opt_proj=True)
     # 予報時刻, 作図する地域の指定
     fcst_date = args.fcst_date
     sta = args.sta
@@ -144,32 +158,60 @@ if __name__ == '__main__':
     # ReadMSM初期化
     msm = ReadMSM(tsel, file_dir, "surf")
     #
-    # fcst_timeを変えてplotmapを実行
-    rain_add = []
-    output_filenames = []
+    # 作図する期間（0-fcst_endの積算降水量と、fcst_endまでの各期間など）
+    spans = accum_windows(fcst_end)
+    # 期間の始まり・終わりの予報時間の累積降水量を持つ
+    hours = [h for span in spans for h in span]
+    accum = None
+    #
+    # 全ての予報時間を1回だけ読み込む
+    mslp_add = dict()
     for fcst_time in np.arange(0, fcst_end + 1, 1):
         # fcst_timeを設定
         msm.set_fcst_time(fcst_time)
         # NetCDFデータ読み込み
         lons_1d, lats_1d, lons, lats = msm.readnetcdf()
+        if accum is None:
+            accum = RainAccum(hours, lons.shape)
         # 変数取り出し
-        # 海面更生気圧を二次元のndarrayで取り出す
-        mslp = msm.ret_var("PRMSL_meansealevel", fact=0.01)  # (hPa)
-        # 降水量を二次元のndarrayで取り出す
-        rain = msm.ret_var("APCP_surface")  # (mm/h)
-        rain_add.append(rain)
+        # 降水量を二次元のndarrayで取り出し、累積降水量に足し込む
+        accum.add(fcst_time, msm.ret_var("APCP_surface"))  # (mm/h)
+        # 期間の終わりの海面更生気圧を二次元のndarrayで取り出す
+        if any(h1 == fcst_time for h0, h1 in spans):
+            mslp_add[fcst_time] = msm.ret_var("PRMSL_meansealevel",
+                                              fact=0.01)  # (hPa)
         # ファイルを閉じる
         msm.close_netcdf()
     #
-    nt = len(rain_add)
-    rain_add = np.vstack(rain_add).reshape(nt, lons.shape[0], lons.shape[1])
-    print(rain_add.shape)
-    rain = rain_add.sum(axis=0)
-    # タイトルの設定
-    title = tlab + " MSM forecast, +" + "0-" + str(
-        fcst_end) + "h rain & +" + str(fcst_end) + "h SLP"
-    # 出力ファイル名の設定
-    output_filename = "map_msm_rain_sum" + "0-" + str(
-        fcst_end) + "_" + sta + ".png"
-    # 作図
-    plotmap(sta, lons, lats, mslp, rain, title, output_filename)
+    # 作図結果のキャッシュ
+    cache = FrameCache("msm_rain_sum")
+    #
+    # 作図する品質（簡易版を先に描いて書き出し、通常版で置き換える）
+    for quick in tier_list(args.tier):
+        set_quick(quick)
+        # 期間を変えてplotmapを実行
+        for h0, h1 in spans:
+            # 期間の降水量（累積降水量の引き算で求める）と、終わりの海面更生気圧
+            rain = accum.window(h0, h1)
+            mslp = mslp_add[h1]
+            # タイトルの設定
+            title = tlab + " MSM forecast, +" + str(h0) + "-" + str(
+                h1) + "h rain & +" + str(h1) + "h SLP"
+            # 出力ファイル名の設定
+            output_filename = "map_msm_rain_sum" + str(h0) + "-" + str(
+                h1) + "_" + sta + ".png"
+            # 作図（入力データが同じ場合はキャッシュを使う）
+            key = cache.key(sta,
+                            title,
+                            lons_1d,
+                            lats_1d,
+                            mslp,
+                            rain,
+                            quick=quick)
+            if not cache.get(key, output_filename):
+                plotmap(sta, lons, lats, mslp, rain, title, output_filename)
+                cache.put(key, output_filename)
+    accum.close()
+    #
+    # 画像ファイルの書き出しが終わるまで待つ（エラーがあれば送出する）
+    get_encoder().close()
@@ -0,0 +1,84 @@
+#!/opt/local/bin/python3
+import pandas as pd
+import numpy as np
+import sys
+from readgrib import ReadMSM
+from utils import ColUtils
+from utils import parse_command
+from utils import TileRenderer
+import utils.common
+
+
+def layers_mslp_rain():
+    """降水量の陰影と等圧線のレイヤーの設定を返す
+
+    Returns:
+    ----------
+    layers: dict
+        レイヤー名をキーとした描画設定の辞書
+    ----------
+    """
+    # 色テーブルの設定
+    cutils = ColUtils('s3pcpn_l')  # 色テーブルの選択
+    cmap = cutils.get_ctable(over='brown')  # 色テーブルの取得
+    layers = dict()
+    # 降水量の陰影（0.2mm/h未満は透明にする）
+    layers["rain"] = {
+        "kind": "shade",
+        "field": "rain",
+        "levels": [0.2, 1, 5, 10, 20, 50, 80, 100],
+        "cmap": cmap,
+        "extend": "max",
+        "alpha": 0.8
+    }
+    # 等圧線（2hPaごと）
+    layers["mslp"] = {
+        "kind": "contour",
+        "field": "mslp",
+        "levels": np.arange(900, 1100, 2),
+        "colors": "k",
+        "linewidths": 1.0
+    }
+    return layers
+
+
+if __name__ == '__main__':
+    # オプションの読み込み
+    args = parse_command(sys.argv, opt_sta=False, opt_zoom=True)
+    # 予報時刻, ズームレベルの指定
+    fcst_date = args.fcst_date
+    zoom = args.zoom
+    file_dir = args.input_dir
+    # 予報時刻からの経過時間
+    fcst_end = args.fcst_time
+    # datetimeに変換
+    tinfo = pd.to_datetime(fcst_date)
+    #
+    tsel = tinfo.strftime("%Y%m%d%H%M%S")
+    #
+    # ReadMSM初期化
+    msm = ReadMSM(tsel, file_dir, "surf")
+    #
+    # fcst_timeを変えてタイルを作成
+    renderer = None
+    for fcst_time in np.arange(0, fcst_end + 1, 1):
+        # fcst_timeを設定
+        msm.set_fcst_time(fcst_time)
+        # NetCDFデータ読み込み
+        lons_1d, lats_1d, lons, lats = msm.readnetcdf()
+        # 変数取り出し
+        # 海面更生気圧を二次元のndarrayで取り出す
+        mslp = msm.ret_var("PRMSL_meansealevel", fact=0.01)  # (hPa)
+        # 降水量を二次元のndarrayで取り出す
+        rain = msm.ret_var("APCP_surface")  # (mm/h)
+        # ファイルを閉じる
+        msm.close_netcdf()
+        if renderer is None:
+            renderer = TileRenderer(lons_1d, lats_1d, layers_mslp_rain(), zoom,
+                                    tsel, "msm_mslp")
+        # タイル作成（作成済みのタイルは使い回す）
+        renderer.render(fcst_time, {"mslp": mslp, "rain": rain})
+    #
+    # ワーカープロセスを終了する
+    if renderer is not None:
+        renderer.close()
@@ -0,0 +1,292 @@
+#!/opt/local/bin/python3
+import pandas as pd
+import numpy as np
+import sys
+from datetime import timedelta
+import matplotlib.pyplot as plt
+import matplotlib.ticker as mticker
+from readgrib import ReadMSM
+from utils import ColUtils
+from utils import CrossSection
+from utils import parse_path
+from utils import mkthetae
+from utils import parse_command
+from utils import FrameCache
+from utils import savefig
+from utils import tier_list
+from utils import set_quick
+from utils import clabel
+from utils import opt_remove_png
+from utils import AnimSink
+from utils import get_encoder
+import utils.common
+
+# 断面を作図する気圧面（hPa、相対湿度は300 hPaまで）
+plevs = [1000, 975, 950, 925, 900, 850, 800, 700, 600, 500, 400, 300]
+
+# 断面に内挿する変数：名前 -> 変数名（気圧面の名前は付けない）
+xsect_vars = {
+    "tem": "TMP",  # 気温 (K)
+    "rh": "RH",  # 相対湿度 (%)
+    "uwnd": "UGRD",  # 東西風 (m/s)
+    "vwnd": "VGRD",  # 南北風 (m/s)
+    "omg": "VVEL"  # 鉛直p速度 (Pa/s)
+}
+
+
+def plotsect(xsect, thetae, rh, uwnd, vwnd, omg, title, output_filename,
+             sink=None):
+    """作図を行う
+
+    Parameters:
+    ----------
+    xsect: CrossSection
+        断面
+    thetae: ndarray
+        相当温位（2次元：気圧面, 断面の点、K）
+    rh: ndarray
+        相対湿度（2次元：気圧面, 断面の点、%）
+    uwnd: ndarray
+        東西風（2次元：気圧面, 断面の点、m/s）
+    vwnd: ndarray
+        南北風（2次元：気圧面, 断面の点、m/s）
+    omg: ndarray
+        鉛直p速度（2次元：気圧面, 断面の点、Pa/s）
+    title: str
+        タイトル
+    output_filename: str
+        出力ファイル名
+    sink: AnimSink
+        フレームを渡すアニメーションの出力先（Noneならpngファイルに保存）
+    ----------
+    """
+    bstp = max(len(xsect.dist) // 25, 1)  # 矢羽を何個飛ばしに描くか
+    #
+    # 図を作成
+    fig = plt.figure(figsize=(12, 8))
+    ax = fig.add_subplot(1, 1, 1)
+    x = xsect.dist
+    y = np.array(plevs)
+    #
+    # 色テーブルの設定
+    cutils = ColUtils('drywet')  # 色テーブルの選択
+    cmap = cutils.get_ctable(under='w')  # 色テーブルの取得
+    # 相対湿度の陰影を付ける値をlevelsrにリストとして入れる
+    levelsr = [60, 75, 80, 90, 100]
+    # 陰影を描く
+    cs = ax.contourf(x, y, rh, levels=levelsr, cmap=cmap, extend='min')
+    # カラーバーを付ける
+    cbar = plt.colorbar(cs, orientation='horizontal', shrink=0.9, pad=0.1)
+    cbar.set_label('RH (%)')
+    #
+    # 相当温位の等値線を描く（3Kごと）
+    levels_the = np.arange(210, 420, 3)
+    cr1 = ax.contour(x,
+                     y,
+                     thetae,
+                     levels=levels_the,
+                     colors='k',
+                     linewidths=1.5)
+    # ラベルを付ける（6Kごと）
+    clabel(cr1, cr1.levels[::2], fontsize=10, fmt="%d")
+    #
+    # 鉛直p速度の等値線を描く（hPa/h、上昇流：赤の実線、下降流：青の破線）
+    omg = omg * 36.
+    levels_omg = [5, 10, 20, 40, 80]
+    ax.contour(x,
+               y,
+               omg,
+               levels=[-v for v in levels_omg[::-1]],
+               colors='r',
+               linestyles='-',
+               linewidths=1.2)
+    ax.contour(x,
+               y,
+               omg,
+               levels=levels_omg,
+               colors='b',
+               linestyles='--',
+               linewidths=1.2)
+    #
+    # 矢羽を描く
+    xx, yy = np.meshgrid(x, y)
+    ax.barbs(xx[:, ::bstp],
+             yy[:, ::bstp],
+             uwnd[:, ::bstp],
+             vwnd[:, ::bstp],
+             color='g',
+             length=5,
+             linewidth=1.2,
+             sizes=dict(emptybarb=0.01, spacing=0.16, height=0.4))
+    #
+    # 軸の設定（縦軸は気圧、上空を上にする）
+    ax.set_ylim(plevs[0], plevs[-1])
+    ax.yaxis.set_major_locator(mticker.FixedLocator(plevs))
+    ax.set_ylabel('pressure (hPa)')
+    ax.set_xlim(x[0], x[-1])
+    # 横軸の目盛りは折れ線の頂点の経度・緯度
+    ax.xaxis.set_major_locator(mticker.FixedLocator(xsect.vdist))
+    ax.set_xticklabels([
+        "{lon:.1f}E\n{lat:.1f}N".format(lon=lon, lat=lat)
+        for lon, lat in xsect.points
+    ])
+    ax.grid(axis='x', color='k', linestyle=':', linewidth=1)
+    #
+    # タイトルを付ける
+    plt.title(title, fontsize=16)
+    # 図を保存
+    savefig(output_filename, sink=sink)
+    plt.close()
+
+
+def read_cube(msm, var_name, fcst_times):
+    """全ての予報時間のデータを四次元のndarrayで返す
+
+    Parameters:
+    ----------
+    msm: ReadMSM
+        データを読み込むReadMSM
+    var_name: str
+        変数名（気圧面の名前は付けない）
+    fcst_times: ndarray
+        予報時刻からの経過時間のリスト
+    ----------
+    Returns:
+    ----------
+    d: ndarray
+        データ（予報時間, 気圧面, 緯度, 経度、欠損値はNaN）
+    ----------
+    """
+    d = None
+    for n, fcst_time in enumerate(fcst_times):
+        msm.set_fcst_time(fcst_time)
+        msm.readnetcdf()
+        cube = msm.ret_var_3d(var_name, plevs)
+        msm.close_netcdf()
+        if d is None:
+            d = np.empty((len(fcst_times), ) + cube.shape, dtype=np.float32)
+        d[n] = np.ma.filled(cube, np.nan)
+    return d
+
+
+def read_frames(msm, tinfo, tlab, points, fcst_times):
+    """全ての予報時間の断面をまとめて求め、予報時間毎に返す
+
+    Parameters:
+    ----------
+    msm: ReadMSM
+        データを読み込むReadMSM
+    tinfo: pandas.Timestamp
+        予報時刻
+    tlab: str
+        タイトルに付ける予報時刻の文字列
+    points: list(tuple, tuple, ...)
+        断面の折れ線の頂点の(経度, 緯度)のリスト
+    fcst_times: ndarray
+        予報時刻からの経過時間のリスト
+    ----------
+    Returns:
+    ----------
+    xsect: CrossSection
+        断面
+    frames: list(tuple, tuple, ...)
+        タイトル、出力ファイル名と作図に使う断面のデータ
+    ----------
+    """
+    # 格子の位置（最初の予報時間のファイルから読み込む）
+    msm.set_fcst_time(fcst_times[0])
+    lons_1d, lats_1d = msm.readnetcdf()[0:2]
+    msm.close_netcdf()
+    # 断面への内挿の重み（格子・線毎に1回だけ作成する）
+    xsect = CrossSection("msm", lons_1d, lats_1d, points)
+    # 変数毎に、全ての予報時間・気圧面を1回で断面に内挿する
+    sections = dict()
+    for name, var_name in xsect_vars.items():
+        sections[name] = xsect.sample(read_cube(msm, var_name, fcst_times))
+    # 断面の相当温位を求める
+    pres = np.array(plevs, dtype=np.float32).reshape(len(plevs), 1) * 100.
+    thetae = mkthetae(pres, sections["tem"], sections["rh"])
+    frames = []
+    for n, fcst_time in enumerate(fcst_times):
+        # fcst時刻
+        tinfo_fcst = tinfo + timedelta(hours=int(fcst_time))
+        tlab_fcst = tinfo_fcst.strftime("%m/%d %H UTC")
+        # タイトルの設定
+        title = tlab + " MSM forecast, +" + str(
+            fcst_time) + "h (" + tlab_fcst + ")"
+        # 出力ファイル名の設定
+        hh = "{d:02d}".format(d=fcst_time)
+        output_filename = "map_msm_xsect_" + str(hh) + ".png"
+        frames.append((title, output_filename, thetae[n], sections["rh"][n],
+                       sections["uwnd"][n], sections["vwnd"][n],
+                       sections["omg"][n]))
+    return xsect, frames
+
+
+if __name__ == '__main__':
+    # オプションの読み込み
+    args = parse_command(sys.argv, opt_sta=False, opt_tier=True, opt_path=True)
+    # 予報時刻, 断面の線の指定
+    fcst_date = args.fcst_date
+    points = parse_path(args.path)
+    file_dir = args.input_dir
+    # 予報時刻からの経過時間（3時間毎に指定可能）
+    fcst_end = args.fcst_time
+    fcst_str = 0  # 開始時刻
+    fcst_step = 3  # 作図する間隔
+    # datetimeに変換
+    tinfo = pd.to_datetime(fcst_date)
+    #
+    tsel = tinfo.strftime("%Y%m%d%H%M%S")
+    tlab = tinfo.strftime("%m/%d %H UTC")
+    #
+    # ReadMSM初期化
+    msm = ReadMSM(tsel, file_dir, "plev")
+    #
+    # 作図する品質（簡易版を先に描いて書き出し、通常版で置き換える）
+    tiers = tier_list(args.tier)
+    #
+    # 予報時間毎の断面（全ての予報時間をまとめて内挿する）
+    xsect, frames = read_frames(msm, tinfo, tlab, points,
+                                np.arange(fcst_str, fcst_end + 1, fcst_step))
+    #
+    # 作図結果のキャッシュ
+    cache = FrameCache("msm_xsect")
+    #
+    # 品質毎に作図する
+    for quick in tiers:
+        set_quick(quick)
+        # アニメーションの出力先（フレームを直接gif/mp4に変換する）
+        sink = AnimSink(gif_filename="anim_msm_xsect.gif",
+                        mp4_filename="anim_msm_xsect.mp4",
+                        delay="80",
+                        save_png=not opt_remove_png)
+        #
+        # 予報時間を変えてplotsectを実行
+        for (title, output_filename, thetae, rh, uwnd, vwnd, omg) in frames:
+            # 作図（入力データが同じ場合はキャッシュを使う）
+            key = cache.key(args.path,
+                            title,
+                            xsect.dist,
+                            thetae,
+                            rh,
+                            uwnd,
+                            vwnd,
+                            omg,
+                            quick=quick)
+            if not cache.get(key, output_filename, sink=sink):
+                plotsect(xsect,
+                         thetae,
+                         rh,
+                         uwnd,
+                         vwnd,
+                         omg,
+                         title,
+                         output_filename,
+                         sink=sink)
+                cache.put(key, output_filename, sink=sink)
+        # アニメーションを書き出す
+        sink.close()
+    #
+    # 画像ファイルの書き出しが終わるまで待つ（エラーがあれば送出する）
+    get_encoder().close()
@@ -0,0 +1,91 @@
+#!/opt/local/bin/python3
+import pandas as pd
+import numpy as np
+import sys
+from jmaloc import AmedasStation
+from readgrib import ReadMSM
+from readgrib import ReadGSM
+from datetime import timedelta
+from utils import parse_command
+from utils import StationWeights
+from utils import station_table
+from utils import write_table
+import utils.common
+
+# 出力する変数：(列名, MSMの変数名, GSMの変数名, fact, offset)
+point_vars = [
+    ("mslp", "PRMSL_meansealevel", "PRMSL_meansealevel", 0.01, 0.),  # (hPa)
+    ("prep", "APCP_surface", "APCP_surface", 1., 0.),  # (mm/h)
+    ("temp", "TMP_1D5maboveground", "TMP_2maboveground", 1., -273.15),  # (℃)
+    ("uwnd", "UGRD_10maboveground", "UGRD_10maboveground", 1., 0.),  # (m/s)
+    ("vwnd", "VGRD_10maboveground", "VGRD_10maboveground", 1., 0.),  # (m/s)
+    ("relh", "RH_1D5maboveground", "RH_2maboveground", 1., 0.),  # (%)
+    ("cfrl", "LCDC_surface", "LCDC_surface", 1., 0.),  # (%)
+    ("cfrm", "MCDC_surface", "MCDC_surface", 1., 0.),  # (%)
+    ("cfrh", "HCDC_surface", "HCDC_surface", 1., 0.),  # (%)
+    ("cfrt", "TCDC_surface", "TCDC_surface", 1., 0.)  # (%)
+]
+
+if __name__ == '__main__':
+    # オプションの読み込み
+    args = parse_command(sys.argv, opt_sta=False, opt_dset=True)
+    # 予報時刻, データセットの指定
+    fcst_date = args.fcst_date
+    dset = args.dset
+    file_dir = args.input_dir
+    # 予報時刻からの経過時間（１時間毎に指定可能）
+    fcst_end = args.fcst_time
+    fcst_str = 0  # 開始時刻
+    fcst_step = 1  # 出力する間隔
+    # datetimeに変換
+    tinfo = pd.to_datetime(fcst_date)
+    #
+    tsel = tinfo.strftime("%Y%m%d%H%M%S")
+    #
+    # ReadMSM、ReadGSM初期化
+    if dset == "MSM":
+        reader = ReadMSM(tsel, file_dir, "surf")
+        ivar = 1
+    elif dset == "GSM":
+        reader = ReadGSM(tsel, file_dir, "surf")
+        ivar = 2
+    else:
+        raise ValueError("dset must be MSM or GSM, not " + str(dset))
+    #
+    # 全てのアメダス地点の位置を取得
+    staids, en_names, rlon, rlat = AmedasStation().get_all_staloc()
+    #
+    # 格子の位置（最初の予報時間のファイルから読み込む）
+    reader.set_fcst_time(fcst_str)
+    lons_1d, lats_1d, lons, lats = reader.readnetcdf()
+    reader.close_netcdf()
+    # 格子の範囲外の地点は除く
+    inside = ((rlon >= np.min(lons_1d)) & (rlon <= np.max(lons_1d)) &
+              (rlat >= np.min(lats_1d)) & (rlat <= np.max(lats_1d)))
+    staids = np.asarray(staids)[inside]
+    en_names = np.asarray(en_names)[inside]
+    rlon, rlat = rlon[inside], rlat[inside]
+    # 地点への内挿の重みの取得（全ての地点をまとめて求め、保存して使い回す）
+    weights = StationWeights(dset.lower(), lons_1d, lats_1d, rlon, rlat)
+    #
+    # 予報時間と時刻
+    fcst_times = np.arange(fcst_str, fcst_end + 1, fcst_step)
+    index = [tinfo + timedelta(hours=int(t)) for t in fcst_times]
+    #
+    # 変数毎に全ての予報時間、地点をまとめて取り出す
+    series = dict()
+    for v in point_vars:
+        series[v[0]] = reader.ret_points(v[ivar],
+                                         fcst_times,
+                                         fact=v[3],
+                                         offset=v[4],
+                                         weights=weights)
+    #
+    # 出力ファイル名の設定（拡張子はutils.station.table_formatで決まる）
+    output_filename = "points_" + dset.lower() + "_" + str(
+        fcst_str) + "-" + str(fcst_end) + "_" + tsel + ".parquet"
+    # 表の作成と書き出し
+    df = station_table(staids, en_names, rlon, rlat, index, fcst_times,
+                       series)
+    output_filename = write_table(df, output_filename)
+    print("write: ", output_filename, df.shape)
@@ -0,0 +1,389 @@
+#!/opt/local/bin/python3
+import os
+import re
+import sys
+import pandas as pd
+import numpy as np
+from datetime import timedelta
+from concurrent.futures import ProcessPoolExecutor
+import matplotlib.pyplot as plt
+import matplotlib.dates as mdates
+import matplotlib.ticker as mticker
+from jmaloc import AmedasStation
+from readgrib import ReadMSM
+from readgrib import ReadGSM
+from utils import ColUtils
+from utils import StationWeights
+from utils import SharedFieldStore
+from utils import attach_fields
+from utils import parse_command
+from utils import savefig
+from utils import get_encoder
+import utils.common
+
+# 全てのアメダス地点を作図する場合の地点名
+sta_all = "all"
+
+# 読み込む気圧面（hPa）：データセット -> 気圧面のリスト
+# （GSMには975、950、900、800 hPaがない）
+dset_plevs = {
+    "MSM": [1000, 975, 950, 925, 900, 850, 800, 700, 600, 500, 400, 300, 250,
+            200, 150, 100],
+    "GSM": [1000, 925, 850, 700, 600, 500, 400, 300, 250, 200, 150, 100]
+}
+
+# 相対湿度を読み込む上端の気圧面（hPa）
+plev_rh_top = 300
+
+# 地点の鉛直分布を取り出す変数：名前 -> (変数名, 相対湿度か, オフセット)
+column_vars = {
+    "temp": ("TMP", False, -273.15),  # 気温 (℃)
+    "relh": ("RH", True, 0.),  # 相対湿度 (%)
+    "uwnd": ("UGRD", False, 0.),  # 東西風 (m/s)
+    "vwnd": ("VGRD", False, 0.),  # 南北風 (m/s)
+    "hgt": ("HGT", False, 0.)  # ジオポテンシャル高度 (m)
+}
+
+# エマグラムの等温線の傾き（℃、気圧が1/eになる毎）
+skew = 35.
+
+# 並列に実行するプロセス数（None：CPU数）
+max_workers = None
+
+# ワーカープロセスで使うデータ
+_worker = dict()
+
+
+def dewpoint(temp, relh):
+    """気温と相対湿度から露点温度を求める（Tetensの式）
+
+    Parameters:
+    ----------
+    temp: ndarray
+        気温（℃）
+    relh: ndarray
+        相対湿度（%）
+    ----------
+    Returns:
+    ----------
+    td: ndarray
+        露点温度（℃）
+    ----------
+    """
+    a = np.log(np.maximum(relh, 1.) / 100.) + 17.67 * temp / (temp + 243.5)
+    return 243.5 * a / (17.67 - a)
+
+
+def _skew_x(temp, pres):
+    """エマグラム（skew-T）の横軸の位置"""
+    return temp + skew * np.log(1000. / pres)
+
+
+def plot_sounding(plevs, temp, relh, uwnd, vwnd, title, output_filename):
+    """エマグラム（skew-T）を作図する
+
+    Parameters:
+    ----------
+    plevs: list(int, int, ...)
+        気圧面（hPa、下から順）
+    temp: ndarray
+        気温（1次元：気圧面、℃）
+    relh: ndarray
+        相対湿度（1次元：下からplev_rh_topまでの気圧面、%）
+    uwnd: ndarray
+        東西風（1次元：気圧面、m/s）
+    vwnd: ndarray
+        南北風（1次元：気圧面、m/s）
+    title: str
+        タイトル
+    output_filename: str
+        出力ファイル名
+    ----------
+    """
+    pres = np.array(plevs, dtype=np.float64)
+    nrh = len(relh)
+    pres_rh = pres[0:nrh]
+    td = dewpoint(temp[0:nrh], relh)
+    p = np.geomspace(1050., 100., 50)
+    #
+    fig = plt.figure(figsize=(8, 9))
+    ax = fig.add_subplot(1, 1, 1)
+    # 等温線（10℃ごと）
+    for t in np.arange(-120, 50, 10):
+        ax.plot(_skew_x(t, p), p, color='gray', linewidth=0.6)
+    # 乾燥断熱線（温位10Kごと）
+    for th in np.arange(250, 460, 10):
+        ax.plot(_skew_x(th * (p / 1000.)**0.2857 - 273.15, p),
+                p,
+                color='tan',
+                linestyle='--',
+                linewidth=0.6)
+    # 気温と露点温度
+    ax.plot(_skew_x(temp, pres), pres, color='r', linewidth=2, label='T')
+    ax.plot(_skew_x(td, pres_rh), pres_rh, color='g', linewidth=2, label='Td')
+    # 矢羽（右端に描く）
+    ax.barbs(np.full(len(plevs), 45.),
+             pres,
+             uwnd,
+             vwnd,
+             color='k',
+             length=6,
+             linewidth=1.2,
+             clip_on=False)
+    # 軸の設定（縦軸は気圧の対数、上空を上にする）
+    ax.set_yscale('log')
+    ax.set_ylim(1050, 100)
+    ax.yaxis.set_major_locator(
+        mticker.FixedLocator([1000, 850, 700, 500, 400, 300, 250, 200, 150,
+                              100]))
+    ax.yaxis.set_major_formatter(mticker.ScalarFormatter())
+    ax.yaxis.set_minor_locator(mticker.NullLocator())
+    ax.set_ylabel('pressure (hPa)')
+    ax.set_xlim(-40, 40)
+    ax.set_xlabel('temperature (℃)')
+    ax.legend(loc='upper left')
+    #
+    # タイトルを付ける
+    plt.title(title, fontsize=14)
+    # 図を保存
+    savefig(output_filename)
+    plt.close()
+
+
+def plot_theight(plevs, index, temp, relh, uwnd, vwnd, title,
+                 output_filename):
+    """時間高度断面図を作図する
+
+    Parameters:
+    ----------
+    plevs: list(int, int, ...)
+        気圧面（hPa、下から順）
+    index: ndarray
+        時刻（1次元、datetime.datetime）
+    temp: ndarray
+        気温（2次元：時刻, 気圧面、℃）
+    relh: ndarray
+        相対湿度（2次元：時刻, 下からplev_rh_topまでの気圧面、%）
+    uwnd: ndarray
+        東西風（2次元：時刻, 気圧面、m/s）
+    vwnd: ndarray
+        南北風（2次元：時刻, 気圧面、m/s）
+    title: str
+        タイトル
+    output_filename: str
+        出力ファイル名
+    ----------
+    """
+    x = mdates.date2num(index)
+    y = np.array(plevs)
+    #
+    fig = plt.figure(figsize=(12, 7))
+    ax = fig.add_subplot(1, 1, 1)
+    # 色テーブルの設定
+    cutils = ColUtils('drywet')  # 色テーブルの選択
+    cmap = cutils.get_ctable(under='w')  # 色テーブルの取得
+    # 相対湿度の陰影を描く
+    levelsr = [60, 75, 80, 90, 100]
+    cs = ax.contourf(x,
+                     y[0:relh.shape[1]],
+                     relh.T,
+                     levels=levelsr,
+                     cmap=cmap,
+                     extend='min')
+    # カラーバーを付ける
+    cbar = plt.colorbar(cs, orientation='horizontal', shrink=0.9, pad=0.12)
+    cbar.set_label('RH (%)')
+    # 等温線を描く（3℃ごと、0℃は太線）
+    cr = ax.contour(x,
+                    y,
+                    temp.T,
+                    levels=np.arange(-90, 46, 3),
+                    colors='k',
+                    linewidths=1.0)
+    ax.clabel(cr, fontsize=9, fmt="%d")
+    ax.contour(x, y, temp.T, levels=[0], colors='k', linewidths=2.5)
+    # 矢羽を描く
+    xx, yy = np.meshgrid(x, y, indexing='ij')
+    ax.barbs(xx,
+             yy,
+             uwnd,
+             vwnd,
+             color='r',
+             length=5,
+             linewidth=1.0,
+             sizes=dict(emptybarb=0.01, spacing=0.16, height=0.4))
+    # 軸の設定（縦軸は気圧、上空を上にする）
+    ax.set_ylim(1000, 100)
+    ax.yaxis.set_major_locator(mticker.FixedLocator(plevs[::2]))
+    ax.set_ylabel('pressure (hPa)')
+    ax.set_xlim(x[0], x[-1])
+    ax.xaxis.set_major_locator(mdates.HourLocator(byhour=(0, 12)))
+    ax.xaxis.set_major_formatter(mdates.DateFormatter('%m/%d %HUTC'))
+    # タイトルを付ける
+    plt.title(title, fontsize=14)
+    # 図を保存
+    savefig(output_filename)
+    plt.close()
+
+
+def _init_worker(plevs, index, columns_meta):
+    """ワーカープロセスにデータを渡す（地点の鉛直分布は共有メモリを参照する）"""
+    _worker["plevs"] = plevs
+    _worker["index"] = index
+    _worker["columns"] = attach_fields(columns_meta)
+
+
+def _render_stations(tasks):
+    """地点のエマグラムと時間高度断面図をまとめて作図する（ワーカープロセスで実行）"""
+    plevs = _worker["plevs"]
+    index = _worker["index"]
+    c = _worker["columns"]
+    for n, title, sounding_filenames, theight_filename in tasks:
+        for it, output_filename in enumerate(sounding_filenames):
+            plot_sounding(plevs, c["temp"][it, :, n], c["relh"][it, :, n],
+                          c["uwnd"][it, :, n], c["vwnd"][it, :, n],
+                          title + ", " + index[it].strftime("%m/%d %H UTC"),
+                          output_filename)
+        plot_theight(plevs, index, c["temp"][:, :, n], c["relh"][:, :, n],
+                     c["uwnd"][:, :, n], c["vwnd"][:, :, n], title,
+                     theight_filename)
+    # プロセスが終了する前に書き出しを終える
+    get_encoder().flush()
+    return len(tasks)
+
+
+def render_stations(plevs, index, columns, tasks):
+    """多数の地点を、地点を分けて複数のプロセスで作図する
+
+    Parameters:
+    ----------
+    plevs: list(int, int, ...)
+        気圧面（hPa、下から順）
+    index: ndarray
+        時刻（1次元、datetime.datetime）
+    columns: dict
+        column_varsの名前をキー、(時刻, 気圧面, 地点)の3次元のndarrayを値とした辞書
+    tasks: list(tuple, tuple, ...)
+        地点毎の(地点の番号, タイトル, エマグラムの出力ファイル名のリスト,
+        時間高度断面図の出力ファイル名)
+    ----------
+    Returns:
+    ----------
+    num: int
+        作図した地点の数
+    ----------
+    """
+    workers = max_workers
+    if workers is None:
+        workers = os.cpu_count() or 1
+    # 地点をプロセス数の数倍に分け、空いたプロセスから順に作図する
+    nchunk = min(len(tasks), workers * 4)
+    chunks = [tasks[i::nchunk] for i in range(nchunk)]
+    # 地点の鉛直分布は共有メモリに1つだけ置き、プロセス毎にコピーしない
+    with SharedFieldStore() as store:
+        for name, d in columns.items():
+            store.put(name, d)
+        with ProcessPoolExecutor(max_workers=workers,
+                                 initializer=_init_worker,
+                                 initargs=(plevs, index,
+                                           store.meta)) as executor:
+            num = sum(executor.map(_render_stations, chunks))
+    return num
+
+
+def station_filename(staid, en_name):
+    """地点毎のファイル名の一部（地点番号_英語の地点名）"""
+    return staid + "_" + re.sub(r"[^0-9A-Za-z-]", "_", en_name)
+
+
+if __name__ == '__main__':
+    # オプションの読み込み
+    args = parse_command(sys.argv, opt_dset=True)
+    # 予報時刻, 地点（カンマ区切りで複数指定可能）, データセットの指定
+    fcst_date = args.fcst_date
+    sta = args.sta
+    dset = args.dset
+    file_dir = args.input_dir
+    if sta is None:
+        raise ValueError("sta is needed")
+    # 予報時刻からの経過時間（3時間毎に指定可能）
+    fcst_end = args.fcst_time
+    fcst_str = 0  # 開始時刻
+    fcst_step = 3  # 作図する間隔
+    fcst_times = np.arange(fcst_str, fcst_end + 1, fcst_step)
+    # datetimeに変換
+    tinfo = pd.to_datetime(fcst_date)
+    #
+    tsel = tinfo.strftime("%Y%m%d%H%M%S")
+    tlab = tinfo.strftime("%m/%d %H UTC")
+    #
+    # ReadMSM、ReadGSM初期化
+    if dset == "MSM":
+        reader = ReadMSM(tsel, file_dir, "plev")
+    elif dset == "GSM":
+        reader = ReadGSM(tsel, file_dir, "plev")
+    else:
+        raise ValueError("dset must be MSM or GSM, not " + str(dset))
+    # データセットにある気圧面
+    plevs = dset_plevs[dset]
+    plevs_rh = [p for p in plevs if p >= plev_rh_top]
+    #
+    # アメダス地点の位置を取得
+    amedas = AmedasStation()
+    if sta == sta_all:
+        # 全てのアメダス地点
+        staids, en_names, rlon, rlat = amedas.get_all_staloc()
+    else:
+        en_names = sta.split(",")
+        staids = en_names
+        loc = np.array([amedas.get_staloc(en_name=s) for s in en_names])
+        rlon, rlat = loc[:, 0], loc[:, 1]
+    # 格子の位置（最初の予報時間のファイルから読み込む）
+    reader.set_fcst_time(fcst_times[0])
+    lons_1d, lats_1d = reader.readnetcdf()[0:2]
+    reader.close_netcdf()
+    # 格子の範囲外の地点は除く
+    inside = ((rlon >= np.min(lons_1d)) & (rlon <= np.max(lons_1d)) &
+              (rlat >= np.min(lats_1d)) & (rlat <= np.max(lats_1d)))
+    staids = [s for s, i in zip(staids, inside) if i]
+    en_names = [s for s, i in zip(en_names, inside) if i]
+    rlon, rlat = rlon[inside], rlat[inside]
+    # 地点への内挿の重み（保存したものを使い回す）
+    weights = StationWeights(dset.lower() + "_plev", lons_1d, lats_1d, rlon,
+                             rlat)
+    #
+    # 全ての予報時間・気圧面の地点の鉛直分布を、地点の周囲の格子だけ読み込んで求める
+    columns = dict()
+    for name, (var_name, is_rh, offset) in column_vars.items():
+        columns[name] = reader.ret_columns(var_name,
+                                           plevs_rh if is_rh else plevs,
+                                           fcst_times,
+                                           weights,
+                                           offset=offset)
+    index = np.array([tinfo + timedelta(hours=int(t)) for t in fcst_times])
+    #
+    # 出力ファイル名の設定（全ての地点を作図する場合はディレクトリにまとめる）
+    label = dset.lower() + "_" + str(fcst_str) + "-" + str(fcst_end)
+    output_dir = "."
+    if sta == sta_all:
+        output_dir = "map_sounding_" + label + "_" + sta
+        os.makedirs(output_dir, exist_ok=True)
+    tasks = []
+    for n, (staid, en_name) in enumerate(zip(staids, en_names)):
+        name = en_name if sta != sta_all else station_filename(staid, en_name)
+        title = en_name + " " + tlab + " " + dset + " forecast"
+        sounding_filenames = [
+            os.path.join(
+                output_dir, "map_sounding_" + dset.lower() + "_" + name +
+                "_" + "{d:02d}".format(d=t) + ".png") for t in fcst_times
+        ]
+        theight_filename = os.path.join(
+            output_dir, "map_theight_" + label + "_" + name + ".png")
+        tasks.append((n, title, sounding_filenames, theight_filename))
+    #
+    # 地点を分けて複数のプロセスで作図する
+    num = render_stations(plevs, index, columns, tasks)
+    print("write: ", output_dir, num)
+    #
+    # 画像ファイルの書き出しが終わるまで待つ（エラーがあれば送出する）
+    get_encoder().close()
@@ -0,0 +1,263 @@
+#!/opt/local/bin/python3
+import pandas as pd
+import numpy as np
+import math
+import sys
+from datetime import timedelta
+import matplotlib.pyplot as plt
+import matplotlib.ticker as mticker
+import cartopy.crs as ccrs
+from jmaloc import MapRegion
+from jmaloc import AmedasStation
+from readgrib import ReadMSM
+from readgrib import ReadGSM
+from utils import val2col
+from utils import parse_command
+from utils import StationWeights
+from utils import FrameCache
+from utils import savefig
+from utils import tier_list
+from utils import set_quick
+from utils import map_projection
+from utils import quicklook
+from utils import opt_remove_png
+from utils import AnimSink
+from utils import get_encoder
+import utils.common
+
+# 地点の気温の色テーブル
+cmap_temp = "jet"
+# 色を変える気温の刻み幅（℃、色テーブルの範囲は全ての予報時間の最小・最大値から決める）
+temp_step = 5.
+
+
+def plotmap(sta, rlon, rlat, temp, cbar, title, output_filename, sink=None):
+    """作図を行う
+
+    Parameters:
+    ----------
+    sta: str
+        地点名
+    rlon: ndarray
+        アメダス地点の経度（1次元、度）
+    rlat: ndarray
+        アメダス地点の緯度（1次元、度）
+    temp: ndarray
+        アメダス地点の気温データ（1次元、℃）
+    cbar: val2col
+        気温から色に変換するval2col
+    title: str
+        タイトル
+    output_filename: str
+        出力ファイル名
+    sink: AnimSink
+        フレームを渡すアニメーションの出力先（Noneならpngファイルに保存）
+    ----------
+    """
+    #
+    # MapRegion Classの初期化
+    region = MapRegion(sta)
+    # Map.regionの変数を取得
+    lon_step = region.lon_step
+    lon_min = region.lon_min
+    lon_max = region.lon_max
+    lat_step = region.lat_step
+    lat_min = region.lat_min
+    lat_max = region.lat_max
+    if sta == "Japan":
+        msize = 12  # マーカーの大きさ
+    else:
+        msize = 60  # マーカーの大きさ
+
+    # マップを作成
+    fig = plt.figure(figsize=(10, 10))
+    # cartopy呼び出し
+    ax = fig.add_subplot(1, 1, 1, projection=map_projection())
+    ax.set_extent([lon_min, lon_max, lat_min, lat_max])  # 領域の限定
+
+    # 経度、緯度線を描く
+    xticks = np.arange(-180, 180, lon_step)
+    yticks = np.arange(-90, 90, lat_step)
+    gl = ax.gridlines(crs=ccrs.PlateCarree(),
+                      draw_labels=not quicklook(),
+                      linewidth=1,
+                      linestyle=':',
+                      color='k',
+                      alpha=0.8)
+    gl.xlocator = mticker.FixedLocator(xticks)  # 経度線
+    gl.ylocator = mticker.FixedLocator(yticks)  # 緯度線
+    gl.top_labels = False  # 上側の目盛り線ラベルを描かない
+    gl.right_labels = False  # 下側の目盛り線ラベルを描かない
+
+    # 海岸線を描く
+    ax.coastlines(color='k', linewidth=1.2, zorder=10)
+    #
+    # 全ての地点を1回のscatterで描く（色はまとめて変換する）
+    ax.scatter(rlon,
+               rlat,
+               s=msize,
+               c=cbar.conv(temp),
+               marker='o',
+               edgecolors='k',
+               linewidths=0.3,
+               transform=ccrs.PlateCarree(),
+               zorder=11)
+    # カラーバーを付ける
+    cbar.colorbar(fig, anchor=(0.2, 0.08), size=(0.6, 0.02))
+    cbar.clabel(fig,
+                anchor=(0.19, 0.08),
+                text='temperature (℃)',
+                fontsize=12)
+    #
+    # タイトルを付ける
+    ax.set_title(title, fontsize=20)
+    # 図を保存
+    savefig(output_filename, sink=sink)
+    plt.close()
+
+
+def read_frames(reader, dset, tinfo, tlab, sta, fcst_times):
+    """全ての予報時間の地点の気温をまとめて読み込み、予報時間毎に返す
+
+    Parameters:
+    ----------
+    reader: ReadMSM or ReadGSM
+        データを読み込むReadMSMまたはReadGSM
+    dset: str
+        データセット名（MSM、GSM）
+    tinfo: pandas.Timestamp
+        予報時刻
+    tlab: str
+        タイトルに付ける予報時刻の文字列
+    sta: str
+        地点名
+    fcst_times: ndarray
+        予報時刻からの経過時間のリスト
+    ----------
+    Returns:
+    ----------
+    frames: list(tuple, tuple, ...)
+        タイトル、出力ファイル名、地点の経度・緯度と気温データ
+    ----------
+    """
+    # 全てのアメダス地点の位置を取得
+    staids, en_names, rlon, rlat = AmedasStation().get_all_staloc()
+    # 格子の位置（最初の予報時間のファイルから読み込む）
+    reader.set_fcst_time(fcst_times[0])
+    lons_1d, lats_1d, lons, lats = reader.readnetcdf()
+    reader.close_netcdf()
+    # 格子の範囲外の地点は除く
+    inside = ((rlon >= np.min(lons_1d)) & (rlon <= np.max(lons_1d)) &
+              (rlat >= np.min(lats_1d)) & (rlat <= np.max(lats_1d)))
+    rlon, rlat = rlon[inside], rlat[inside]
+    # 地点への内挿の重み（readgrib_points.pyと同じ地点なので保存したものを使い回す）
+    weights = StationWeights(dset.lower(), lons_1d, lats_1d, rlon, rlat)
+    # 気温を全ての予報時間、地点でまとめて取り出す (K->℃)
+    if dset == "MSM":
+        var_name = "TMP_1D5maboveground"
+    else:
+        var_name = "TMP_2maboveground"
+    temp = reader.ret_points(var_name,
+                             fcst_times,
+                             offset=-273.15,
+                             weights=weights)
+    # 作図する地域の地点だけにする
+    region = MapRegion(sta)
+    inregion = ((rlon >= region.lon_min) & (rlon <= region.lon_max) &
+                (rlat >= region.lat_min) & (rlat <= region.lat_max))
+    rlon, rlat = rlon[inregion], rlat[inregion]
+    temp = temp[:, inregion]
+    frames = []
+    for n, fcst_time in enumerate(fcst_times):
+        # fcst時刻
+        tinfo_fcst = tinfo + timedelta(hours=int(fcst_time))
+        tlab_fcst = tinfo_fcst.strftime("%m/%d %H UTC")
+        # タイトルの設定
+        title = tlab + " " + dset + " forecast, +" + str(
+            fcst_time) + "h (" + tlab_fcst + ")"
+        # 出力ファイル名の設定
+        hh = "{d:02d}".format(d=fcst_time)
+        output_filename = ("map_" + dset.lower() + "_stamap_" + sta + "_" +
+                           str(hh) + ".png")
+        frames.append((title, output_filename, rlon, rlat, temp[n]))
+    return frames
+
+
+if __name__ == '__main__':
+    # オプションの読み込み
+    args = parse_command(sys.argv, opt_dset=True, opt_tier=True, opt_proj=True)
+    # 予報時刻, 作図する地域, データセットの指定
+    fcst_date = args.fcst_date
+    sta = args.sta
+    dset = args.dset
+    file_dir = args.input_dir
+    # 予報時刻からの経過時間（１時間毎に指定可能）
+    fcst_end = args.fcst_time
+    fcst_str = 0  # 開始時刻
+    fcst_step = 1  # 作図する間隔
+    # datetimeに変換
+    tinfo = pd.to_datetime(fcst_date)
+    #
+    tsel = tinfo.strftime("%Y%m%d%H%M%S")
+    tlab = tinfo.strftime("%m/%d %H UTC")
+    #
+    # ReadMSM、ReadGSM初期化
+    if dset == "MSM":
+        reader = ReadMSM(tsel, file_dir, "surf")
+    elif dset == "GSM":
+        reader = ReadGSM(tsel, file_dir, "surf")
+    else:
+        raise ValueError("dset must be MSM or GSM, not " + str(dset))
+    #
+    # 作図する品質（簡易版を先に描いて書き出し、通常版で置き換える）
+    tiers = tier_list(args.tier)
+    #
+    # 予報時間毎のデータ（地点の値は全ての予報時間をまとめて読み込む）
+    frames = read_frames(reader, dset, tinfo, tlab, sta,
+                         np.arange(fcst_str, fcst_end + 1, fcst_step))
+    #
+    # 色テーブルの範囲（全ての予報時間で同じにする）
+    temp_all = np.concatenate([frame[4] for frame in frames])
+    tmin = math.floor(np.nanmin(temp_all) / temp_step) * temp_step
+    tmax = math.ceil(np.nanmax(temp_all) / temp_step) * temp_step
+    cbar = val2col(tmin=tmin, tmax=tmax + 0.1, tstep=temp_step, cmap=cmap_temp)
+    #
+    # 作図結果のキャッシュ
+    product = dset.lower() + "_stamap"
+    cache = FrameCache(product)
+    #
+    # 品質毎に作図する
+    for quick in tiers:
+        set_quick(quick)
+        # アニメーションの出力先（フレームを直接gif/mp4に変換する）
+        sink = AnimSink(gif_filename="anim_" + product + "_" + sta + ".gif",
+                        mp4_filename="anim_" + product + "_" + sta + ".mp4",
+                        delay="80",
+                        save_png=not opt_remove_png)
+        #
+        # 予報時間を変えてplotmapを実行
+        for (title, output_filename, rlon, rlat, temp) in frames:
+            # 作図（入力データが同じ場合はキャッシュを使う）
+            key = cache.key(sta,
+                            title,
+                            rlon,
+                            rlat,
+                            temp,
+                            quick=quick,
+                            tmin=tmin,
+                            tmax=tmax)
+            if not cache.get(key, output_filename, sink=sink):
+                plotmap(sta,
+                        rlon,
+                        rlat,
+                        temp,
+                        cbar,
+                        title,
+                        output_filename,
+                        sink=sink)
+                cache.put(key, output_filename, sink=sink)
+        # アニメーションを書き出す
+        sink.close()
+    #
+    # 画像ファイルの書き出しが終わるまで待つ（エラーがあれば送出する）
+    get_encoder().close()
@@ -0,0 +1,265 @@
+#!/opt/local/bin/python3
+import pandas as pd
+import numpy as np
+import sys
+from datetime import timedelta
+import matplotlib.pyplot as plt
+import matplotlib.ticker as mticker
+import cartopy.crs as ccrs
+from jmaloc import MapRegion
+from readgrib import ReadMSM
+from readgrib import ReadGSM
+from utils import get_cmap
+from utils import parse_command
+from utils import savefig
+from utils import tier_list
+from utils import set_quick
+from utils import map_projection
+from utils import quicklook
+from utils import FrameCache
+from utils import grid_contour
+from utils import get_encoder
+from utils import TimeReducer
+from utils import day_windows
+import utils.common
+
+# 読み込む変数：(名前, MSMの変数名, GSMの変数名, fact, offset)
+stat_vars = [
+    ("temp", "TMP_1D5maboveground", "TMP_2maboveground", 1., -273.15),  # (℃)
+    ("rain", "APCP_surface", "APCP_surface", 1., 0.),  # (mm/h)
+    ("uwnd", "UGRD_10maboveground", "UGRD_10maboveground", 1., 0.),  # (m/s)
+    ("vwnd", "VGRD_10maboveground", "VGRD_10maboveground", 1., 0.)  # (m/s)
+]
+
+# 降水のあった時間を数える前1時間降水量の閾値（mm/h）
+rain_threshold = 1.0
+
+# 統計量を求める期間の長さ（時間）
+stat_length = 24
+
+# 作図するプロダクト：名前 -> (変数, 統計量, 色テーブル, under, over, 陰影の値,
+#                              間引く場合に残す値, タイトル・カラーバーのラベル)
+# 変数のwspdは10m風速 (m/s)、統計量のexceedは閾値以上の時間
+stat_products = {
+    "tmax": ("temp", "max", "jet", "navy", "darkred", list(range(-10, 41, 2)),
+             "max", "max temperature (℃)"),
+    "tmin": ("temp", "min", "jet", "navy", "darkred", list(range(-10, 41, 2)),
+             "min", "min temperature (℃)"),
+    "rain_max": ("rain", "max", "s3pcpn_l", "gray", "brown",
+                 [0.2, 1, 5, 10, 20, 50, 80, 100], "max",
+                 "max precipitation (mm/hr)"),
+    "rain_hours": ("rain", "exceed", "drywet", "w", "navy",
+                   [1, 3, 6, 9, 12, 15, 18, 24], "max",
+                   "hours of precipitation >= " + str(rain_threshold) +
+                   " mm/hr"),
+    "wind_max": ("wspd", "max", "YlOrRd", "w", "purple",
+                 [5, 10, 15, 20, 25, 30], "max", "max wind speed (m/s)")
+}
+
+
+def plotmap(sta, lons, lats, d, product, title, output_filename):
+    """作図を行う
+
+    Parameters:
+    ----------
+    sta: str
+        地点名
+    lons: ndarray
+        経度データ（2次元、度）
+    lats: ndarray
+        緯度データ（2次元、度）
+    d: ndarray
+        統計量（2次元）
+    product: str
+        プロダクト名（stat_productsのキー）
+    title: str
+        タイトル
+    output_filename: str
+        出力ファイル名
+    ----------
+    """
+    var, stat, cmap_name, under, over, levels, pooling, label = stat_products[
+        product]
+    #
+    # MapRegion Classの初期化
+    region = MapRegion(sta)
+    # Map.regionの変数を取得
+    lon_step = region.lon_step
+    lon_min = region.lon_min
+    lon_max = region.lon_max
+    lat_step = region.lat_step
+    lat_min = region.lat_min
+    lat_max = region.lat_max
+
+    # マップを作成
+    fig = plt.figure(figsize=(10, 10))
+    # cartopy呼び出し
+    ax = fig.add_subplot(1, 1, 1, projection=map_projection())
+    ax.set_extent([lon_min, lon_max, lat_min, lat_max])  # 領域の限定
+    # 等値線描画の準備（格子と作図範囲が同じなら使い回す）
+    gcont = grid_contour(lons,
+                         lats, [lon_min, lon_max, lat_min, lat_max],
+                         ax=ax)
+
+    # 経度、緯度線を描く
+    xticks = np.arange(-180, 180, lon_step)
+    yticks = np.arange(-90, 90, lat_step)
+    gl = ax.gridlines(crs=ccrs.PlateCarree(),
+                      draw_labels=not quicklook(),
+                      linewidth=1,
+                      linestyle=':',
+                      color='k',
+                      alpha=0.8)
+    gl.xlocator = mticker.FixedLocator(xticks)  # 経度線
+    gl.ylocator = mticker.FixedLocator(yticks)  # 緯度線
+    gl.top_labels = False  # 上側の目盛り線ラベルを描かない
+    gl.right_labels = False  # 下側の目盛り線ラベルを描かない
+
+    # 海岸線を描く
+    ax.coastlines(color='k', linewidth=1.2, zorder=10)
+    #
+    # 色テーブルの設定
+    cmap = get_cmap(cmap_name, under=under, over=over)  # 色テーブルの取得
+    # 陰影を描く（間引く場合には最大値・最小値を残す）
+    cs = gcont.shade(ax,
+                     d,
+                     levels=levels,
+                     pooling=pooling,
+                     cmap=cmap,
+                     extend='both',
+                     raster=True)
+    # カラーバーを付ける
+    cbar = plt.colorbar(cs, orientation='horizontal', shrink=0.9, pad=0.05)
+    cbar.set_label(label)
+    #
+    # タイトルを付ける
+    plt.title(title, fontsize=20)
+    # 図を保存
+    savefig(output_filename)
+    plt.close()
+
+
+def read_stats(reader, dset, fcst_times, windows):
+    """全ての予報時間を1回だけ読み込み、期間毎の統計量を求める
+
+    Parameters:
+    ----------
+    reader: ReadMSM or ReadGSM
+        データを読み込むReadMSMまたはReadGSM
+    dset: str
+        データセット名：MSM、GSM
+    fcst_times: ndarray
+        予報時刻からの経過時間のリスト（昇順）
+    windows: list((int, int), ...)
+        期間の(始まり, 終わり)のリスト
+    ----------
+    Returns:
+    ----------
+    stats: dict
+        変数（temp、rain、wspd）をキー、期間をキーとした統計量の辞書を値とした辞書
+    ----------
+    """
+    ivar = 1 if dset == "MSM" else 2
+    # 変数毎に、予報時間の塊を順に取り出す（読み込むのは塊の分だけ）
+    cubes = [
+        reader.ret_cubes(v[ivar], fcst_times, fact=v[3], offset=v[4])
+        for v in stat_vars
+    ]
+    reducers = {
+        "temp": TimeReducer(windows),
+        "rain": TimeReducer(windows, thresholds=[rain_threshold]),
+        "wspd": TimeReducer(windows)
+    }
+    stats = {var: dict() for var in reducers}
+    # 予報時間毎のデータの間隔（GSMの84時間以降は3時間）
+    steps = dict(zip(fcst_times, np.diff(fcst_times, prepend=0)))
+    for (hours, temp), (_, rain), (_, uwnd), (_, vwnd) in zip(*cubes):
+        # 降水量はデータの間隔の合計なので、1時間あたりにする
+        step = np.array([steps[t] for t in hours], dtype=np.float32)
+        rain = rain / step[:, np.newaxis, np.newaxis]
+        wspd = np.sqrt(uwnd**2 + vwnd**2)
+        for var, d in (("temp", temp), ("rain", rain), ("wspd", wspd)):
+            # 終わった期間の統計量だけを残す
+            stats[var].update(reducers[var].add(hours, d))
+    for var, reducer in reducers.items():
+        stats[var].update(reducer.close())
+    return stats
+
+
+if __name__ == '__main__':
+    # オプションの読み込み
+    args = parse_command(sys.argv, opt_dset=True, opt_tier=True, opt_proj=True)
+    # 予報時刻, 作図する地域, データセットの指定
+    fcst_date = args.fcst_date
+    sta = args.sta
+    dset = args.dset
+    file_dir = args.input_dir
+    # 予報時刻からの経過時間
+    fcst_end = args.fcst_time
+    # datetimeに変換
+    tinfo = pd.to_datetime(fcst_date)
+    #
+    tsel = tinfo.strftime("%Y%m%d%H%M%S")
+    tlab = tinfo.strftime("%m/%d %H UTC")
+    #
+    # ReadMSM、ReadGSM初期化
+    if dset == "MSM":
+        reader = ReadMSM(tsel, file_dir, "surf")
+        fcst_times = np.arange(1, fcst_end + 1, 1)
+    elif dset == "GSM":
+        reader = ReadGSM(tsel, file_dir, "surf")
+        # 84時間までは1時間毎、以降は3時間毎
+        fcst_times = np.array([
+            t for t in range(1, fcst_end + 1) if t <= 84 or (t - 84) % 3 == 0
+        ])
+    else:
+        raise ValueError("dset must be MSM or GSM, not " + str(dset))
+    #
+    # 格子の位置（最初の予報時間のファイルから読み込む）
+    reader.set_fcst_time(fcst_times[0])
+    lons_1d, lats_1d, lons, lats = reader.readnetcdf()
+    reader.close_netcdf()
+    #
+    # 期間毎の統計量（全ての予報時間・変数を1回だけ読み込む）
+    windows = day_windows(fcst_end, stat_length)
+    stats = read_stats(reader, dset, fcst_times, windows)
+    #
+    # 作図結果のキャッシュ
+    cache = FrameCache(dset.lower() + "_stats")
+    #
+    # 作図する品質（簡易版を先に描いて書き出し、通常版で置き換える）
+    for quick in tier_list(args.tier):
+        set_quick(quick)
+        # 期間・プロダクトを変えてplotmapを実行
+        for h0, h1 in windows:
+            tlab0 = (tinfo + timedelta(hours=h0)).strftime("%m/%d %HUTC")
+            tlab1 = (tinfo + timedelta(hours=h1)).strftime("%m/%d %HUTC")
+            for product, (var, stat, *style) in stat_products.items():
+                result = stats[var][(h0, h1)]
+                if stat == "exceed":
+                    d = result["exceed"][rain_threshold]
+                else:
+                    d = result[stat]
+                # タイトルの設定
+                title = (tlab + " " + dset + " forecast, +" + str(h0) + "-" +
+                         str(h1) + "h (" + tlab0 + "-" + tlab1 + ")\n" +
+                         style[-1])
+                # 出力ファイル名の設定
+                output_filename = ("map_" + dset.lower() + "_" + product +
+                                   "_" + str(h0) + "-" + str(h1) + "_" + sta +
+                                   ".png")
+                # 作図（入力データが同じ場合はキャッシュを使う）
+                key = cache.key(sta,
+                                title,
+                                product,
+                                lons_1d,
+                                lats_1d,
+                                d,
+                                quick=quick)
+                if not cache.get(key, output_filename):
+                    plotmap(sta, lons, lats, d, product, title,
+                            output_filename)
+                    cache.put(key, output_filename)
+    #
+    # 画像ファイルの書き出しが終わるまで待つ（エラーがあれば送出する）
+    get_encoder().close()
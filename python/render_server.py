@@ -0,0 +1,342 @@
+#!/opt/local/bin/python3
+#
+#  2026/10/19 要求された図だけを作図するサーバー（作図結果と読み込んだデータを使い回す）
+#
+#  URL：/予報時刻/プロダクト名/地域名/予報時間.png（temp：?level=気圧面）
+#  例：/20220623000000/msm_mslp/Japan/06.png
+#      /20220623000000/msm_temp/Tokyo/03.png?level=500
+#  /warmup/予報時刻：よく見られる図を先に作図する
+#
+import os
+import sys
+import json
+import shutil
+import threading
+import importlib
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import pandas as pd
+from jmaloc import MapRegion
+from readgrib import ReadMSM
+from readgrib import ReadGSM
+from utils import FieldEngine
+from utils import parse_command
+from utils import get_encoder
+import utils.common
+import utils.encode
+
+# プロダクト名：(作図プログラムのモジュール名, データセット, plotmapに1次元の経度・緯度も渡すか)
+products = {
+    "msm_mslp": ("readgrib_msm_mslp_reg", "MSM", False),
+    "msm_ccover": ("readgrib_msm_ccover_reg", "MSM", True),
+    "msm_stemp": ("readgrib_msm_stemp_reg", "MSM", False),
+    "msm_temp": ("readgrib_msm_temp_reg", "MSM", False),
+    "msm_ept": ("readgrib_msm_ept_reg", "MSM", False),
+    "gsm_mslp": ("readgrib_gsm_mslp_reg", "GSM", False),
+    "gsm_ccover": ("readgrib_gsm_ccover_reg", "GSM", True),
+    "gsm_stemp": ("readgrib_gsm_stemp_reg", "GSM", False),
+    "gsm_temp": ("readgrib_gsm_temp_reg", "GSM", False)
+}
+
+# 気圧面を指定するプロダクトと気圧面のデフォルト（hPa）
+level_products = ("msm_temp", "gsm_temp")
+level_default = 850
+
+# 作図結果を置くディレクトリ（環境変数RENDERDIR_GPVで指定可能）
+render_dir_default = os.environ.get('RENDERDIR_GPV', 'render')
+
+# 作図結果を残す予報時刻の数（古い予報時刻から消す）
+max_runs = 4
+
+# メモリに残す入力データの上限（MB、データセット・予報時刻毎）
+max_field_mb = 512
+
+# 起動時・/warmupで先に作図する図の数（よく見られた順）
+warmup_count = 20
+
+# 閲覧の記録がない場合に先に作図する図（プロダクト名, 地域名, 予報時間）
+warmup_default = [("msm_mslp", "Japan", h) for h in range(0, 16)]
+
+# 閲覧数をファイルに保存する間隔（閲覧数）
+popularity_save_interval = 20
+
+
+class RenderService():
+    """要求された図を作図し、作図結果と入力データを使い回す"""
+
+    def __init__(self, input_dir, render_dir=None):
+        """作図の設定
+
+        Parameters:
+        ----------
+        input_dir: str
+            入力ファイルのディレクトリ（retrieve、force_retrieveも可）
+        render_dir: str
+            作図結果を置くディレクトリ（デフォルト：render_dir_default）
+        ----------
+        """
+        if render_dir is None:
+            render_dir = render_dir_default
+        self.input_dir = input_dir
+        self.render_dir = render_dir
+        # matplotlibはスレッドセーフではないので、作図は1つずつ行う
+        self.lock = threading.Lock()
+        self.count_lock = threading.Lock()  # 閲覧数の記録
+        # (データセット, 予報時刻)毎のFieldEngine（プロダクト間でデータを使い回す）
+        self.engines = dict()
+        self.modules = dict()  # 作図プログラムのモジュール
+        self.popularity = Counter()  # 図毎の閲覧数
+        self.requests = 0
+        self.popularity_file = os.path.join(render_dir, "popularity.json")
+        if os.path.isfile(self.popularity_file):
+            with open(self.popularity_file) as f:
+                self.popularity.update(json.load(f))
+
+    def path(self, run, product, sta, hour, level):
+        """作図結果のファイル名を返す"""
+        if product in level_products:
+            product = product + "_" + str(level) + "hPa"
+        return utils.encode.output_name(
+            os.path.join(self.render_dir, run, product, sta,
+                         "{d:02d}".format(d=hour) + ".png"))
+
+    def _module(self, product):
+        """作図プログラムのモジュールを読み込む（1回だけ）"""
+        name = products[product][0]
+        if name not in self.modules:
+            self.modules[name] = importlib.import_module(name)
+        return self.modules[name]
+
+    def engine(self, dset, run):
+        """FieldEngineを返す（データセット・予報時刻毎に1回だけ作成する）"""
+        key = (dset, run)
+        if key not in self.engines:
+            read = ReadMSM if dset == "MSM" else ReadGSM
+            readers = {
+                lev: read(run, self.input_dir, lev)
+                for lev in ("surf", "plev")
+            }
+            self.engines[key] = FieldEngine(dset,
+                                            run,
+                                            readers,
+                                            budget_mb=max_field_mb)
+        return self.engines[key]
+
+    def frame(self, run, product, hour, level):
+        """予報時間のデータを返す（変数は全てのプロダクトで使い回す）
+
+        Parameters:
+        ----------
+        run: str
+            予報時刻（形式：20220623000000）
+        product: str
+            プロダクト名
+        hour: int
+            予報時刻からの経過時間
+        level: int
+            気圧面（hPa、temp以外では使わない）
+        ----------
+        Returns:
+        ----------
+        frame: tuple
+            read_framesが返すタイトル、出力ファイル名、経度・緯度と作図に使うデータ
+        ----------
+        """
+        name, dset, with_1d = products[product]
+        tinfo = pd.to_datetime(run)
+        tlab = tinfo.strftime("%m/%d %H UTC")
+        args = [self.engine(dset, run), tinfo, tlab, "", [hour]]
+        if product in level_products:
+            args.append(level)
+        return next(self._module(product).read_frames(*args))
+
+    def render(self, run, product, sta, hour, level=None):
+        """図を作図する（作図済みの場合は作図しない）
+
+        Parameters:
+        ----------
+        run: str
+            予報時刻（形式：20220623000000）
+        product: str
+            プロダクト名
+        sta: str
+            地域名
+        hour: int
+            予報時刻からの経過時間
+        level: int
+            気圧面（hPa、temp以外では使わない）
+        ----------
+        Returns:
+        ----------
+        output_filename: str
+            作図結果のファイル名
+        ----------
+        """
+        if product not in products:
+            raise KeyError("unknown product: " + str(product))
+        if MapRegion(sta).lon_min is None:
+            raise KeyError("unknown region: " + str(sta))
+        if level is None:
+            level = level_default
+        output_filename = self.path(run, product, sta, hour, level)
+        if os.path.isfile(output_filename):
+            return output_filename
+        with self.lock:
+            # 待っている間に同じ図が作図された場合
+            if os.path.isfile(output_filename):
+                return output_filename
+            new_run = not os.path.isdir(os.path.join(self.render_dir, run))
+            os.makedirs(os.path.dirname(output_filename), exist_ok=True)
+            frame = self.frame(run, product, hour, level)
+            title, _, lons_1d, lats_1d, lons, lats = frame[0:6]
+            if products[product][2]:
+                args = (sta, lons_1d, lats_1d, lons, lats) + frame[6:]
+            else:
+                args = (sta, lons, lats) + frame[6:]
+            self._module(product).plotmap(*args, title, output_filename)
+            # 書き出しが終わるまで待つ（エラーがあれば送出する）
+            get_encoder().flush()
+            if new_run:
+                self.prune()
+        return output_filename
+
+    def count(self, product, sta, hour, level=None):
+        """閲覧数を記録する"""
+        key = "/".join([product, sta, str(hour)])
+        if product in level_products:
+            key = key + "/" + str(level_default if level is None else level)
+        with self.count_lock:
+            self.popularity[key] += 1
+            self.requests += 1
+            save = self.requests % popularity_save_interval == 0
+        if save:
+            self.save_popularity()
+
+    def save_popularity(self):
+        """閲覧数をファイルに保存する"""
+        with self.count_lock:
+            popularity = dict(self.popularity)
+        os.makedirs(self.render_dir, exist_ok=True)
+        tmp_filename = self.popularity_file + ".tmp"
+        with open(tmp_filename, "w") as f:
+            json.dump(popularity, f)
+        os.replace(tmp_filename, self.popularity_file)
+
+    def warmup(self, run, num=None):
+        """よく見られる図を先に作図する
+
+        Parameters:
+        ----------
+        run: str
+            予報時刻（形式：20220623000000）
+        num: int
+            作図する図の数（デフォルト：warmup_count）
+        ----------
+        """
+        if num is None:
+            num = warmup_count
+        items = []
+        for key, _ in self.popularity.most_common(num):
+            k = key.split("/")
+            items.append((k[0], k[1], int(k[2]),
+                          int(k[3]) if len(k) > 3 else None))
+        if len(items) == 0:
+            items = [(p, s, h, None) for p, s, h in warmup_default[0:num]]
+        for product, sta, hour, level in items:
+            try:
+                self.render(run, product, sta, hour, level)
+            except Exception as e:
+                print("warmup: ", product, sta, hour, level, e)
+
+    def prune(self):
+        """古い予報時刻の作図結果を消す（max_runs個の予報時刻を残す）"""
+        runs = sorted(d for d in os.listdir(self.render_dir)
+                      if os.path.isdir(os.path.join(self.render_dir, d)))
+        for run in runs[0:max(len(runs) - max_runs, 0)]:
+            shutil.rmtree(os.path.join(self.render_dir, run),
+                          ignore_errors=True)
+        # 古い予報時刻の入力データも消す
+        keep = runs[-max_runs:]
+        for key in [k for k in self.engines if k[1] not in keep]:
+            self.engines.pop(key).close()
+
+
+def _parse_request(path):
+    """URLから予報時刻、プロダクト名、地域名、予報時間、気圧面を取り出す"""
+    url = urlparse(path)
+    parts = [p for p in url.path.split("/") if p != ""]
+    if len(parts) != 4:
+        raise KeyError("path must be /run/product/region/hour.png")
+    run, product, sta, hh = parts
+    if len(run) != 14 or not run.isdigit():
+        raise KeyError("run must be yyyymmddhhMMss: " + run)
+    hour = int(os.path.splitext(hh)[0])
+    level = parse_qs(url.query).get("level")
+    if level is not None:
+        level = int(level[0])
+    return run, product, sta, hour, level
+
+
+class RenderHandler(BaseHTTPRequestHandler):
+    """図の要求に応答する"""
+    service = None
+
+    def do_GET(self):
+        parts = [p for p in urlparse(self.path).path.split("/") if p != ""]
+        if len(parts) == 2 and parts[0] == "warmup":
+            # よく見られる図をバックグラウンドで作図する
+            threading.Thread(target=self.service.warmup,
+                             args=(parts[1], ),
+                             daemon=True).start()
+            self.send_response(202)
+            self.end_headers()
+            return
+        try:
+            run, product, sta, hour, level = _parse_request(self.path)
+            output_filename = self.service.render(run, product, sta, hour,
+                                                  level)
+        except (KeyError, ValueError) as e:
+            self.send_error(404, str(e))
+            return
+        except Exception as e:
+            self.send_error(500, str(e))
+            return
+        self.service.count(product, sta, hour, level)
+        with open(output_filename, "rb") as f:
+            data = f.read()
+        ext = os.path.splitext(output_filename)[1]
+        self.send_response(200)
+        self.send_header(
+            "Content-Type", {
+                ".png": "image/png",
+                ".webp": "image/webp",
+                ".svg": "image/svg+xml",
+                ".pdf": "application/pdf"
+            }.get(ext, "application/octet-stream"))
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Cache-Control", "max-age=3600")
+        self.end_headers()
+        self.wfile.write(data)
+
+
+if __name__ == '__main__':
+    # オプションの読み込み（fcst_dateは起動時に先に作図する予報時刻）
+    args = parse_command(sys.argv, opt_sta=False, opt_port=True)
+    service = RenderService(args.input_dir)
+    RenderHandler.service = service
+    server = ThreadingHTTPServer(("", args.port), RenderHandler)
+    # よく見られる図をバックグラウンドで先に作図する
+    tinfo = pd.to_datetime(args.fcst_date)
+    threading.Thread(target=service.warmup,
+                     args=(tinfo.strftime("%Y%m%d%H%M%S"), ),
+                     daemon=True).start()
+    print("serving on port", args.port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.save_popularity()
+        get_encoder().close()
@@ -5,8 +5,31 @@ import os
 import subprocess
 import argparse
 import numpy as np
+import matplotlib.pyplot as plt
 from .cutil import ColUtils
 from .cbar import val2col
+from .anim import AnimSink
+from .cache import FrameCache
+from .contour import GridContour, grid_contour
+from .lod import lod_factor, block_reduce
+from .tile import TileRenderer
+from .anim import render_rgba
+from .encode import FrameEncoder, get_encoder, is_vector, save_vector
+from .tier import tier_list, set_quick, quicklook, tier_dpi, clabel
+from . import tier
+from .cloud import cloud_rgba
+from .meteogram import Meteogram, render_meteograms
+from .vector import GeoJSONLayers, simplify_contour
+from .proj import set_projection, map_projection
+from . import proj
+from .station import station_table, write_table
+from .interp import StationWeights
+from .cmaps import get_cmap, colormap_lut, lut_rgba, band_cmap
+from .fields import FieldEngine
+from .shm import SharedFieldStore, attach_fields
+from .xsect import CrossSection, parse_path
+from .accum import RainAccum, accum_windows
+from .reduce import TimeReducer, day_windows
 
 # ファイルが保存された入力ディレクトリのデフォルト（webから新規取得：retrieve）
 input_dir_default = "retrieve"
@@ -14,10 +37,29 @@ input_dir_default = "retrieve"
 # 予報時刻からの経過時間、１時間毎に指定可能
 fcst_time_default = 36
 
+# タイルを作成するズームレベルのデフォルト
+zoom_default = "4-7"
+
+# 作図サーバーのポート番号のデフォルト
+port_default = 8000
+
+# 鉛直断面を作図する線のデフォルト（経度,緯度:経度,緯度、梅雨前線を南北に横切る）
+path_default = "135,26:135,44"
+
 # 最後に変換前のpngファイルを消すかどうか
 opt_remove_png = True
 
-__all__ = ["ColUtils", "val2col"]
+__all__ = [
+    "ColUtils", "val2col", "AnimSink", "FrameCache", "GridContour",
+    "grid_contour", "lod_factor", "block_reduce", "TileRenderer",
+    "FrameEncoder", "get_encoder", "tier_list", "set_quick", "quicklook",
+    "clabel", "cloud_rgba", "Meteogram", "render_meteograms", "GeoJSONLayers",
+    "simplify_contour", "set_projection", "map_projection", "station_table",
+    "write_table", "StationWeights", "get_cmap", "colormap_lut", "lut_rgba",
+    "FieldEngine", "SharedFieldStore", "attach_fields", "CrossSection",
+    "parse_path", "RainAccum", "accum_windows", "TimeReducer", "day_windows",
+    "band_cmap"
+]
 
 
 def get_gridloc(loc_list, loc):
@@ -46,6 +88,40 @@ def get_gridloc(loc_list, loc):
     return iloc
 
 
+def get_gridlocs(loc_list, locs):
+    """近傍のデータ点取り出し（多数の点をまとめて求める）
+
+    Parameters:
+    ----------
+    loc_list: list(float, float, ...) or numpy.ndarray
+        データ点のリスト
+    locs: numpy.ndarray
+        取り出す点（1次元）
+    ----------
+    Returns:
+    ----------
+    ilocs: numpy.ndarray
+        近傍データ点のグリッド番号（1次元、get_gridlocと同じ点を返す）
+    ----------
+    """
+    # データ点は単調に増加または減少している（格子の経度・緯度）ので、
+    # 二分探索で挟む2点を求め、近い方を選ぶ（等距離ならget_gridlocと同じく番号の小さい方）
+    loc_list = np.asarray(loc_list, dtype=np.float64)
+    locs = np.atleast_1d(np.asarray(locs, dtype=np.float64))
+    n = len(loc_list)
+    descending = n > 1 and loc_list[0] > loc_list[-1]
+    a = loc_list[::-1] if descending else loc_list
+    pos = np.clip(np.searchsorted(a, locs), 1, max(n - 1, 1))
+    lo = pos - 1
+    hi = np.minimum(pos, n - 1)
+    dlo = np.abs(locs - a[lo])
+    dhi = np.abs(a[hi] - locs)
+    if descending:
+        # 並べ替える前の番号が小さいのはhiの方
+        return n - 1 - np.where(dhi <= dlo, hi, lo)
+    return np.where(dlo <= dhi, lo, hi)
+
+
 #
 def mktheta(pres, tem, rh):
     """気圧、気温、相対湿度の入力から相当温位、飽和相当温位を求める
@@ -97,6 +173,91 @@ def mktheta(pres, tem, rh):
     return (the, thes)
 
 
+def mkthetae(pres, tem, rh, dtype=np.float32, out=None, out_s=None,
+             opt_thes=False):
+    """気圧、気温、相対湿度の入力から相当温位を求める（mkthetaの省メモリ版）
+
+    mkthetaと同じ式で、作業用の配列は出力と同じ1つだけにし、
+    (p00 / p)**(Rd/Cp)は気圧の配列の大きさで1回だけ求める。
+    入力はブロードキャストできればよく、例えば気圧を(気圧面, 1, 1)、
+    気温・相対湿度を(予報時間, 気圧面, 緯度, 経度)として全てまとめて求められる
+
+    Parameters:
+    ----------
+    pres: float or numpy.ndarray
+        気圧 [Pa]
+    tem: float or numpy.ndarray
+        気温 [K]
+    rh: float or numpy.ndarray
+        相対湿度 [%]
+    dtype: numpy.dtype
+        計算と出力の型（デフォルト：float32）
+    out: numpy.ndarray
+        相当温位を書き込む配列（Noneなら新たに作成する）
+    out_s: numpy.ndarray
+        飽和相当温位を書き込む配列（opt_thes=Trueの場合のみ、Noneなら新たに作成する）
+    opt_thes: bool
+        飽和相当温位も返すかどうか
+    ----------
+    Returns:
+    ----------
+    the: numpy.ndarray
+        相当温位 [K]
+    thes: numpy.ndarray
+        飽和相当温位 [K]（opt_thes=Trueの場合のみ）
+    ----------
+    """
+    Rd = 287.04  # gas constant of dry air [J/K/kg]
+    Rv = 461.50  # gas constant of water vapor [J/K/kg]
+    es0 = 610.7  # Saturate pressure of water vapor at 0C [Pa]
+    Lq = 2.5008e6  # latent heat for evapolation at 0C [kg/m3]
+    emelt = 3.40e5  # Latent heat of melting [kg/m3]
+    Tqice = 273.15  #  Wet-bulb temp. rain/snow [K]
+    Tmelt = 273.15  # Melting temperature of water [K]
+    Cp = 1004.6  # specific heat at constant pressure of air (J/K/kg)
+    p00 = 100000.0  # reference pressure 1000 [hPa]
+    pres = np.asarray(pres, dtype=dtype)
+    tem = np.asarray(tem, dtype=dtype)
+    rh = np.asarray(rh, dtype=dtype)
+    shape = np.broadcast_shapes(pres.shape, tem.shape, rh.shape)
+    # 気圧だけで決まる係数（気圧の配列の大きさで求める）
+    pfac = (p00 / pres)**(Rd / Cp)
+    qfac = Rd / Rv * es0 / pres
+    # 作業用の配列（最後に相当温位になる）
+    if out is None:
+        out = np.empty(shape, dtype=dtype)
+    a = out
+    # 飽和比湿の指数部：(Lq + emelt/2*(1-sign(T-Tqice))) / Rv * (1/Tmelt - 1/T)
+    np.divide(1.0, tem, out=a)
+    np.subtract(1.0 / Tmelt, a, out=a)
+    np.multiply(a, Lq / Rv, out=a)
+    # 0℃以下では融解熱を加える（0℃ちょうどはsign=0で半分）
+    cold = np.broadcast_to(tem < Tqice, shape)
+    np.multiply(a, (Lq + emelt) / Lq, out=a, where=cold)
+    zero = np.broadcast_to(tem == Tqice, shape)
+    if zero.any():
+        np.multiply(a, (Lq + emelt / 2.0) / Lq, out=a, where=zero)
+    np.exp(a, out=a)
+    # 飽和比湿を求める
+    np.multiply(a, qfac, out=a)
+    # 飽和相当温位を求める
+    if opt_thes:
+        if out_s is None:
+            out_s = np.empty(shape, dtype=dtype)
+        np.multiply(a, Lq / Cp, out=out_s)
+        np.add(out_s, tem, out=out_s)
+        np.multiply(out_s, pfac, out=out_s)
+    # 比湿に潜熱を掛けた値を求める
+    np.multiply(a, rh, out=a)
+    np.multiply(a, 0.01 * Lq / Cp, out=a)
+    # 相当温位を求める
+    np.add(a, tem, out=a)
+    np.multiply(a, pfac, out=a)
+    if opt_thes:
+        return (out, out_s)
+    return out
+
+
 def convert_png2gif(input_filenames, delay="80", output_filename="output.gif"):
     """convertを使い、pngからgifアニメーションに変換する
 
@@ -160,6 +321,34 @@ def convert_png2mp4(
         os.remove(output_filename)
 
 
+def savefig(output_filename, sink=None, dpi=None):
+    """図を保存する
+
+    描画はその場で行い、減色・圧縮・書き出しはutils.encodeのスレッドで行う
+
+    Parameters:
+    ----------
+    output_filename: str
+        出力ファイル名（拡張子はutils.encode.image_formatに合わせて変わる）
+    sink: AnimSink
+        フレームを渡すアニメーションの出力先（Noneなら画像ファイルに保存）
+    dpi: int
+        解像度（デフォルト：作図する品質の解像度、sinkを使う場合はsinkの解像度）
+    ----------
+    """
+    if dpi is None:
+        dpi = tier_dpi()
+    if sink is None and is_vector():
+        # ベクター形式はその場で書き出す
+        save_vector(plt.gcf(), output_filename, dpi=dpi)
+    elif sink is None:
+        # bbox_inches='tight'相当に切り出して書き出す
+        frame = render_rgba(plt.gcf(), dpi=dpi)
+        get_encoder().submit(frame, output_filename, dpi=dpi)
+    else:
+        sink.add_frame(plt.gcf(), output_filename)
+
+
 def post(output_filenames):
     """後処理(中間ファイルの削除)
 
@@ -173,7 +362,14 @@ def post(output_filenames):
             os.remove(f)
 
 
-def _construct_parser(opt_sta, opt_lev, opt_dset):
+def _construct_parser(opt_sta,
+                      opt_lev,
+                      opt_dset,
+                      opt_zoom=False,
+                      opt_tier=False,
+                      opt_proj=False,
+                      opt_port=False,
+                      opt_path=False):
     """ オプションの読み込み
 
     Parameters:
@@ -184,6 +380,16 @@ def _construct_parser(opt_sta, opt_lev, opt_dset):
         気圧面を指定するかどうか
     opt_dset: bool
         GSMかMSMを指定するかどうか
+    opt_zoom: bool
+        タイルのズームレベルを指定するかどうか
+    opt_tier: bool
+        作図の品質（簡易版、通常版）を指定するかどうか
+    opt_proj: bool
+        地図の投影法を指定するかどうか
+    opt_port: bool
+        サーバーのポート番号を指定するかどうか
+    opt_path: bool
+        鉛直断面を作図する線を指定するかどうか
     Returns
     ----------
     parser: argparse.ArgumentParse
@@ -218,6 +424,36 @@ def _construct_parser(opt_sta, opt_lev, opt_dset):
                             type=str,
                             help=('dataset name: GSM or MSM'),
                             metavar='<dset>')
+    if opt_zoom:
+        parser.add_argument('--zoom',
+                            type=str,
+                            help=('zoom levels of XYZ tiles; e.g. 4-7, 5,6'),
+                            metavar='<zoom>')
+    if opt_tier:
+        parser.add_argument(
+            '--tier',
+            type=str,
+            help=('quick: quick-look only, full: full quality only, ' +
+                  'both: quick-look first, then replaced by full quality'),
+            metavar='<tier>')
+    if opt_proj:
+        parser.add_argument(
+            '--proj',
+            type=str,
+            help=('map projection; pc: PlateCarree, ' +
+                  'lcc: Lambert Conformal (same as JMA weather charts)'),
+            metavar='<proj>')
+    if opt_port:
+        parser.add_argument('--port',
+                            type=int,
+                            help=('port number of the render server'),
+                            metavar='<port>')
+    if opt_path:
+        parser.add_argument(
+            '--path',
+            type=str,
+            help=('path of the cross section; lon,lat:lon,lat[:lon,lat...]'),
+            metavar='<path>')
     parser.add_argument(
         '--input_dir',
         type=str,
@@ -230,7 +466,15 @@ def _construct_parser(opt_sta, opt_lev, opt_dset):
     return parser
 
 
-def parse_command(args, opt_sta=True, opt_lev=False, opt_dset=False):
+def parse_command(args,
+                  opt_sta=True,
+                  opt_lev=False,
+                  opt_dset=False,
+                  opt_zoom=False,
+                  opt_tier=False,
+                  opt_proj=False,
+                  opt_port=False,
+                  opt_path=False):
     """オプションの読み込み
 
     Parameters:
@@ -241,6 +485,17 @@ def parse_command(args, opt_sta=True, opt_lev=False, opt_dset=False):
         気圧面を指定するかどうか（デフォルト：False）
     opt_dset: bool
         GSMかMSMを指定するかどうか（デフォルト：False）
+    opt_zoom: bool
+        タイルのズームレベルを指定するかどうか（デフォルト：False）
+    opt_tier: bool
+        作図の品質を指定するかどうか（デフォルト：False）
+    opt_proj: bool
+        地図の投影法を指定するかどうか（デフォルト：False）
+        指定した投影法はset_projectionで設定される
+    opt_port: bool
+        サーバーのポート番号を指定するかどうか（デフォルト：False）
+    opt_path: bool
+        鉛直断面を作図する線を指定するかどうか（デフォルト：False）
     ----------
     Returns:
     ----------
@@ -248,7 +503,8 @@ def parse_command(args, opt_sta=True, opt_lev=False, opt_dset=False):
         読み込んだオプション
     ----------
     """
-    parser = _construct_parser(opt_sta, opt_lev, opt_dset)
+    parser = _construct_parser(opt_sta, opt_lev, opt_dset, opt_zoom,
+                               opt_tier, opt_proj, opt_port, opt_path)
     parsed_args = parser.parse_args(args[1:])
     if parsed_args.fcst_date is None:
         raise ValueError("fcst_date is needed")
@@ -262,4 +518,21 @@ def parse_command(args, opt_sta=True, opt_lev=False, opt_dset=False):
     if opt_dset:
         if parsed_args.dset is None:
             parsed_args.dset = "GSM"
+    if opt_zoom:
+        if parsed_args.zoom is None:
+            parsed_args.zoom = zoom_default
+    if opt_tier:
+        if parsed_args.tier is None:
+            parsed_args.tier = tier.tier_default
+        tier_list(parsed_args.tier)  # 指定が正しいか調べる
+    if opt_proj:
+        if parsed_args.proj is None:
+            parsed_args.proj = proj.proj_default
+        set_projection(parsed_args.proj)  # 指定が正しくなければ例外
+    if opt_port:
+        if parsed_args.port is None:
+            parsed_args.port = port_default
+    if opt_path:
+        if parsed_args.path is None:
+            parsed_args.path = path_default
     return parsed_args
@@ -0,0 +1,159 @@
+#
+#  2026/10/19 予報時間方向の累積降水量から、任意の期間の降水量を求める
+#
+import tempfile
+import numpy as np
+
+# 作図する降水量の期間（時間、予報時間の終わりまでの期間）
+rain_windows = [1, 3, 6, 12, 24, 48]
+
+# 期間をずらしながら作図する場合の期間（時間、None：作図しない）と、ずらす間隔（時間）
+sliding_window = None
+sliding_step = 3
+
+# 累積降水量をファイルに置くかどうか（予報時間が長い場合にメモリを使わない）
+opt_memmap = False
+
+# ファイルを置くディレクトリ（None：システムの一時ディレクトリ）
+memmap_dir = None
+
+
+def accum_windows(fcst_end, windows=None, sliding=None, step=None,
+                  hours=None):
+    """作図する降水量の期間のリストを作成する
+
+    Parameters:
+    ----------
+    fcst_end: int
+        予報時間の終わり（0-fcst_endの期間は必ず含める）
+    windows: list(int, int, ...)
+        fcst_endまでの期間の長さ（時間、デフォルト：rain_windows）
+    sliding: int
+        期間をずらしながら作図する場合の期間の長さ（時間、デフォルト：sliding_window）
+    step: int
+        期間をずらす間隔（時間、デフォルト：sliding_step）
+    hours: list(int, int, ...)
+        データがある予報時間（Noneなら全ての予報時間、ない時刻で始まる・終わる期間は除く）
+    ----------
+    Returns:
+    ----------
+    spans: list((int, int), ...)
+        期間の(始まり, 終わり)のリスト（予報時間、重複なし）
+    ----------
+    """
+    if windows is None:
+        windows = rain_windows
+    if sliding is None:
+        sliding = sliding_window
+    if step is None:
+        step = sliding_step
+    spans = [(0, fcst_end)]
+    spans += [(fcst_end - w, fcst_end) for w in windows if w < fcst_end]
+    if sliding is not None:
+        spans += [(h - sliding, h)
+                  for h in range(sliding, fcst_end + 1, step)]
+    if hours is not None:
+        hours = set(int(h) for h in hours)
+        spans = [(h0, h1) for h0, h1 in spans if h0 in hours and h1 in hours]
+    return sorted(set(spans), key=lambda s: (s[1] - s[0], s[1]))
+
+
+class RainAccum():
+    """予報時刻からの累積降水量を予報時間毎に持ち、任意の期間の降水量を求める
+
+    前1時間降水量は読み込み順に足し込み、累積降水量はそのまま置く。
+    h0-h1の降水量はh1とh0の累積降水量の1回の引き算で求める
+    """
+
+    def __init__(self, hours, shape, memmap=None):
+        """累積降水量の置き場所の作成
+
+        Parameters:
+        ----------
+        hours: list(int, int, ...)
+            累積降水量を持つ予報時間
+        shape: tuple
+            格子の形（緯度, 経度）
+        memmap: bool
+            ファイルに置くかどうか（デフォルト：opt_memmap）
+        ----------
+        """
+        if memmap is None:
+            memmap = opt_memmap
+        self.hours = sorted(set(int(h) for h in hours))
+        self.index = {h: n for n, h in enumerate(self.hours)}
+        cube_shape = (len(self.hours), ) + tuple(shape)
+        if memmap:
+            # 閉じると消える一時ファイルに置く
+            self.cum = np.memmap(tempfile.TemporaryFile(dir=memmap_dir),
+                                 dtype=np.float32,
+                                 mode="w+",
+                                 shape=cube_shape)
+        else:
+            self.cum = np.zeros(cube_shape, dtype=np.float32)
+        self.filled = np.zeros(len(self.hours), dtype=bool)
+        # 足し込みは倍精度で行う
+        self._run = np.zeros(shape, dtype=np.float64)
+        self._last = None
+
+    def add(self, hour, rain):
+        """前1時間降水量を足し込む（予報時間の順に1時間毎に与える）
+
+        Parameters:
+        ----------
+        hour: int
+            予報時間
+        rain: ndarray
+            hour-1からhourまでの前1時間降水量（2次元、mm、マスクされた値はNaNにする）
+        ----------
+        """
+        hour = int(hour)
+        if self._last is not None and hour != self._last + 1:
+            raise ValueError("hourly rain must be added in order: " +
+                             str(self._last) + " -> " + str(hour))
+        # 欠損値があれば、以降の累積降水量も欠損値になる
+        self._run += np.ma.filled(rain, np.nan)
+        self._last = hour
+        if hour in self.index:
+            self.set_cum(hour, self._run)
+
+    def set_cum(self, hour, cum):
+        """累積降水量をそのまま置く（GSMの累積降水量など）
+
+        Parameters:
+        ----------
+        hour: int
+            予報時間
+        cum: ndarray
+            予報時刻からの累積降水量（2次元、mm、マスクされた値はNaNにする）
+        ----------
+        """
+        n = self.index[int(hour)]
+        self.cum[n] = np.ma.filled(cum, np.nan)
+        self.filled[n] = True
+
+    def window(self, h0, h1):
+        """期間の降水量を返す
+
+        Parameters:
+        ----------
+        h0: int
+            期間の始まり（予報時間）
+        h1: int
+            期間の終わり（予報時間）
+        ----------
+        Returns:
+        ----------
+        rain: ndarray
+            h0-h1の降水量（2次元、mm、欠損値はマスクする）
+        ----------
+        """
+        n0, n1 = self.index[int(h0)], self.index[int(h1)]
+        if not (self.filled[n0] and self.filled[n1]):
+            raise ValueError("no accumulated rain at " + str(h0) + " or " +
+                             str(h1))
+        return np.ma.masked_invalid(self.cum[n1] - self.cum[n0])
+
+    def close(self):
+        """累積降水量を消す（ファイルに置いた場合は参照がなくなるとファイルも消える）"""
+        self.cum = None
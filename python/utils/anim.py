@@ -0,0 +1,304 @@
+#
+#  2026/10/19 描画したフレームを直接アニメーションに変換する
+#
+import os
+import queue
+import threading
+import subprocess
+import numpy as np
+from PIL import Image
+from PIL import GifImagePlugin
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from . import encode
+from .encode import get_encoder, is_vector, save_vector
+from .tier import tier_dpi
+
+
+def render_rgba(fig, dpi=300, pad_inches=0.1):
+    """Aggで描画し、bbox_inches='tight'相当に切り出したRGBA配列を返す
+
+    Parameters:
+    ----------
+    fig: matplotlib Figure
+        描画する図
+    dpi: int
+        解像度
+    pad_inches: float
+        図の周囲に残す余白（inch）
+    ----------
+    Returns:
+    ----------
+    frame: ndarray
+        RGBA画像（3次元、uint8、(ny, nx, 4)）
+    ----------
+    """
+    fig.set_dpi(dpi)
+    canvas = fig.canvas
+    if not isinstance(canvas, FigureCanvasAgg):
+        canvas = FigureCanvasAgg(fig)
+    canvas.draw()
+    # 描画範囲（inch）
+    bbox = fig.get_tightbbox(canvas.get_renderer()).padded(pad_inches)
+    buf = np.asarray(canvas.buffer_rgba())
+    ny, nx = buf.shape[0:2]
+    # 画像の座標（上から下）に変換して切り出す
+    x0 = max(int(np.floor(bbox.x0 * dpi)), 0)
+    x1 = min(int(np.ceil(bbox.x1 * dpi)), nx)
+    y0 = max(int(np.floor(ny - bbox.y1 * dpi)), 0)
+    y1 = min(int(np.ceil(ny - bbox.y0 * dpi)), ny)
+    return buf[y0:y1, x0:x1].copy()
+
+
+def _fit_frame(frame, shape):
+    """フレームの大きさを揃える（不足分は白で埋める）"""
+    if frame.shape[0:2] == shape:
+        return frame
+    d = np.full(shape + (frame.shape[2], ), 255, dtype=frame.dtype)
+    ny = min(shape[0], frame.shape[0])
+    nx = min(shape[1], frame.shape[1])
+    d[0:ny, 0:nx] = frame[0:ny, 0:nx]
+    return d
+
+
+class AnimSink():
+    """描画したフレームをpngを経由せずにgif/mp4アニメーションに変換する"""
+
+    def __init__(self,
+                 gif_filename=None,
+                 mp4_filename=None,
+                 delay="80",
+                 pfrate="1",
+                 mfrate="30",
+                 dpi=None,
+                 save_png=False,
+                 max_pending=None):
+        """出力の設定
+
+        Parameters:
+        ----------
+        gif_filename: str
+            出力するgifファイル（Noneなら出力しない）
+        mp4_filename: str
+            出力するmp4ファイル（Noneなら出力しない）
+        delay: int
+            gifアニメーションを切り替える間隔（1/100秒）
+        pfrate: int
+            framerate of input pictures (files/s)
+        mfrate: int
+            movie framerate for output (fps)
+        dpi: int
+            フレームの解像度（デフォルト：作図する品質の解像度）
+        save_png: bool
+            フレーム毎の画像ファイルも書き出すかどうか（形式はutils.encodeで設定）
+        max_pending: int
+            変換待ちにできるフレーム数の上限
+            （デフォルト：utils.encode.max_pending_default）
+        ----------
+        """
+        self.gif_filename = gif_filename
+        self.mp4_filename = mp4_filename
+        self.delay = delay
+        self.pfrate = pfrate
+        self.mfrate = mfrate
+        if dpi is None:
+            dpi = tier_dpi()
+        self.dpi = dpi
+        self.save_png = save_png
+        self.shape = None  # 最初のフレームの大きさ
+        self.palette = None  # gifで共有するパレット
+        self.gif_file = None  # 書き込み中のgifファイル
+        self.gif_count = 0  # 書き込んだgifのフレーム数
+        self.proc = None
+        self.last_frame = None  # 最後に追加したフレーム
+        if max_pending is None:
+            max_pending = encode.max_pending_default
+        # 変換はスレッドで行い、描画側は次のフレームに進む
+        self.queue = queue.Queue(maxsize=max(max_pending, 1))
+        self.thread = None
+        # 変換で発生したエラー（片方が失敗しても、もう片方は書き出す）
+        self.mp4_error = None
+        self.gif_error = None
+
+    def add_frame(self, fig, output_filename=None):
+        """図を描画してフレームを追加する
+
+        Parameters:
+        ----------
+        fig: matplotlib Figure
+            描画する図
+        output_filename: str
+            save_png=Trueの場合に書き出す画像ファイル名
+        ----------
+        """
+        if self.save_png and output_filename is not None and is_vector():
+            # ベクター形式は描画と同じスレッドで書き出す
+            save_vector(fig, output_filename, dpi=self.dpi)
+        frame = render_rgba(fig, dpi=self.dpi)
+        if self.save_png and output_filename is not None and not is_vector():
+            get_encoder().submit(frame, output_filename, dpi=self.dpi)
+        self.add_rgba(frame)
+
+    def add_file(self, input_filename):
+        """pngファイルを読み込んでフレームを追加する
+
+        Parameters:
+        ----------
+        input_filename: str
+            入力ファイル（png、webp）
+        ----------
+        """
+        with Image.open(input_filename) as img:
+            frame = np.asarray(img.convert("RGBA"))
+        self.add_rgba(frame)
+
+    def add_rgba(self, frame):
+        """RGBA配列をフレームとして追加する
+
+        Parameters:
+        ----------
+        frame: ndarray
+            RGBA画像（3次元、uint8、(ny, nx, 4)）
+        ----------
+        """
+        self.last_frame = frame
+        if self.shape is None:
+            self.shape = frame.shape[0:2]
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+        # 変換待ちのフレームが上限に達している場合は空くまで待つ
+        self.queue.put(frame)
+
+    def _run(self):
+        """フレームをgif/mp4に変換する（スレッドで実行）"""
+        while True:
+            frame = self.queue.get()
+            if frame is None:
+                break
+            frame = _fit_frame(frame, self.shape)
+            if self.mp4_filename is not None and self.mp4_error is None:
+                try:
+                    self._write_mp4(frame)
+                except Exception as e:
+                    self.mp4_error = e
+            if self.gif_filename is not None and self.gif_error is None:
+                try:
+                    self._append_gif(frame)
+                except Exception as e:
+                    self.gif_error = e
+
+    def close(self):
+        """アニメーションを書き出して終了する"""
+        if self.thread is not None:
+            # 全てのフレームの変換が終わるまで待つ
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+        # フレーム毎の画像ファイルの書き出しを待つ
+        if self.save_png:
+            get_encoder().flush()
+        if self.proc is not None:
+            try:
+                self._close_mp4()
+            except Exception as e:
+                if self.mp4_error is None:
+                    self.mp4_error = e
+        if self.gif_file is not None:
+            try:
+                self._close_gif()
+            except Exception as e:
+                if self.gif_error is None:
+                    self.gif_error = e
+        # 両方を書き出してからエラーを送出する
+        for error in (self.mp4_error, self.gif_error):
+            if error is not None:
+                raise error
+
+    def _close_mp4(self):
+        """ffmpegを終了してmp4ファイルを置き換える"""
+        proc = self.proc
+        self.proc = None
+        try:
+            proc.stdin.close()
+        finally:
+            proc.wait()
+            print(proc.stderr.read().decode("utf-8"))
+            proc.stderr.close()
+        if self.mp4_error is not None or proc.returncode != 0:
+            # 途中で失敗したファイルは残さない
+            if os.path.exists(self.mp4_tmp):
+                os.remove(self.mp4_tmp)
+            if proc.returncode != 0:
+                raise subprocess.CalledProcessError(proc.returncode, "ffmpeg")
+            return
+        # 書き終わってから置き換える（簡易版を表示中でも途中のファイルを見せない）
+        if os.path.getsize(self.mp4_tmp) == 0:
+            os.remove(self.mp4_tmp)
+        else:
+            os.replace(self.mp4_tmp, self.mp4_filename)
+
+    def _close_gif(self):
+        """gifファイルを閉じて置き換える"""
+        f = self.gif_file
+        self.gif_file = None
+        try:
+            if self.gif_error is None:
+                f.write(b";")  # 終端
+        finally:
+            f.close()
+        if self.gif_error is not None:
+            # 途中で失敗したファイルは残さない
+            if os.path.exists(self.gif_tmp):
+                os.remove(self.gif_tmp)
+            return
+        print("write: ", self.gif_filename, self.gif_count)
+        os.replace(self.gif_tmp, self.gif_filename)
+
+    def _write_mp4(self, frame):
+        """ffmpegの標準入力にフレームを書き込む"""
+        if self.proc is None:
+            # 書き込み中のファイル（既にある場合には消す）
+            root, ext = os.path.splitext(self.mp4_filename)
+            self.mp4_tmp = root + ".tmp" + ext
+            if os.path.exists(self.mp4_tmp):
+                os.remove(self.mp4_tmp)
+            ny, nx = self.shape
+            args = [
+                "ffmpeg", "-loglevel", "error", "-f", "rawvideo", "-pix_fmt",
+                "rgba", "-s",
+                str(nx) + "x" + str(ny), "-framerate", self.pfrate, "-i", "-",
+                "-r", self.mfrate, "-an", "-vcodec", "libx264", "-pix_fmt",
+                "yuv420p", "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2:color=white",
+                self.mp4_tmp
+            ]
+            print(args)
+            self.proc = subprocess.Popen(args=args,
+                                         stdin=subprocess.PIPE,
+                                         stdout=subprocess.DEVNULL,
+                                         stderr=subprocess.PIPE)
+        self.proc.stdin.write(np.ascontiguousarray(frame).tobytes())
+
+    def _append_gif(self, frame):
+        """共有パレットで減色したフレームをgifファイルに書き込む
+
+        フレームは書き込んだら捨てるので、メモリはフレーム数によらない
+        """
+        img = Image.fromarray(frame).convert("RGB")
+        if self.palette is None:
+            # カラーバーに全ての陰影の色が含まれるため、最初のフレームからパレットを作る
+            self.palette = img.quantize(colors=256,
+                                        method=Image.Quantize.MEDIANCUT)
+            img = self.palette
+            # 書き込み中のファイル（既にある場合には上書きする）
+            self.gif_tmp = self.gif_filename + ".tmp"
+            self.gif_file = open(self.gif_tmp, "wb")
+            # 共有パレットを全体の色テーブルとしたヘッダー（繰り返し再生する）
+            header, _ = GifImagePlugin.getheader(self.palette.copy(),
+                                                 info=dict(loop=0))
+            self.gif_file.write(b"".join(header))
+        else:
+            img = img.quantize(palette=self.palette, dither=Image.Dither.NONE)
+        for data in GifImagePlugin.getdata(img,
+                                           duration=int(self.delay) * 10):
+            self.gif_file.write(data)
+        self.gif_count += 1
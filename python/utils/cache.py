@@ -0,0 +1,258 @@
+#
+#  2026/10/19 入力データのハッシュをキーにした作図結果のキャッシュ
+#
+import os
+import sys
+import glob
+import time
+import shutil
+import hashlib
+import numpy as np
+import matplotlib
+from .encode import output_name, get_encoder, is_vector
+from . import encode
+from .proj import projection_name
+
+# 作図結果のキャッシュを使うかどうか
+opt_frame_cache = True
+
+# キャッシュを置くディレクトリ（環境変数CACHEDIR_GPVで指定可能）
+cache_dir_default = os.environ.get('CACHEDIR_GPV', 'cache')
+
+# キャッシュを残す日数（最後に使われてからの日数、Noneなら消さない）
+max_age_days = 7
+
+# プロダクト毎のキャッシュの容量の上限（MB、超えると古いものから消す、Noneなら制限しない）
+max_size_mb = 2000
+
+_code_version = None
+
+
+def code_version():
+    """作図プログラムのバージョン（ソースコードのハッシュ）を返す
+
+    実行中のプログラムと./python/以下のパッケージのソースコード、
+    matplotlibのバージョンから求める
+    """
+    global _code_version
+    if _code_version is None:
+        h = hashlib.sha256(matplotlib.__version__.encode("utf-8"))
+        top = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        paths = sorted(glob.glob(os.path.join(top, "*", "*.py")))
+        main = getattr(sys.modules.get("__main__"), "__file__", None)
+        if main is not None:
+            paths.insert(0, main)
+        for path in paths:
+            with open(path, "rb") as f:
+                h.update(f.read())
+        _code_version = h.hexdigest()
+    return _code_version
+
+
+def _update_field(h, d):
+    """ハッシュにデータを追加する"""
+    if d is None or isinstance(d, (str, int, float, bool)):
+        h.update(repr(d).encode("utf-8"))
+        return
+    d = np.asanyarray(d)
+    h.update((str(d.dtype) + str(d.shape)).encode("utf-8"))
+    h.update(np.ascontiguousarray(np.ma.getdata(d)).tobytes())
+    if np.ma.is_masked(d):
+        h.update(np.ascontiguousarray(np.ma.getmaskarray(d)).tobytes())
+
+
+class FrameCache():
+    """入力データのハッシュをキーとして作図結果のpngファイルを保存する"""
+
+    def __init__(self, product, cache_dir=None, enabled=None):
+        """キャッシュの設定
+
+        Parameters:
+        ----------
+        product: str
+            作図プロダクト名（例：msm_mslp）
+        cache_dir: str
+            キャッシュを置くディレクトリ（デフォルト：cache_dir_default）
+        enabled: bool
+            キャッシュを使うかどうか（デフォルト：opt_frame_cache）
+        ----------
+        """
+        self.product = product
+        if cache_dir is None:
+            cache_dir = cache_dir_default
+        if enabled is None:
+            enabled = opt_frame_cache
+        self.cache_dir = os.path.join(cache_dir, product)
+        self.enabled = enabled
+        self.pruned = False  # 古いキャッシュを消したかどうか
+
+    def key(self, sta, *fields, **style):
+        """キャッシュのキーを返す
+
+        Parameters:
+        ----------
+        sta: str
+            地点名
+        fields: ndarray or str
+            作図に使う入力データ（タイトルなどの文字列も可）
+        style: dict
+            作図のスタイルを決めるパラメータ
+        ----------
+        Returns:
+        ----------
+        key: str
+            入力データ、地点、スタイル、地図の投影法、出力形式、
+            プログラムのバージョンのハッシュ
+        ----------
+        """
+        h = hashlib.sha256()
+        h.update(code_version().encode("utf-8"))
+        h.update(self.product.encode("utf-8"))
+        h.update(projection_name().encode("utf-8"))
+        # 出力形式と圧縮の設定（png、png8は拡張子が同じなので区別する）
+        for d in (encode.image_format, encode.compress_level,
+                  encode.palette_colors, encode.webp_lossless,
+                  encode.webp_quality):
+            _update_field(h, d)
+        _update_field(h, sta)
+        for d in fields:
+            _update_field(h, d)
+        for k in sorted(style):
+            h.update(k.encode("utf-8"))
+            _update_field(h, style[k])
+        return h.hexdigest()
+
+    def path(self, key):
+        """キャッシュファイルのパスを返す（拡張子は出力形式に合わせる）"""
+        return output_name(os.path.join(self.cache_dir, key[0:2],
+                                        key + ".png"))
+
+    def get(self, key, output_filename, sink=None):
+        """キャッシュがあれば作図結果を取り出す
+
+        Parameters:
+        ----------
+        key: str
+            キャッシュのキー
+        output_filename: str
+            出力ファイル名
+        sink: AnimSink
+            フレームを渡すアニメーションの出力先
+        ----------
+        Returns:
+        ----------
+        bool
+            キャッシュがあった場合はTrue
+        ----------
+        """
+        # ベクター形式ではフレームを読み込めないのでキャッシュを使わない
+        if not self.enabled or is_vector():
+            return False
+        cache_path = self.path(key)
+        if not os.path.isfile(cache_path):
+            return False
+        # 使われた時刻を記録する（古いものから消すため）
+        try:
+            os.utime(cache_path)
+        except OSError:
+            pass
+        output_filename = output_name(output_filename)
+        print("cache: ", output_filename, cache_path)
+        if sink is None or sink.save_png:
+            # 同じファイルへの書き出しが残っていれば終わるまで待つ
+            get_encoder().wait(output_filename)
+            _link(cache_path, output_filename)
+        if sink is not None:
+            sink.add_file(cache_path)
+        return True
+
+    def put(self, key, output_filename, sink=None):
+        """作図結果をキャッシュに保存する
+
+        Parameters:
+        ----------
+        key: str
+            キャッシュのキー
+        output_filename: str
+            出力ファイル名
+        sink: AnimSink
+            フレームを渡したアニメーションの出力先
+        ----------
+        """
+        if not self.enabled or is_vector():
+            return
+        # 実行毎に1回、古いキャッシュを消す
+        if not self.pruned:
+            self.prune()
+            self.pruned = True
+        cache_path = self.path(key)
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        encoder = get_encoder()
+        if sink is None or sink.save_png:
+            # 出力ファイルの書き出しが終わってからコピーする
+            encoder.copy_to(output_filename, cache_path)
+        else:
+            encoder.submit(sink.last_frame, cache_path, dpi=sink.dpi)
+
+    def prune(self, max_age=None, max_size=None):
+        """古いキャッシュを消す
+
+        Parameters:
+        ----------
+        max_age: float
+            最後に使われてから残す日数（デフォルト：max_age_days）
+        max_size: float
+            容量の上限（MB、デフォルト：max_size_mb）
+        ----------
+        Returns:
+        ----------
+        num: int
+            消したファイルの数
+        ----------
+        """
+        if max_age is None:
+            max_age = max_age_days
+        if max_size is None:
+            max_size = max_size_mb
+        entries = []
+        for path in glob.glob(os.path.join(self.cache_dir, "*", "*")):
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        # 最後に使われた時刻の新しい順
+        entries.sort(reverse=True)
+        now = time.time()
+        total = 0
+        num = 0
+        for mtime, size, path in entries:
+            expired = max_age is not None and now - mtime > max_age * 86400
+            # 書き込み中のファイルは容量の制限では消さない
+            over = (max_size is not None
+                    and total + size > max_size * 1024 * 1024
+                    and not path.endswith(".tmp"))
+            if expired or over:
+                try:
+                    os.remove(path)
+                    num += 1
+                    continue
+                except OSError:
+                    pass
+            total += size
+        if num > 0:
+            print("cache: ", self.cache_dir, num, "files removed")
+        return num
+
+
+def _link(src, dst):
+    """ハードリンクを作成する（できない場合はコピー）"""
+    tmp_path = dst + ".link"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    try:
+        os.link(src, tmp_path)
+    except OSError:
+        shutil.copyfile(src, tmp_path)
+    # 表示中のファイルを途中の状態にしない
+    os.replace(tmp_path, dst)
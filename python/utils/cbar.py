@@ -1,10 +1,9 @@
 #
 #  2021/06/11 Yamashita
 #
-import matplotlib.pyplot as plt
 import matplotlib.ticker as ticker
 import numpy as np
-from .cutil import ColUtils
+from .cmaps import get_cmap, colormap_lut
 
 
 class val2col():
@@ -29,30 +28,42 @@ class val2col():
         self.tmax = tmax
         self.tstep = tstep
         self.cmap = cmap
-        self.cm = plt.get_cmap(self.cmap)
-        try:
-            self.cm = plt.get_cmap(self.cmap)
-        except:
-            cutils = ColUtils(cmap)  # 色テーブルの選択
-            self.cm = cutils.get_ctable()  # 色テーブルの取得
+        # 色テーブルの取得（matplotlibまたはColUtilsの名前、作成済みのものを使い回す）
+        self.cm = get_cmap(self.cmap)
+        self.lut = None  # 色の表（convで最初に使う時に作成する）
+
+    def _lut(self):
+        """色の表（0〜N-1：色テーブル、N：上限を超えた色、N+1：欠損値の色）"""
+        if self.lut is None:
+            # 色テーブルの参照表（0〜N-1：色、N：under、N+1：over、N+2：欠損値）から作る
+            lut = colormap_lut(self.cm)
+            n = self.cm.N
+            self.lut = lut[np.r_[0:n, n + 1, n + 2]]
+        return self.lut
 
     def conv(self, val):
         """データをカラーに変換
 
         Parameters:
         ----------
-        val: float
-            データ
+        val: float or ndarray
+            データ（配列の場合は全ての要素をまとめて変換する）
         ----------
         Returns:
         ----------
         cmap
-            カラーマップ
+            カラーマップ（配列の場合は(..., 4)のRGBAのndarray）
         ----------
         """
-        n = (val - self.tmin) / (self.tmax - self.tmin) * self.cm.N
-        n = max(min(n, self.cm.N), 0)
-        return self.cm(int(n))
+        lut = self._lut()
+        n = (np.ma.filled(np.ma.asarray(val, dtype=np.float64), np.nan) -
+             self.tmin) / (self.tmax - self.tmin) * self.cm.N
+        # 色の表の番号（切り捨て、欠損値はN+1）
+        index = np.clip(n, 0, self.cm.N)
+        index = np.where(np.isnan(index), self.cm.N + 1, index).astype(int)
+        if index.ndim == 0:
+            return tuple(lut[index].tolist())
+        return lut[index]
 
     def colorbar(self,
                  fig=None,
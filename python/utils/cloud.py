@@ -0,0 +1,84 @@
+#
+#  2026/10/19 下層・中層・上層雲量のRGB合成画像
+#
+import numpy as np
+from .cmaps import get_cmap, lut_rgba, band_cmap
+
+# 雲量の陰影を付ける値のリスト（%）
+levels_default = np.arange(0, 100.1, 5)
+
+# 下層、中層、上層雲の色テーブル
+cmaps_default = ("Reds", "Greens", "Blues")
+
+# 各層の不透明度
+alpha_default = 0.3
+
+
+def _layer_rgb(cfr, cmap, levels):
+    """雲量を色テーブルのRGB（0〜1）に変換する（levelsの範囲外は描かない）"""
+    # contourfと同じ区間毎の色（上端の値はoverとして一番上の区間の色になる）
+    cmap, norm = band_cmap(get_cmap(cmap), levels)
+    cfr = np.ma.filled(np.ma.masked_invalid(cfr), np.nan)
+    valid = (cfr >= levels[0]) & (cfr <= levels[-1])
+    rgb = lut_rgba(cmap, norm(np.where(valid, cfr, levels[0])), bytes=False)
+    return rgb[..., 0:3], valid
+
+
+def cloud_rgba(cfrl,
+               cfrm,
+               cfrh,
+               levels=None,
+               cmaps=None,
+               alpha=None):
+    """下層・中層・上層雲量を重ねたRGBA画像を作成する
+
+    下層、中層、上層の順に不透明度alphaで重ねた陰影（contourfを3回重ねたもの）と
+    同じ色になる。先頭の次元に予報時間を並べれば、全ての時間をまとめて計算できる
+
+    Parameters:
+    ----------
+    cfrl: ndarray
+        下層雲量（2次元以上、最後の2次元が緯度・経度、%）
+    cfrm: ndarray
+        中層雲量（cfrlと同じ形、%）
+    cfrh: ndarray
+        上層雲量（cfrlと同じ形、%）
+    levels: list(float, float, ...)
+        陰影を付ける値のリスト（デフォルト：levels_default）
+    cmaps: tuple(str, str, str)
+        下層、中層、上層雲の色テーブル（デフォルト：cmaps_default）
+    alpha: float
+        各層の不透明度（デフォルト：alpha_default）
+    ----------
+    Returns:
+    ----------
+    rgba: ndarray
+        RGBA画像（uint8、cfrlの形 + (4, )）
+    ----------
+    """
+    if levels is None:
+        levels = levels_default
+    if cmaps is None:
+        cmaps = cmaps_default
+    if alpha is None:
+        alpha = alpha_default
+    levels = np.asarray(levels, dtype=np.float64)
+    shape = np.shape(cfrl)
+    # 乗算済みアルファで下から順に重ねる
+    color = np.zeros(shape + (3, ), dtype=np.float32)
+    trans = np.ones(shape, dtype=np.float32)  # 透過率
+    for cfr, cmap in zip((cfrl, cfrm, cfrh), cmaps):
+        rgb, valid = _layer_rgb(cfr, cmap, levels)
+        a = np.where(valid, alpha, 0.0).astype(np.float32)
+        color *= (1.0 - a)[..., np.newaxis]
+        color += a[..., np.newaxis] * rgb
+        trans *= (1.0 - a)
+    opacity = 1.0 - trans
+    rgba = np.empty(shape + (4, ), dtype=np.uint8)
+    # 乗算済みアルファを元に戻す
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rgb = np.where(opacity[..., np.newaxis] > 0,
+                       color / opacity[..., np.newaxis], 0.0)
+    rgba[..., 0:3] = np.clip(np.rint(rgb * 255), 0, 255)
+    rgba[..., 3] = np.rint(opacity * 255)
+    return rgba
@@ -0,0 +1,195 @@
+#
+#  2026/10/19 色テーブルの登録（プロセス内で1回だけ作成し、参照表と共に使い回す）
+#
+import numpy as np
+import matplotlib
+from matplotlib.colors import LinearSegmentedColormap
+from matplotlib.colors import ListedColormap
+from matplotlib.colors import BoundaryNorm
+from matplotlib.colors import Normalize
+
+# 色テーブルの色の数のデフォルト（matplotlibと同じ）
+ncolors_default = 256
+
+# 作成した色テーブル：(名前, under, over, 色の数)をキーとする
+_cmaps = dict()
+
+# 区間毎の色テーブル：(登録名, id, levels, extend)をキーとし、
+# (色テーブル, 区間の色テーブル, BoundaryNorm)を保持する
+_bands = dict()
+
+# 色テーブル毎の参照表：(登録名, id, bytes)をキーとし、(色テーブル, 参照表)を保持する
+_luts = dict()
+
+
+def _registered_name(name, under, over, N):
+    """matplotlibに登録する名前（例：gpv_s3pcpn_l_gray_brown_256）"""
+    return "_".join(
+        ["gpv", name,
+         str(under).lstrip("#"),
+         str(over).lstrip("#"),
+         str(N)])
+
+
+def _make_cmap(name, N):
+    """色テーブルを作成する（ColUtilsの名前、またはmatplotlibの名前）"""
+    from .cutil import segment_data
+    seg = segment_data(name)
+    if seg is not None:
+        return LinearSegmentedColormap(name, seg, N=N)
+    cmap = matplotlib.colormaps[name]
+    if cmap.N != N:
+        return cmap.resampled(N)
+    return cmap.copy()
+
+
+def get_cmap(name, under=None, over=None, N=None):
+    """色テーブルを返す（同じ指定の色テーブルは1回だけ作成する）
+
+    作成した色テーブルはmatplotlibにも登録する（plt.get_cmap(cmap.name)で取得できる）
+
+    Parameters:
+    ----------
+    name: str
+        色テーブルの名前（s3pcpn_lなどColUtilsの名前、またはmatplotlibの名前）
+    under: str
+        下限を下回った場合の色
+    over: str
+        上限を上回った場合の色
+    N: int
+        色の数（デフォルト：ncolors_default）
+    ----------
+    Returns:
+    ----------
+    cmap: matplotlib.colors.Colormap
+        色テーブル（共有されるので、変更しない）
+    ----------
+    """
+    if N is None:
+        N = ncolors_default
+    key = (name, under, over, N)
+    cmap = _cmaps.get(key)
+    if cmap is None:
+        cmap = _make_cmap(name, N)
+        if under is not None:
+            cmap.set_under(under)  # 下限を下回った場合の色を指定
+        if over is not None:
+            cmap.set_over(over)  # 上限を超えた場合の色を指定
+        cmap.name = _registered_name(name, under, over, N)
+        if cmap.name not in matplotlib.colormaps:
+            matplotlib.colormaps.register(cmap, name=cmap.name)
+        _cmaps[key] = cmap
+    return cmap
+
+
+def colormap_lut(cmap, bytes=False):
+    """色テーブルの参照表を返す（色テーブル毎に1回だけ作成する）
+
+    Parameters:
+    ----------
+    cmap: matplotlib.colors.Colormap
+        色テーブル
+    bytes: bool
+        Trueならuint8（0〜255）、Falseならfloat（0〜1）
+    ----------
+    Returns:
+    ----------
+    lut: ndarray
+        RGBAの参照表（(N + 3, 4)、0〜N-1：色、N：under、N+1：over、N+2：欠損値）
+    ----------
+    """
+    key = (cmap.name, id(cmap), bytes)
+    lut = _luts.get(key, (None, None))[1]
+    if lut is None:
+        lut = np.vstack([
+            cmap(np.arange(cmap.N)),
+            np.array([cmap.get_under(),
+                      cmap.get_over(),
+                      cmap.get_bad()])
+        ])
+        if bytes:
+            # matplotlibと同じく切り捨てる
+            lut = (lut * 255).astype(np.uint8)
+        lut.flags.writeable = False
+        # 色テーブルも保持する（idが他のオブジェクトに使い回されないように）
+        _luts[key] = (cmap, lut)
+    return lut
+
+
+def lut_rgba(cmap, index, bytes=True):
+    """色の番号（BoundaryNormなどの出力）を参照表で色に変換する
+
+    cmap(index, bytes=bytes)と同じ色になる
+
+    Parameters:
+    ----------
+    cmap: matplotlib.colors.Colormap
+        色テーブル
+    index: ndarray
+        色の番号（整数、負ならunder、N以上ならover、マスクされた値は欠損値の色）
+    bytes: bool
+        Trueならuint8（0〜255）、Falseならfloat（0〜1）
+    ----------
+    Returns:
+    ----------
+    rgba: ndarray
+        RGBA（indexの形 + (4, )）
+    ----------
+    """
+    lut = colormap_lut(cmap, bytes=bytes)
+    n = cmap.N
+    index = np.ma.asarray(index)
+    ind = np.ma.filled(index, 0).astype(np.intp)
+    ind = np.where(ind < 0, n, np.where(ind >= n, n + 1, ind))
+    ind[np.ma.getmaskarray(index)] = n + 2
+    return lut[ind]
+
+
+def band_cmap(cmap, levels, extend="neither"):
+    """levelsの区間毎の色テーブルとBoundaryNormを返す（contourfと同じ色）
+
+    contourfは区間の中央の値を、levelsの範囲で線形に正規化して色を選ぶ。
+    extendした側の区間はunder、overの色になる。
+    上端の値（levels[-1]）はextendしない場合も一番上の区間の色になる
+
+    Parameters:
+    ----------
+    cmap: matplotlib.colors.Colormap
+        色テーブル
+    levels: list(float, float, ...)
+        陰影を付ける値のリスト
+    extend: str
+        範囲外の値の扱い（neither、min、max、both）
+    ----------
+    Returns:
+    ----------
+    bands: matplotlib.colors.ListedColormap
+        区間毎の色テーブル（共有されるので、変更しない）
+    norm: matplotlib.colors.BoundaryNorm
+        値を区間の色の番号に変換するBoundaryNorm
+    ----------
+    """
+    levels = np.asarray(levels, dtype=np.float64)
+    key = (cmap.name, id(cmap), tuple(levels.tolist()), extend)
+    band = _bands.get(key)
+    if band is None:
+        mid = 0.5 * (levels[:-1] + levels[1:])
+        colors = list(cmap(Normalize(levels[0], levels[-1])(mid)))
+        under, over = cmap.get_under(), cmap.get_over()
+        if extend in ("both", "min"):
+            colors.insert(0, under)
+        else:
+            under = colors[0]
+        if extend in ("both", "max"):
+            colors.append(over)
+        else:
+            over = colors[-1]
+        bands = ListedColormap(colors, name=cmap.name + "_bands")
+        bands.set_under(under)
+        bands.set_over(over)
+        bands.set_bad(cmap.get_bad())
+        norm = BoundaryNorm(levels, bands.N, extend=extend)
+        # 色テーブルも保持する（idが他のオブジェクトに使い回されないように）
+        band = (cmap, bands, norm)
+        _bands[key] = band
+    return band[1], band[2]
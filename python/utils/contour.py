@@ -0,0 +1,478 @@
+#
+#  2026/10/19 格子情報を使い回す等値線描画
+#
+import numpy as np
+import contourpy
+import matplotlib.pyplot as plt
+from matplotlib.contour import ContourSet
+import cartopy.crs as ccrs
+from . import lod
+from .lod import block_reduce
+from .cmaps import band_cmap
+from .encode import is_vector
+from .vector import grid_tolerance, simplify_contour
+from .tier import quicklook, tier_dpi, tier_px_per_cell
+
+# 作図領域の外側に残す格子点の数
+margin_default = 2
+
+# raster=Trueを指定した陰影を、contourfの代わりにラスター画像で描くかどうか
+opt_raster_shade = True
+
+# 格子・領域毎のGridContour
+_grid_contours = dict()
+
+
+def _grid_key(lons_1d, lats_1d, extent, factor):
+    """格子と領域からキーを作成する"""
+    return (len(lons_1d), float(lons_1d[0]), float(lons_1d[-1]), len(lats_1d),
+            float(lats_1d[0]), float(lats_1d[-1]),
+            None if extent is None else tuple(float(e) for e in extent),
+            factor)
+
+
+def _window(loc_1d, loc_min, loc_max, margin):
+    """領域を含む格子番号の範囲を返す"""
+    loc_1d = np.asarray(loc_1d)
+    ind = np.nonzero((loc_1d >= loc_min) & (loc_1d <= loc_max))[0]
+    if len(ind) == 0:
+        return slice(0, len(loc_1d))
+    return slice(max(ind[0] - margin, 0), min(ind[-1] + margin + 1,
+                                              len(loc_1d)))
+
+
+class GridContour():
+    """固定された格子の等値線を描く（格子と描画領域の情報を使い回す）"""
+
+    def __init__(self,
+                 lons_1d,
+                 lats_1d,
+                 extent=None,
+                 margin=margin_default,
+                 factor=1):
+        """格子と描画領域の設定
+
+        Parameters:
+        ----------
+        lons_1d: ndarray
+            経度データ（1次元、度）
+        lats_1d: ndarray
+            緯度データ（1次元、度）
+        extent: list(float, float, float, float)
+            作図範囲 [lon_min, lon_max, lat_min, lat_max]（Noneなら全領域）
+        margin: int
+            作図範囲の外側に残す格子点の数
+        factor: int
+            何格子をまとめて描くか（1なら間引かない）
+        ----------
+        """
+        self.factor = factor
+        self.lons_1d = np.asarray(lons_1d, dtype=np.float64)
+        self.lats_1d = np.asarray(lats_1d, dtype=np.float64)
+        if extent is None:
+            self.islice = slice(0, len(lons_1d))
+            self.jslice = slice(0, len(lats_1d))
+        else:
+            self.islice = _window(lons_1d, extent[0], extent[1],
+                                  margin * factor)
+            self.jslice = _window(lats_1d, extent[2], extent[3],
+                                  margin * factor)
+        # 切り出した格子（C連続のfloat64にしておく）
+        x = block_reduce(
+            np.asarray(lons_1d, dtype=np.float64)[self.islice], factor)
+        y = block_reduce(
+            np.asarray(lats_1d, dtype=np.float64)[self.jslice], factor)
+        self.x, self.y = np.meshgrid(x, y)
+        self.shape = self.x.shape
+        # 投影法毎の格子の座標、画像の変換（1回だけ計算して使い回す）
+        self._projected = dict()
+
+    def window(self, d, pooling="mean"):
+        """データを描画領域で切り出し、解像度に合わせて間引く
+
+        Parameters:
+        ----------
+        d: ndarray
+            データ（2次元、格子全体）
+        pooling: str
+            間引く際のまとめ方：mean（平均）、max（最大）、min（最小）
+        ----------
+        Returns:
+        ----------
+        d: ndarray
+            切り出したデータ（2次元）
+        ----------
+        """
+        return block_reduce(d[self.jslice, self.islice], self.factor, pooling)
+
+    def coords(self, ax):
+        """格子の座標と、描画するための変換を返す
+
+        PlateCarreeの図では経度・緯度がそのままデータ座標になる
+        それ以外の投影法の図では、投影した座標を投影法毎に1回だけ計算して使い回す
+        （cartopyがフレーム毎に格子点・等値線の頂点を投影しなくて済む）
+
+        Parameters:
+        ----------
+        ax: matplotlib Axes
+            描画するAxes
+        ----------
+        Returns:
+        ----------
+        x: ndarray
+            格子のx座標（2次元）
+        y: ndarray
+            格子のy座標（2次元）
+        transform: matplotlib Transform
+            描画に使う変換
+        ----------
+        """
+        projection = getattr(ax, "projection", None)
+        if projection is None or projection == ccrs.PlateCarree():
+            return self.x, self.y, ax.transData
+        key = (projection, "grid")
+        if key not in self._projected:
+            xyz = projection.transform_points(ccrs.PlateCarree(), self.x,
+                                              self.y)
+            self._projected[key] = (np.ascontiguousarray(xyz[..., 0]),
+                                    np.ascontiguousarray(xyz[..., 1]))
+        x, y = self._projected[key]
+        return x, y, ax.transData
+
+    def warp(self, ax, lons_1d, lats_1d):
+        """等間隔格子の画像を、地図の投影法の等間隔な画像に変換する格子番号を返す
+
+        投影法毎に1回だけ計算して使い回す（cartopyの画像の変換を使わない）
+
+        Parameters:
+        ----------
+        ax: matplotlib Axes
+            描画するAxes（PlateCarree以外の投影法）
+        lons_1d: ndarray
+            画像の格子点の経度（1次元、度）
+        lats_1d: ndarray
+            画像の格子点の緯度（1次元、度）
+        ----------
+        Returns:
+        ----------
+        jj: ndarray
+            変換後の画素に対応する緯度方向の格子番号（2次元）
+        ii: ndarray
+            変換後の画素に対応する経度方向の格子番号（2次元）
+        valid: ndarray
+            格子の範囲内の画素（2次元、bool）
+        extent: tuple(float, float, float, float)
+            変換後の画像の範囲（投影した座標）
+        ----------
+        """
+        projection = ax.projection
+        key = (projection, len(lons_1d), float(lons_1d[0]),
+               float(lons_1d[-1]), len(lats_1d), float(lats_1d[0]),
+               float(lats_1d[-1]))
+        if key not in self._projected:
+            self._projected[key] = _warp_index(projection, lons_1d, lats_1d)
+        return self._projected[key]
+
+    def simplify(self, cs):
+        """ベクター形式で出力する場合は、等値線・陰影の境界を間引く
+
+        Parameters:
+        ----------
+        cs: matplotlib.contour.ContourSet
+            等値線または陰影
+        ----------
+        Returns:
+        ----------
+        cs: matplotlib.contour.ContourSet
+            間引いたContourSet（同じオブジェクト）
+        ----------
+        """
+        if not is_vector():
+            return cs
+        x, y, transform = self.coords(cs.axes)
+        return simplify_contour(cs, grid_tolerance(x, y))
+
+    def contour(self, ax, d, levels, pooling="mean", **kwargs):
+        """等値線を描く（ax.contourの代わり）
+
+        Parameters:
+        ----------
+        ax: matplotlib Axes
+            描画するAxes
+        d: ndarray
+            データ（2次元、格子全体）
+        levels: list(float, float, ...)
+            等値線を描く値のリスト
+        pooling: str
+            間引く際のまとめ方：mean（平均）、max（最大）、min（最小）
+        kwargs: dict
+            ContourSetに渡すオプション（colors、linewidthsなど）
+        ----------
+        Returns:
+        ----------
+        cs: matplotlib.contour.ContourSet
+            等値線（clabelでラベルを付けられる）
+        ----------
+        """
+        z = self.window(d, pooling)
+        levels = np.asarray(levels, dtype=np.float64)
+        x, y, transform = self.coords(ax)
+        cg = contourpy.contour_generator(x, y, z, line_type="SeparateCode")
+        allsegs = []
+        allkinds = []
+        for lev in levels:
+            segs, kinds = cg.lines(lev)
+            allsegs.append(segs)
+            allkinds.append(kinds)
+        # 等値線が1本もない場合
+        if sum(len(segs) for segs in allsegs) == 0:
+            return ax.contour(x,
+                              y,
+                              z,
+                              levels=levels,
+                              transform=transform,
+                              **kwargs)
+        return self.simplify(
+            ContourSet(ax,
+                       levels,
+                       allsegs,
+                       allkinds,
+                       transform=transform,
+                       **kwargs))
+
+    def contourf(self, ax, d, levels, pooling="mean", **kwargs):
+        """陰影を描く（ax.contourfの代わり、描画領域で切り出したデータを使う）
+
+        Parameters:
+        ----------
+        ax: matplotlib Axes
+            描画するAxes
+        d: ndarray
+            データ（2次元、格子全体）
+        levels: list(float, float, ...)
+            陰影を付ける値のリスト
+        pooling: str
+            間引く際のまとめ方：mean（平均）、max（最大、降水量など極値を残す場合）
+        kwargs: dict
+            contourfに渡すオプション（cmap、extendなど）
+        ----------
+        Returns:
+        ----------
+        cs: matplotlib.contour.QuadContourSet
+            陰影（カラーバーに渡せる）
+        ----------
+        """
+        x, y, transform = self.coords(ax)
+        return self.simplify(
+            ax.contourf(x,
+                        y,
+                        self.window(d, pooling),
+                        levels=levels,
+                        transform=transform,
+                        **kwargs))
+
+    def shade(self,
+              ax,
+              d,
+              levels,
+              pooling="mean",
+              cmap=None,
+              extend="neither",
+              raster=False,
+              **kwargs):
+        """陰影を描く（raster=Trueならラスター画像、そうでなければcontourf）
+
+        値をlevelsで区切ったBoundaryNormで区間毎の色（contourfと同じ）を付け、
+        1枚の画像として描く
+        levelsの範囲外の値は、extendで指定した側のみ色を付ける（contourfと同じ）
+
+        Parameters:
+        ----------
+        ax: matplotlib Axes
+            描画するAxes
+        d: ndarray
+            データ（2次元、格子全体）
+        levels: list(float, float, ...)
+            陰影を付ける値のリスト
+        pooling: str
+            間引く際のまとめ方：mean（平均）、max（最大、降水量など極値を残す場合）
+        cmap: matplotlib Colormap
+            色テーブル
+        extend: str
+            範囲外の値に色を付けるか：neither、min、max、both
+        raster: bool
+            ラスター画像で描くかどうか（opt_raster_shade = Falseなら常にcontourf）
+        kwargs: dict
+            imshow、pcolormeshに渡すオプション（alphaなど）
+        ----------
+        Returns:
+        ----------
+        im: matplotlib.image.AxesImage or matplotlib.collections.QuadMesh
+            陰影（カラーバーに渡せる、extendはnormから引き継がれる）
+        ----------
+        """
+        if not (raster and opt_raster_shade):
+            return self.contourf(ax,
+                                 d,
+                                 levels,
+                                 pooling=pooling,
+                                 cmap=cmap,
+                                 extend=extend,
+                                 **kwargs)
+        levels = np.asarray(levels, dtype=np.float64)
+        if cmap is None:
+            cmap = plt.get_cmap()
+        # contourfと同じ区間毎の色（under、overも含む）
+        cmap, norm = band_cmap(cmap, levels, extend=extend)
+        z = np.ma.masked_invalid(self.window(d, pooling))
+        # extendしない側の範囲外の値は描かない
+        if extend in ("neither", "max"):
+            z = np.ma.masked_less(z, levels[0])
+        if extend in ("neither", "min"):
+            z = np.ma.masked_greater(z, levels[-1])
+        x, y, transform = self.coords(ax)
+        if x is self.x:
+            # 等間隔格子なので、格子点を中心とした画像として描く
+            extent = _image_extent(self.x[0, :], self.y[:, 0])
+        else:
+            # 投影法の座標で等間隔な画像に変換する
+            jj, ii, valid, extent = self.warp(ax, self.x[0, :], self.y[:, 0])
+            z = np.ma.array(z.filled(0.)[jj, ii],
+                            mask=np.ma.getmaskarray(z)[jj, ii] | ~valid)
+        return _imshow(ax,
+                       z,
+                       extent,
+                       cmap=cmap,
+                       norm=norm,
+                       interpolation="nearest",
+                       transform=transform,
+                       **kwargs)
+
+    def image(self, ax, rgba, **kwargs):
+        """格子に対応したRGBA画像を1枚の画像として描く
+
+        Parameters:
+        ----------
+        ax: matplotlib Axes
+            描画するAxes
+        rgba: ndarray
+            RGBA画像（3次元、uint8、(格子全体の緯度方向, 経度方向, 4)）
+        kwargs: dict
+            imshowに渡すオプション
+        ----------
+        Returns:
+        ----------
+        im: matplotlib.image.AxesImage
+        ----------
+        """
+        # 画像の縮小はimshowに任せるので、切り出しだけ行う
+        rgba = rgba[self.jslice, self.islice]
+        lons_1d = self.lons_1d[self.islice]
+        lats_1d = self.lats_1d[self.jslice]
+        x, y, transform = self.coords(ax)
+        if x is self.x:
+            extent = _image_extent(lons_1d, lats_1d)
+        else:
+            # 投影法の座標で等間隔な画像に変換する（範囲外は透明にする）
+            jj, ii, valid, extent = self.warp(ax, lons_1d, lats_1d)
+            rgba = rgba[jj, ii]
+            rgba[~valid] = 0
+        return _imshow(ax, rgba, extent, transform=transform, **kwargs)
+
+
+def _image_extent(x, y):
+    """等間隔格子の格子点を中心とした画像の範囲を返す"""
+    dx = (x[-1] - x[0]) / max(len(x) - 1, 1)
+    dy = (y[-1] - y[0]) / max(len(y) - 1, 1)
+    return (x[0] - dx / 2, x[-1] + dx / 2, y[0] - dy / 2, y[-1] + dy / 2)
+
+
+def _warp_index(projection, lons_1d, lats_1d):
+    """投影法の座標で等間隔な画像の画素に対応する、元の格子番号を求める"""
+    pc = ccrs.PlateCarree()
+    lons, lats = np.meshgrid(lons_1d, lats_1d)
+    xyz = projection.transform_points(pc, lons, lats)
+    x0, x1 = np.nanmin(xyz[..., 0]), np.nanmax(xyz[..., 0])
+    y0, y1 = np.nanmin(xyz[..., 1]), np.nanmax(xyz[..., 1])
+    # 元の格子と同じ画素数にする
+    nx, ny = len(lons_1d), len(lats_1d)
+    dx = (x1 - x0) / max(nx - 1, 1)
+    dy = (y1 - y0) / max(ny - 1, 1)
+    xs, ys = np.meshgrid(x0 + dx * np.arange(nx), y0 + dy * np.arange(ny))
+    lonlat = pc.transform_points(projection, xs, ys)
+    # 等間隔格子なので、最も近い格子番号は割り算で求まる
+    dlon = (lons_1d[-1] - lons_1d[0]) / max(nx - 1, 1)
+    dlat = (lats_1d[-1] - lats_1d[0]) / max(ny - 1, 1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        fi = np.rint((lonlat[..., 0] - lons_1d[0]) / dlon)
+        fj = np.rint((lonlat[..., 1] - lats_1d[0]) / dlat)
+        valid = (fi >= 0) & (fi < nx) & (fj >= 0) & (fj < ny)
+    ii = np.where(valid, fi, 0).astype(np.intp)
+    jj = np.where(valid, fj, 0).astype(np.intp)
+    return jj, ii, valid, _image_extent(xs[0, :], ys[:, 0])
+
+
+def _imshow(ax, z, extent, **kwargs):
+    """作図範囲を変えずにimshowで描く"""
+    xlim, ylim = ax.get_xlim(), ax.get_ylim()
+    im = ax.imshow(z, origin="lower", extent=extent, **kwargs)
+    ax.set_xlim(xlim)
+    ax.set_ylim(ylim)
+    return im
+
+
+def grid_contour(lons, lats, extent=None, ax=None, dpi=None):
+    """格子と描画領域に対応したGridContourを返す（一度作ったものを使い回す）
+
+    axを与えた場合には、地図の大きさと出力画像の解像度から間引きの格子数を決める
+
+    Parameters:
+    ----------
+    lons: ndarray
+        経度データ（1次元または2次元、度）
+    lats: ndarray
+        緯度データ（1次元または2次元、度）
+    extent: list(float, float, float, float)
+        作図範囲 [lon_min, lon_max, lat_min, lat_max]（Noneなら全領域）
+    ax: matplotlib Axes
+        描画するAxes（Noneなら間引かない）
+    dpi: int
+        出力画像の解像度（デフォルト：utils.lod.dpi_default、簡易版ではその解像度）
+    ----------
+    Returns:
+    ----------
+    gcont: GridContour
+    ----------
+    """
+    lons = np.asarray(lons)
+    lats = np.asarray(lats)
+    lons_1d = lons[0, :] if lons.ndim == 2 else lons
+    lats_1d = lats[:, 0] if lats.ndim == 2 else lats
+    factor = 1
+    if ax is not None and lod.opt_lod:
+        # 作図範囲内の格子数と地図の大きさ（inch）
+        if extent is None:
+            nx, ny = len(lons_1d), len(lats_1d)
+        else:
+            isl = _window(lons_1d, extent[0], extent[1], 0)
+            jsl = _window(lats_1d, extent[2], extent[3], 0)
+            nx, ny = isl.stop - isl.start, jsl.stop - jsl.start
+        pos = ax.get_position()
+        width = pos.width * ax.figure.get_figwidth()
+        height = pos.height * ax.figure.get_figheight()
+        # 簡易版では解像度を下げ、さらに粗く間引く
+        if dpi is None and quicklook():
+            dpi = tier_dpi()
+        factor = lod.lod_factor(nx,
+                                ny,
+                                width,
+                                height,
+                                dpi=dpi,
+                                px_per_cell=tier_px_per_cell())
+    key = _grid_key(lons_1d, lats_1d, extent, factor)
+    if key not in _grid_contours:
+        _grid_contours[key] = GridContour(lons_1d,
+                                          lats_1d,
+                                          extent=extent,
+                                          factor=factor)
+    return _grid_contours[key]
@@ -1,7 +1,7 @@
 #
 #  2021/06/01 Yamashita
 #
-from matplotlib.colors import LinearSegmentedColormap
+from .cmaps import get_cmap
 
 #from mpl_toolkits.basemap import cm
 #cmap = cm.s3pcpn_l  # 色テーブルの選択
@@ -279,6 +279,20 @@ _no_green_data = {
             (0.933333337307, 1.0, 1.0), (1.0, 1.0, 1.0)]
 }
 
+# 色テーブルの名前とデータ
+_segment_data_list = {
+    "s3pcpn_l": _s3pcpn_l_data,
+    "wysiwyg": _wysiwyg_data,
+    "haxby": _haxby_data,
+    "drywet": _drywet_data,
+    "no_green": _no_green_data
+}
+
+
+def segment_data(cmap_name):
+    """色テーブルのデータを返す（ColUtilsにない名前ならNone）"""
+    return _segment_data_list.get(cmap_name)
+
 
 class ColUtils():
     """カラーユーティリティ"""
@@ -293,17 +307,8 @@ class ColUtils():
         ----------
         """
         self.cmap_name = cmap_name
-        if self.cmap_name == "s3pcpn_l":
-            self._segment_data = _s3pcpn_l_data
-        elif self.cmap_name == "wysiwyg":
-            self._segment_data = _wysiwyg_data
-        elif self.cmap_name == "haxby":
-            self._segment_data = _haxby_data
-        elif self.cmap_name == "drywet":
-            self._segment_data = _drywet_data
-        elif self.cmap_name == "no_green":
-            self._segment_data = _no_green_data
-        else:
+        self._segment_data = segment_data(cmap_name)
+        if self._segment_data is None:
             raise Exception("invalid cmap_name")
 
     def get_ctable(self, under=None, over=None):
@@ -322,10 +327,5 @@ class ColUtils():
             カラーマップ
         ----------
         """
-        # カラーマップ作成
-        cmap = LinearSegmentedColormap('colormap_name', self._segment_data)
-        if under is not None:
-            cmap.set_under(under)  # 下限を下回った場合の色を指定
-        if over is not None:
-            cmap.set_over(over)  # 上限を超えた場合の色を指定
-        return cmap
+        # カラーマップ作成（同じ指定のものは1回だけ作成して使い回す）
+        return get_cmap(self.cmap_name, under=under, over=over)
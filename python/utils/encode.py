@@ -0,0 +1,315 @@
+#
+#  2026/10/19 画像ファイルへの書き出し（減色・圧縮をスレッドで並列に行う）
+#
+import os
+import atexit
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+
+# 出力形式：png（フルカラー）、png8（パレットに減色したpng）、webp、
+#           svg、pdf（ベクター形式、等値線は間引いて書き出す）
+image_format = "png"
+
+# pngの圧縮レベル（0〜9、大きいほど小さく遅い）
+compress_level = 6
+
+# png8で使う色数の上限
+palette_colors = 256
+
+# webpを可逆圧縮にするかどうか、非可逆の場合の品質（0〜100）
+webp_lossless = True
+webp_quality = 90
+
+# 書き出しを行うスレッドの数
+max_workers_default = 4
+
+# 書き出し待ちにできるフレーム数の上限（超えると描画側が待つ、メモリ使用量を抑える）
+max_pending_default = 8
+
+# 出力形式毎のファイルの拡張子
+_suffix = {
+    "png": ".png",
+    "png8": ".png",
+    "webp": ".webp",
+    "svg": ".svg",
+    "pdf": ".pdf"
+}
+
+# ベクター形式
+_vector_formats = ("svg", "pdf")
+
+_encoder = None
+_lock = threading.Lock()
+
+
+def output_name(output_filename, fmt=None):
+    """出力形式に合わせて拡張子を変えたファイル名を返す"""
+    if fmt is None:
+        fmt = image_format
+    root, ext = os.path.splitext(output_filename)
+    if ext.lower() in (".png", ".webp", ".svg", ".pdf"):
+        return root + _suffix[fmt]
+    return output_filename
+
+
+def is_vector(fmt=None):
+    """ベクター形式で出力するかどうか"""
+    if fmt is None:
+        fmt = image_format
+    return fmt in _vector_formats
+
+
+def _tmp_name(filename):
+    """書き込み中のファイル名（プロセス、スレッド毎に変える）"""
+    return filename + "." + str(os.getpid()) + "_" + str(
+        threading.get_ident()) + ".tmp"
+
+
+def copy_file(src, dst):
+    """ファイルをコピーする（書き込みが途中で終わったファイルを残さない）"""
+    tmp_filename = _tmp_name(dst)
+    shutil.copyfile(src, tmp_filename)
+    os.replace(tmp_filename, dst)
+
+
+def save_vector(fig, output_filename, fmt=None, dpi=300, pad_inches=0.1):
+    """図をベクター形式（svg、pdf）で書き出す
+
+    描画はmatplotlibで行うので、描画と同じスレッドで書き出す
+
+    Parameters:
+    ----------
+    fig: matplotlib Figure
+        書き出す図
+    output_filename: str
+        出力ファイル名（拡張子は出力形式に合わせて変わる）
+    fmt: str
+        出力形式：svg、pdf（デフォルト：image_format）
+    dpi: int
+        図に含まれるラスター画像（陰影など）の解像度
+    pad_inches: float
+        bbox_inches='tight'で切り出す際の余白（inch）
+    ----------
+    """
+    if fmt is None:
+        fmt = image_format
+    if not is_vector(fmt):
+        raise ValueError("format must be svg or pdf, not " + str(fmt))
+    output_filename = output_name(output_filename, fmt)
+    # 書き込みが途中で終わったファイルを残さない
+    tmp_filename = _tmp_name(output_filename)
+    fig.savefig(tmp_filename,
+                format=fmt,
+                dpi=dpi,
+                bbox_inches="tight",
+                pad_inches=pad_inches)
+    os.replace(tmp_filename, output_filename)
+
+
+def _quantize(img, colors):
+    """パレットに減色する（色数が少なければ損失なし）"""
+    img = img.convert("RGB")
+    # 等値線・陰影の図は色数が少ないことが多いので、そのままパレットにできるか調べる
+    used = img.getcolors(colors)
+    if used is not None:
+        palette = Image.new("P", (1, 1))
+        palette.putpalette([c for n, rgb in used for c in rgb])
+        return img.quantize(palette=palette, dither=Image.Dither.NONE)
+    return img.quantize(colors=colors,
+                        method=Image.Quantize.FASTOCTREE,
+                        dither=Image.Dither.NONE)
+
+
+def encode_rgba(frame, output_filename, fmt=None, dpi=300):
+    """RGBA配列を画像ファイルに書き出す
+
+    Parameters:
+    ----------
+    frame: ndarray
+        RGBA画像（3次元、uint8、(ny, nx, 4)）
+    output_filename: str
+        出力ファイル名
+    fmt: str
+        出力形式：png、png8、webp（デフォルト：image_format）
+    dpi: int
+        ファイルに記録する解像度
+    ----------
+    """
+    if fmt is None:
+        fmt = image_format
+    img = Image.fromarray(frame)
+    # 書き込みが途中で終わったファイルを残さない
+    tmp_filename = _tmp_name(output_filename)
+    if fmt == "webp":
+        img.save(tmp_filename,
+                 format="WEBP",
+                 lossless=webp_lossless,
+                 quality=webp_quality)
+    elif fmt == "png8":
+        _quantize(img, palette_colors).save(tmp_filename,
+                                            format="PNG",
+                                            compress_level=compress_level,
+                                            dpi=(dpi, dpi))
+    elif fmt == "png":
+        img.save(tmp_filename,
+                 format="PNG",
+                 compress_level=compress_level,
+                 dpi=(dpi, dpi))
+    else:
+        raise ValueError("format must be png, png8 or webp, not " + str(fmt))
+    os.replace(tmp_filename, output_filename)
+
+
+class FrameEncoder():
+    """描画したフレームの減色・圧縮・書き出しをスレッドで行う"""
+
+    def __init__(self, fmt=None, max_workers=None, max_pending=None):
+        """出力の設定
+
+        Parameters:
+        ----------
+        fmt: str
+            出力形式：png、png8、webp（デフォルト：image_format）
+        max_workers: int
+            書き出しを行うスレッドの数（デフォルト：max_workers_default）
+        max_pending: int
+            書き出し待ちにできるフレーム数の上限（デフォルト：max_pending_default）
+        ----------
+        """
+        if fmt is None:
+            fmt = image_format
+        if max_workers is None:
+            max_workers = max_workers_default
+        if max_pending is None:
+            max_pending = max_pending_default
+        self.fmt = fmt
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        # 書き出し待ちのフレーム数を制限する
+        self.slots = threading.BoundedSemaphore(max(max_pending, 1))
+        self.pending = dict()  # 書き出し中のファイル名と書き出しの情報
+        self.errors = []  # 書き出しで発生したエラー
+
+    def submit(self, frame, output_filename, dpi=300):
+        """フレームの書き出しを登録する
+
+        書き出し待ちのフレームが上限に達している場合は、空くまで待つ
+
+        Parameters:
+        ----------
+        frame: ndarray
+            RGBA画像（3次元、uint8、(ny, nx, 4)）
+        output_filename: str
+            出力ファイル名（拡張子は出力形式に合わせて変わる）
+        dpi: int
+            ファイルに記録する解像度
+        ----------
+        Returns:
+        ----------
+        future: concurrent.futures.Future
+            書き出しが終わると出力ファイル名を返す
+        ----------
+        """
+        output_filename = output_name(output_filename, self.fmt)
+        # 同じファイルへの書き出しが残っている場合は、終わってから書き出す
+        self.wait(output_filename)
+        self.slots.acquire()
+        job = {"copies": [], "done": False}
+        with _lock:
+            future = self.executor.submit(self._encode, frame,
+                                          output_filename, dpi, job)
+            job["future"] = future
+            self.pending[output_filename] = job
+        future.add_done_callback(self._done)
+        return future
+
+    def _encode(self, frame, output_filename, dpi, job):
+        encode_rgba(frame, output_filename, fmt=self.fmt, dpi=dpi)
+        with _lock:
+            job["done"] = True
+            copies = list(job["copies"])
+        for dst in copies:
+            copy_file(output_filename, dst)
+        return output_filename
+
+    def _done(self, future):
+        """書き出しが終わったファイルを取り除く"""
+        self.slots.release()
+        with _lock:
+            for k, job in list(self.pending.items()):
+                if job["future"] is future:
+                    del self.pending[k]
+            if future.exception() is not None:
+                self.errors.append(future.exception())
+
+    def wait(self, output_filename):
+        """ファイルへの書き出しが残っている場合は終わるまで待つ"""
+        output_filename = output_name(output_filename, self.fmt)
+        with _lock:
+            job = self.pending.get(output_filename)
+        if job is not None:
+            job["future"].exception()
+
+    def copy_to(self, output_filename, dst):
+        """書き出したファイルをコピーする（書き出し中なら書き出した後にコピーする）
+
+        Parameters:
+        ----------
+        output_filename: str
+            出力ファイル名（拡張子は出力形式に合わせて変わる）
+        dst: str
+            コピー先のファイル名
+        ----------
+        """
+        output_filename = output_name(output_filename, self.fmt)
+        with _lock:
+            job = self.pending.get(output_filename)
+            if job is not None and not job["done"]:
+                job["copies"].append(dst)
+                return
+        copy_file(output_filename, dst)
+
+    def flush(self):
+        """全てのフレームの書き出しが終わるまで待つ（エラーがあれば送出する）"""
+        with _lock:
+            futures = [job["future"] for job in self.pending.values()]
+        for future in futures:
+            future.exception()
+        with _lock:
+            errors = self.errors
+            self.errors = []
+        if len(errors) > 0:
+            raise errors[0]
+
+    def close(self):
+        """書き出しを終えてスレッドを止める（次のget_encoderでは作り直す）"""
+        global _encoder
+        try:
+            self.flush()
+        finally:
+            self.executor.shutdown(wait=True)
+            with _lock:
+                if _encoder is self:
+                    _encoder = None
+
+
+def _reset_encoder():
+    """fork後の子プロセスでは、親プロセスのスレッドを使わずに作り直す"""
+    global _encoder, _lock
+    _encoder = None
+    _lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_encoder)
+
+
+def get_encoder():
+    """共有のFrameEncoderを返す"""
+    global _encoder
+    with _lock:
+        if _encoder is None:
+            _encoder = FrameEncoder()
+            # 終了時に書き出しのエラーを報告する
+            atexit.register(_encoder.flush)
+        return _encoder
@@ -0,0 +1,200 @@
+#
+#  2026/10/19 入力データと、そこから求めた変数の使い回し（予報時刻・予報時間毎）
+#
+import re
+from collections import OrderedDict
+import numpy as np
+
+# メモリに残す変数の上限（MB）
+field_budget_mb = 512
+
+# 地上の変数：名前 -> (MSMの変数名, GSMの変数名)
+surf_vars = {
+    "mslp_Pa": ("PRMSL_meansealevel", "PRMSL_meansealevel"),  # (Pa)
+    "rain_1h": ("APCP_surface", "APCP_surface"),  # 前1時間降水量 (mm)
+    "t2m_K": ("TMP_1D5maboveground", "TMP_2maboveground"),  # (K)
+    "rh2m": ("RH_1D5maboveground", "RH_2maboveground"),  # (%)
+    "u10": ("UGRD_10maboveground", "UGRD_10maboveground"),  # (m/s)
+    "v10": ("VGRD_10maboveground", "VGRD_10maboveground"),  # (m/s)
+    "cfrl": ("LCDC_surface", "LCDC_surface"),  # 下層雲量 (%)
+    "cfrm": ("MCDC_surface", "MCDC_surface"),  # 中層雲量 (%)
+    "cfrh": ("HCDC_surface", "HCDC_surface"),  # 上層雲量 (%)
+    "cfrt": ("TCDC_surface", "TCDC_surface")  # 全雲量 (%)
+}
+
+# 気圧面の変数：名前_気圧面（例：t_850） -> 変数名_気圧面mb（例：TMP_850mb）
+plev_vars = {
+    "t": "TMP",  # (K)
+    "rh": "RH",  # (%)
+    "u": "UGRD",  # (m/s)
+    "v": "VGRD",  # (m/s)
+    "z": "HGT"  # (m)
+}
+
+
+def _thetae(level, t, rh):
+    """相当温位 (K)"""
+    from . import mkthetae
+    # 気圧 (Pa)（格子の次元にブロードキャストする）
+    pres = np.full((1, 1), level, dtype=np.float32) * 100.
+    return mkthetae(pres, t, rh)
+
+
+# 地上の変数から求める変数：名前 -> (使う変数のリスト, 求める関数)
+surf_derived = {
+    "mslp_hPa": (["mslp_Pa"], lambda p: p * 0.01),  # (hPa)
+    "t2m_C": (["t2m_K"], lambda t: t - 273.15),  # (℃)
+    "wspd_10m": (["u10", "v10"], lambda u, v: np.sqrt(u**2 + v**2))  # (m/s)
+}
+
+# 気圧面の変数から求める変数：名前_気圧面 -> (使う変数のリスト, 求める関数)
+# 関数には気圧面（hPa）と使う変数を渡す
+plev_derived = {
+    "tc": (["t"], lambda level, t: t - 273.15),  # (℃)
+    "wspd": (["u", "v"], lambda level, u, v: np.sqrt(u**2 + v**2)),  # (m/s)
+    "thetae": (["t", "rh"], _thetae)  # 相当温位 (K)
+}
+
+_plev_name = re.compile(r"^([a-z]+)_(\d+)$")
+
+
+def _nbytes(d):
+    """データのバイト数（マスクを含む）"""
+    if isinstance(d, np.ma.MaskedArray):
+        return d.data.nbytes + np.ma.getmaskarray(d).nbytes
+    return np.asarray(d).nbytes
+
+
+class FieldEngine():
+    """変数を名前で取り出す（読み込んだ変数・求めた変数はメモリに残して使い回す）
+
+    予報時刻・予報時間・変数名毎に1回だけ読み込み・計算し、
+    メモリに残す量がbudget_mbを超えると、古く使われたものから消す。
+    変数は格子全体なので、地域が違っても同じものを使う
+    """
+
+    def __init__(self, dset, run, readers, budget_mb=None):
+        """変数の取り出し方の設定
+
+        Parameters:
+        ----------
+        dset: str
+            データセット名：MSM、GSM
+        run: str
+            予報時刻（形式：20220623000000）
+        readers: dict
+            面（surf、plev）をキー、ReadMSMまたはReadGSMを値とした辞書
+        budget_mb: int
+            メモリに残す変数の上限（MB、デフォルト：field_budget_mb）
+        ----------
+        """
+        if dset not in ("MSM", "GSM"):
+            raise ValueError("dset must be MSM or GSM, not " + str(dset))
+        if budget_mb is None:
+            budget_mb = field_budget_mb
+        self.dset = dset
+        self.run = run
+        self.readers = readers
+        self.budget = budget_mb * 1024 * 1024
+        self.fields = OrderedDict()  # (予報時刻, 予報時間, 変数名) -> データ
+        self.nbytes = 0
+        self.grids = dict()  # 面毎の経度・緯度
+        self.opened = dict()  # 面毎に開いている予報時間
+        self.reads = 0  # ファイルから読み込んだ回数
+        self.derives = 0  # 計算した回数
+        self.hits = 0  # 使い回した回数
+
+    def _open(self, lev, hour):
+        """予報時間のファイルを開く（同じ予報時間なら開いたままにする）"""
+        reader = self.readers[lev]
+        if self.opened.get(lev) != hour:
+            if lev in self.opened:
+                reader.close_netcdf()
+            reader.set_fcst_time(hour)
+            grid = reader.readnetcdf()
+            self.opened[lev] = hour
+            # 格子は予報時間によらないので、最初のものを使い回す
+            if lev not in self.grids:
+                self.grids[lev] = grid
+        return reader
+
+    def grid(self, hour, lev="surf"):
+        """格子の経度・緯度を返す
+
+        Parameters:
+        ----------
+        hour: int
+            予報時刻からの経過時間
+        lev: str
+            surf、plev
+        ----------
+        Returns:
+        ----------
+        lons_1d, lats_1d, lons, lats: ndarray
+            経度（1次元）、緯度（1次元）、経度（2次元）、緯度（2次元）
+        ----------
+        """
+        if lev not in self.grids:
+            self._open(lev, hour)
+        return self.grids[lev]
+
+    def _compute(self, name, hour):
+        """変数を読み込む、または使う変数から求める"""
+        if name in surf_vars:
+            var_name = surf_vars[name][0 if self.dset == "MSM" else 1]
+            self.reads += 1
+            return self._open("surf", hour).ret_var(var_name)
+        if name in surf_derived:
+            deps, func = surf_derived[name]
+            args = [self.get(d, hour) for d in deps]
+            self.derives += 1
+            return func(*args)
+        m = _plev_name.match(name)
+        if m is not None:
+            prefix, level = m.group(1), int(m.group(2))
+            if prefix in plev_vars:
+                var_name = plev_vars[prefix] + "_" + str(level) + "mb"
+                self.reads += 1
+                return self._open("plev", hour).ret_var(var_name)
+            if prefix in plev_derived:
+                deps, func = plev_derived[prefix]
+                args = [self.get(d + "_" + str(level), hour) for d in deps]
+                self.derives += 1
+                return func(level, *args)
+        raise KeyError("unknown field: " + str(name))
+
+    def get(self, name, hour):
+        """変数を返す（読み込み済み・計算済みなら使い回す）
+
+        Parameters:
+        ----------
+        name: str
+            変数名（例：mslp_hPa、rain_1h、wspd_10m、thetae_850）
+        hour: int
+            予報時刻からの経過時間
+        ----------
+        Returns:
+        ----------
+        d: ndarray
+            データ（2次元、格子全体、共有されるので変更しない）
+        ----------
+        """
+        key = (self.run, int(hour), name)
+        if key in self.fields:
+            self.hits += 1
+            self.fields.move_to_end(key)
+            return self.fields[key]
+        d = self._compute(name, int(hour))
+        self.fields[key] = d
+        self.nbytes += _nbytes(d)
+        # 上限を超えたら古く使われたものから消す（最新の1つは残す）
+        while self.nbytes > self.budget and len(self.fields) > 1:
+            k, f = self.fields.popitem(last=False)
+            self.nbytes -= _nbytes(f)
+        return d
+
+    def close(self):
+        """開いているファイルを閉じる（メモリに残した変数は消さない）"""
+        for lev in self.opened:
+            self.readers[lev].close_netcdf()
+        self.opened = dict()
@@ -0,0 +1,172 @@
+#
+#  2026/10/19 格子から地点への内挿（重みを疎行列として保存し、使い回す）
+#
+import os
+import hashlib
+import numpy as np
+import scipy.sparse
+from .encode import _tmp_name
+from .cache import cache_dir_default
+
+# 地点の値の求め方：bilinear（周囲4格子点からの双線形補間）、nearest（最近傍の格子点）
+interp_method = "bilinear"
+
+# 内挿の重みをディスクに保存するかどうか
+opt_weights_cache = True
+
+
+def _axis_weights(loc_list, locs):
+    """1次元の格子で、地点を挟む2点の番号と重みを求める
+
+    Parameters:
+    ----------
+    loc_list: list(float, float, ...) or numpy.ndarray
+        データ点のリスト（単調に増加または減少している）
+    locs: numpy.ndarray
+        地点の位置（1次元）
+    ----------
+    Returns:
+    ----------
+    i0, i1: numpy.ndarray
+        地点を挟む2点のグリッド番号（1次元）
+    t: numpy.ndarray
+        i1の重み（1次元、i0の重みは1-t、格子の範囲外は端の値にする）
+    ----------
+    """
+    loc_list = np.asarray(loc_list, dtype=np.float64)
+    locs = np.atleast_1d(np.asarray(locs, dtype=np.float64))
+    n = len(loc_list)
+    if n == 1:
+        i0 = np.zeros(len(locs), dtype=np.int64)
+        return i0, i0, np.zeros(len(locs))
+    descending = loc_list[0] > loc_list[-1]
+    a = loc_list[::-1] if descending else loc_list
+    j = np.clip(np.searchsorted(a, locs, side="right") - 1, 0, n - 2)
+    t = np.clip((locs - a[j]) / (a[j + 1] - a[j]), 0., 1.)
+    if descending:
+        # 並べ替える前の番号に戻す
+        return n - 1 - j, n - 2 - j, t
+    return j, j + 1, t
+
+
+def _make_weights(lons_1d, lats_1d, rlon, rlat, method):
+    """地点×格子点の重みの疎行列を作成する"""
+    from . import get_gridlocs
+    nx = len(lons_1d)
+    ny = len(lats_1d)
+    nsta = len(rlon)
+    if method == "nearest":
+        ix = get_gridlocs(lons_1d, rlon)
+        iy = get_gridlocs(lats_1d, rlat)
+        rows = np.arange(nsta)
+        cols = iy * nx + ix
+        vals = np.ones(nsta)
+    elif method == "bilinear":
+        ix0, ix1, tx = _axis_weights(lons_1d, rlon)
+        iy0, iy1, ty = _axis_weights(lats_1d, rlat)
+        # 1地点につき周囲の4格子点
+        rows = np.repeat(np.arange(nsta), 4)
+        cols = np.stack([
+            iy0 * nx + ix0, iy0 * nx + ix1, iy1 * nx + ix0, iy1 * nx + ix1
+        ],
+                        axis=1).reshape(nsta * 4)
+        vals = np.stack([(1. - ty) * (1. - tx), (1. - ty) * tx,
+                         ty * (1. - tx), ty * tx],
+                        axis=1).reshape(nsta * 4)
+    else:
+        raise ValueError("method must be bilinear or nearest, not " +
+                         str(method))
+    # 同じ格子点への重みは足し合わされる（格子点上の地点など）
+    return scipy.sparse.csr_matrix((vals, (rows, cols)),
+                                   shape=(nsta, ny * nx))
+
+
+class StationWeights():
+    """格子点の値から地点の値を求める重み（地点×格子点の疎行列）"""
+
+    def __init__(self,
+                 grid,
+                 lons_1d,
+                 lats_1d,
+                 rlon,
+                 rlat,
+                 method=None,
+                 cache_dir=None):
+        """重みの読み込み、または作成
+
+        同じ格子・地点・求め方の重みが保存されていれば読み込み、
+        なければ作成して保存する
+
+        Parameters:
+        ----------
+        grid: str
+            格子の名前（例：msm、gsm、保存するファイル名に使う）
+        lons_1d: ndarray
+            格子の経度（1次元、度）
+        lats_1d: ndarray
+            格子の緯度（1次元、度）
+        rlon: ndarray
+            地点の経度（1次元、度）
+        rlat: ndarray
+            地点の緯度（1次元、度）
+        method: str
+            bilinear、nearestのいずれか（デフォルト：interp_method）
+        cache_dir: str
+            重みを保存するディレクトリの親（デフォルト：cache_dir_default）
+        ----------
+        """
+        if method is None:
+            method = interp_method
+        if cache_dir is None:
+            cache_dir = cache_dir_default
+        lons_1d = np.asarray(lons_1d, dtype=np.float64)
+        lats_1d = np.asarray(lats_1d, dtype=np.float64)
+        rlon = np.atleast_1d(np.asarray(rlon, dtype=np.float64))
+        rlat = np.atleast_1d(np.asarray(rlat, dtype=np.float64))
+        self.shape = (len(lats_1d), len(lons_1d))
+        self.nsta = len(rlon)
+        # 格子・地点・求め方のハッシュをファイル名にする
+        h = hashlib.sha256(method.encode("utf-8"))
+        for d in (lons_1d, lats_1d, rlon, rlat):
+            h.update(str(d.shape).encode("utf-8"))
+            h.update(d.tobytes())
+        filename = os.path.join(cache_dir, "interp",
+                                grid + "_" + h.hexdigest()[:24] + ".npz")
+        self.weights = None
+        if opt_weights_cache and os.path.exists(filename):
+            try:
+                self.weights = scipy.sparse.load_npz(filename).tocsr()
+            except (OSError, ValueError) as e:
+                print("broken weights: ", filename, e)
+        if self.weights is None:
+            self.weights = _make_weights(lons_1d, lats_1d, rlon, rlat, method)
+            if opt_weights_cache:
+                os.makedirs(os.path.dirname(filename), exist_ok=True)
+                tmp_filename = _tmp_name(filename)
+                with open(tmp_filename, "wb") as f:
+                    scipy.sparse.save_npz(f, self.weights)
+                os.replace(tmp_filename, filename)
+
+    def sample(self, d):
+        """格子点の値から地点の値を求める
+
+        Parameters:
+        ----------
+        d: ndarray
+            格子点のデータ（(..., 緯度, 経度)、欠損値はNaNとして扱う）
+        ----------
+        Returns:
+        ----------
+        points: ndarray
+            地点のデータ（(..., 地点)）
+        ----------
+        """
+        d = np.ma.filled(np.ma.asarray(d, dtype=np.float64), np.nan)
+        lead = d.shape[:-2]
+        if d.shape[-2:] != self.shape:
+            raise ValueError("grid shape must be " + str(self.shape) +
+                             ", not " + str(d.shape[-2:]))
+        # 予報時間などの次元をまとめ、1回の行列積で全ての地点を求める
+        d = d.reshape((-1, self.shape[0] * self.shape[1]))
+        points = self.weights.dot(d.T).T
+        return points.reshape(lead + (self.nsta, ))
@@ -0,0 +1,99 @@
+#
+#  2026/10/19 出力解像度に合わせたデータの間引き（level of detail）
+#
+import math
+import warnings
+import numpy as np
+
+# 解像度に合わせてデータを間引くかどうか
+opt_lod = True
+
+# 出力画像の解像度のデフォルト
+dpi_default = 300
+
+# 1格子が出力画像で何ピクセル以上になるようにするか
+px_per_cell_default = 8
+
+
+def lod_factor(nx, ny, width, height, dpi=None, px_per_cell=None):
+    """出力画像の解像度から間引きの格子数を求める
+
+    Parameters:
+    ----------
+    nx: int
+        作図範囲内の東西方向の格子数
+    ny: int
+        作図範囲内の南北方向の格子数
+    width: float
+        地図の幅（inch）
+    height: float
+        地図の高さ（inch）
+    dpi: int
+        出力画像の解像度（デフォルト：dpi_default）
+    px_per_cell: float
+        1格子に割り当てるピクセル数の下限（デフォルト：px_per_cell_default）
+    ----------
+    Returns:
+    ----------
+    factor: int
+        何格子をまとめるか（1なら間引かない）
+    ----------
+    """
+    if dpi is None:
+        dpi = dpi_default
+    if px_per_cell is None:
+        px_per_cell = px_per_cell_default
+    # 1格子あたりのピクセル数（東西・南北の小さい方）
+    px = min(width * dpi / max(nx, 1), height * dpi / max(ny, 1))
+    if px <= 0:
+        return 1
+    return max(1, math.ceil(px_per_cell / px))
+
+
+def block_reduce(d, factor, pooling="mean"):
+    """factor x factorの格子をまとめる
+
+    Parameters:
+    ----------
+    d: ndarray
+        データ（1次元または2次元）
+    factor: int
+        何格子をまとめるか
+    pooling: str
+        まとめ方：mean（平均）、max（最大、降水量など極値を残す場合）、min（最小）
+    ----------
+    Returns:
+    ----------
+    d: ndarray
+        まとめたデータ（端の余りは含まれる格子だけで計算する）
+    ----------
+    """
+    if factor <= 1:
+        return d
+    masked = np.ma.is_masked(d)
+    d = np.ma.filled(np.ma.asarray(d, dtype=np.float64), np.nan)
+    # factorの倍数になるようにnanで埋める
+    pad = [(0, -n % factor) for n in d.shape]
+    d = np.pad(d, pad, mode="constant", constant_values=np.nan)
+    if d.ndim == 1:
+        d = d.reshape(-1, factor)
+        axis = 1
+    else:
+        ny, nx = d.shape
+        d = d.reshape(ny // factor, factor, nx // factor, factor)
+        axis = (1, 3)
+    with warnings.catch_warnings():
+        # 全て欠損の格子
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        if pooling == "max":
+            d = np.nanmax(d, axis=axis)
+        elif pooling == "min":
+            d = np.nanmin(d, axis=axis)
+        elif pooling == "mean":
+            d = np.nanmean(d, axis=axis)
+        else:
+            raise ValueError("pooling must be mean, max or min, not " +
+                             str(pooling))
+    if masked:
+        d = np.ma.masked_invalid(d)
+    return d
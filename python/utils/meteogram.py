@@ -0,0 +1,333 @@
+#
+#  2026/10/19 アメダス地点の時系列図（図のレイアウトを使い回して多数の地点を描く）
+#
+import os
+import math
+import numpy as np
+import matplotlib.pyplot as plt
+import matplotlib.dates as mdates
+import matplotlib.ticker as mticker
+from datetime import timedelta
+from concurrent.futures import ProcessPoolExecutor
+from .anim import render_rgba
+from .encode import get_encoder, is_vector, save_vector
+from .tier import tier_dpi
+from .shm import SharedFieldStore, attach_fields
+
+# 並列に実行するプロセス数（None：CPU数）
+max_workers_default = None
+
+# 時系列データの名前（plotmap、Meteogram.updateの引数の順番）
+series_names = ("mslp", "prep", "temp", "uwnd", "vwnd", "relh", "cfrl", "cfrm",
+                "cfrh", "cfrt")
+
+# ワーカープロセスで使うデータ
+_worker = dict()
+
+
+class Meteogram():
+    """時系列図（降水量・気温、相対湿度・矢羽、気圧・雲量の3段）
+
+    図のレイアウト（軸、目盛り、凡例）は最初に1回だけ作成し、
+    地点毎には線・棒・矢羽のデータと縦軸の範囲だけを入れ替える
+    """
+
+    def __init__(self, index, plt_barbs=True, barbs_kt=True):
+        """図のレイアウトを作成する
+
+        Parameters:
+        ----------
+        index: ndarray
+            時刻（1次元、datetime.datetime）
+        plt_barbs: bool
+            矢羽を描くかどうか
+        barbs_kt: bool
+            矢羽の単位（True：kt、False：m/s）
+        ----------
+        """
+        nt = len(index)
+        zero = np.zeros(nt)
+        #
+        # (0) プロットエリアの定義
+        fig = plt.figure(figsize=(10, 10))
+        ax1 = fig.add_subplot(3, 1, 1)
+        # タイトルを付ける
+        self.title = ax1.set_title("", fontsize=20)
+
+        # (1) 降水量と気温
+        # (1-1) 降水量(mm)
+        self.prep = ax1.bar(index,
+                            zero,
+                            color='b',
+                            width=0.03,
+                            alpha=0.4,
+                            label='Precipitation')
+        ax1.set_ylabel('Precipitation (mm)')
+        # 凡例
+        ax1.legend(loc='upper left')
+        #
+        # (1-2) 気温（K）
+        ax2 = ax1.twinx()  # 2つのプロットを関連付ける
+        self.temp, = ax2.plot(index, zero, color='r', label='Temperature')
+        ax2.set_ylabel('Temperature (K)')
+        # 凡例
+        ax2.legend(loc='upper right')
+        #
+        # (2) RH（%）& wind
+        # (2-1) RH（%）
+        ax3 = fig.add_subplot(3, 1, 2)
+        ax3.set_ylim([0, 100])
+        self.relh, = ax3.plot(index, zero, color='b', label='RH')
+        ax3.set_ylabel('RH (%)')
+        # 凡例
+        ax3.legend(loc='best')
+        #
+        # (2-2) 矢羽
+        y = 50
+        self.barbs = None
+        if plt_barbs:
+            if barbs_kt:
+                # kt
+                self.barbs = ax3.barbs(index,
+                                       y,
+                                       zero,
+                                       zero,
+                                       color='k',
+                                       length=5,
+                                       sizes=dict(emptybarb=0.001),
+                                       barb_increments=dict(half=2.57222,
+                                                            full=5.14444,
+                                                            flag=25.7222))
+            else:
+                # m/s
+                self.barbs = ax3.barbs(index,
+                                       y,
+                                       zero,
+                                       zero,
+                                       color='k',
+                                       length=5,
+                                       sizes=dict(emptybarb=0.001))
+        #
+        # (3) 地表気圧と気温
+        # (3-1) 地表気圧（hPa）
+        ax5 = fig.add_subplot(3, 1, 3)
+        self.mslp, = ax5.plot(index, zero, color='k', label='Pressure')
+        ax5.set_ylabel('pressure (hPa)')
+        #
+        # 凡例
+        ax5.legend(loc='upper left')
+        #
+        # (3-2) 雲量（%）
+        ax6 = ax5.twinx()  # 2つのプロットを関連付ける
+        ax6.set_ylim([0, 100])
+        ind_l = index - timedelta(minutes=20)
+        ind_m = index - timedelta(minutes=5)
+        ind_h = index + timedelta(minutes=10)
+        ind_t = index + timedelta(minutes=25)
+        self.cfrl = ax6.bar(ind_l,
+                            zero,
+                            color='r',
+                            width=0.01,
+                            alpha=0.4,
+                            label='low')
+        self.cfrm = ax6.bar(ind_m,
+                            zero,
+                            color='g',
+                            width=0.01,
+                            alpha=0.4,
+                            label='middle')
+        self.cfrh = ax6.bar(ind_h,
+                            zero,
+                            color='b',
+                            width=0.01,
+                            alpha=0.4,
+                            label='high')
+        self.cfrt = ax6.bar(ind_t,
+                            zero,
+                            color='k',
+                            width=0.01,
+                            alpha=0.4,
+                            label='total')
+        ax6.set_ylabel('Cloud Cover (%)')
+        # 凡例
+        ax6.legend(loc='lower left')
+        #
+        # y軸の目盛り
+        for ax in (ax1, ax2, ax3, ax5, ax6):
+            ax.yaxis.set_major_locator(mticker.AutoLocator())
+            ax.yaxis.set_minor_locator(mticker.AutoMinorLocator())
+        #
+        # x軸の目盛り
+        for ax in (ax1, ax3, ax5):
+            ax.xaxis.set_major_locator(mticker.AutoLocator())
+            ax.xaxis.set_minor_locator(mticker.AutoMinorLocator())
+        #
+        for ax in (ax1, ax3):
+            ax.xaxis.set_major_formatter(mticker.NullFormatter())
+            ax.xaxis.set_minor_formatter(mticker.NullFormatter())
+        #
+        ax5.xaxis.set_major_locator(
+            mticker.FixedLocator(ax5.get_xticks().tolist()))
+        ax5.set_xticklabels(ax5.get_xticklabels(), rotation=70, size="small")
+        ax5.xaxis.set_major_formatter(mdates.DateFormatter('%m/%d %HUTC'))
+        ax5.xaxis.set_minor_formatter(mticker.NullFormatter())
+        #
+        # プロット範囲の調整
+        fig.subplots_adjust(top=None, bottom=0.15, wspace=0.25, hspace=0.15)
+        self.fig = fig
+        self.ax1, self.ax2, self.ax5 = ax1, ax2, ax5
+
+    def update(self, mslp, prep, temp, uwnd, vwnd, relh, cfrl, cfrm, cfrh,
+               cfrt, title):
+        """地点のデータに入れ替える
+
+        Parameters:
+        ----------
+        mslp: ndarray
+            SLPデータ（1次元、hPa）
+        prep: ndarray
+            降水量データ（1次元、mm）
+        temp: ndarray
+            気温データ（1次元、K）
+        uwnd: ndarray
+            東西風データ（1次元、m/s）
+        vwnd: ndarray
+            南北風データ（1次元、m/s）
+        relh: ndarray
+            相対湿度（1次元、%）
+        cfrl: ndarray
+            下層雲量（1次元、%）
+        cfrm: ndarray
+            中層雲量（1次元、%）
+        cfrh: ndarray
+            上層雲量（1次元、%）
+        cfrt: ndarray
+            全雲量（1次元、%）
+        title: str
+            タイトル
+        ----------
+        """
+        self.title.set_text(title)
+        # 降水量と気温
+        _set_heights(self.prep, prep)
+        self.ax1.set_ylim(
+            [0, math.ceil(prep.max() + math.fmod(prep.max(), 10)) + 1])
+        self.temp.set_ydata(temp)
+        self.ax2.set_ylim(
+            [math.floor(temp.min() - 1),
+             math.ceil(temp.max()) + 2])
+        # 相対湿度と矢羽
+        self.relh.set_ydata(relh)
+        if self.barbs is not None:
+            self.barbs.set_UVC(uwnd, vwnd)
+        # 地表気圧と雲量
+        self.mslp.set_ydata(mslp)
+        self.ax5.set_ylim([
+            math.floor(mslp.min() - math.fmod(mslp.min(), 2)) - 1,
+            math.ceil(mslp.max()) + 1
+        ])
+        _set_heights(self.cfrl, cfrl)
+        _set_heights(self.cfrm, cfrm)
+        _set_heights(self.cfrh, cfrh)
+        _set_heights(self.cfrt, cfrt)
+
+    def savefig(self, output_filename, dpi=None):
+        """図を保存する（減色・圧縮・書き出しはutils.encodeのスレッドで行う、
+        ベクター形式はその場で書き出す）"""
+        if dpi is None:
+            dpi = tier_dpi()
+        if is_vector():
+            save_vector(self.fig, output_filename, dpi=dpi)
+            return
+        frame = render_rgba(self.fig, dpi=dpi)
+        get_encoder().submit(frame, output_filename, dpi=dpi)
+
+    def close(self):
+        """図を閉じる"""
+        plt.close(self.fig)
+
+
+def _set_heights(bars, heights):
+    """棒グラフの高さを入れ替える"""
+    for rect, h in zip(bars, np.ma.filled(heights, np.nan)):
+        rect.set_height(h)
+
+
+def _init_worker(index, series_meta, plt_barbs, barbs_kt):
+    """ワーカープロセスにデータを渡す（時系列データは共有メモリを参照する）"""
+    _worker["index"] = index
+    _worker["series"] = attach_fields(series_meta)
+    _worker["plt_barbs"] = plt_barbs
+    _worker["barbs_kt"] = barbs_kt
+
+
+def _render_stations(tasks):
+    """地点の時系列図をまとめて作成する（ワーカープロセスで実行）"""
+    # 図のレイアウトはプロセス毎に1回だけ作成する
+    if "meteogram" not in _worker:
+        _worker["meteogram"] = Meteogram(_worker["index"],
+                                         plt_barbs=_worker["plt_barbs"],
+                                         barbs_kt=_worker["barbs_kt"])
+    meteogram = _worker["meteogram"]
+    series = _worker["series"]
+    for n, title, output_filename in tasks:
+        meteogram.update(*[series[name][:, n] for name in series_names],
+                         title)
+        meteogram.savefig(output_filename)
+    # プロセスが終了する前に書き出しを終える
+    get_encoder().flush()
+    return len(tasks)
+
+
+def render_meteograms(index,
+                      series,
+                      titles,
+                      output_filenames,
+                      plt_barbs=True,
+                      barbs_kt=True,
+                      max_workers=None):
+    """多数の地点の時系列図を、地点を分けて複数のプロセスで作成する
+
+    Parameters:
+    ----------
+    index: ndarray
+        時刻（1次元、datetime.datetime）
+    series: dict
+        series_namesをキー、(時刻, 地点)の2次元のndarrayを値とした辞書
+    titles: list(str, str, ...)
+        地点毎のタイトル
+    output_filenames: list(str, str, ...)
+        地点毎の出力ファイル名
+    plt_barbs: bool
+        矢羽を描くかどうか
+    barbs_kt: bool
+        矢羽の単位（True：kt、False：m/s）
+    max_workers: int
+        並列に実行するプロセス数（デフォルト：max_workers_default）
+    ----------
+    Returns:
+    ----------
+    num: int
+        作成した時系列図の数
+    ----------
+    """
+    if max_workers is None:
+        max_workers = max_workers_default
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    tasks = list(zip(range(len(titles)), titles, output_filenames))
+    if len(tasks) == 0:
+        return 0
+    # 地点をプロセス数の数倍に分け、空いたプロセスから順に作成する
+    nchunk = min(len(tasks), max_workers * 4)
+    chunks = [tasks[i::nchunk] for i in range(nchunk)]
+    # 時系列データは共有メモリに1つだけ置き、プロセス毎にコピーしない
+    with SharedFieldStore() as store:
+        for name in series_names:
+            store.put(name, series[name])
+        initargs = (index, store.meta, plt_barbs, barbs_kt)
+        with ProcessPoolExecutor(max_workers=max_workers,
+                                 initializer=_init_worker,
+                                 initargs=initargs) as executor:
+            num = sum(executor.map(_render_stations, chunks))
+    return num
@@ -0,0 +1,72 @@
+#
+#  2026/10/19 地図の投影法（投影法毎に1つのCRSを使い回す）
+#
+import cartopy.crs as ccrs
+
+# 地図の投影法のデフォルト
+# pc：正距円筒図法（PlateCarree）、lcc：ランベルト正角円錐図法（気象庁の天気図と同じ）
+proj_default = "pc"
+
+# ランベルト正角円錐図法の中心経度・緯度と標準緯線
+lcc_central_longitude = 140.
+lcc_central_latitude = 30.
+lcc_standard_parallels = (30., 60.)
+
+# 使っている投影法
+_proj = proj_default
+
+# 投影法毎のCRS（同じオブジェクトを使うと、cartopyと格子の投影結果が使い回される）
+_projections = dict()
+
+
+def _make_projection(proj):
+    """投影法の名前からCRSを作成する"""
+    if proj == "pc":
+        return ccrs.PlateCarree()
+    if proj == "lcc":
+        return ccrs.LambertConformal(
+            central_longitude=lcc_central_longitude,
+            central_latitude=lcc_central_latitude,
+            standard_parallels=lcc_standard_parallels)
+    raise ValueError("proj must be pc or lcc, not " + str(proj))
+
+
+def set_projection(proj=None):
+    """地図の投影法を設定する
+
+    Parameters:
+    ----------
+    proj: str
+        pc、lccのいずれか（デフォルト：proj_default）
+    ----------
+    """
+    global _proj
+    if proj is None:
+        proj = proj_default
+    map_projection(proj)  # 指定が正しいか調べる
+    _proj = proj
+
+
+def projection_name():
+    """使っている投影法の名前を返す"""
+    return _proj
+
+
+def map_projection(proj=None):
+    """地図の投影法のCRSを返す（一度作ったものを使い回す）
+
+    Parameters:
+    ----------
+    proj: str
+        pc、lccのいずれか（デフォルト：set_projectionで設定した投影法）
+    ----------
+    Returns:
+    ----------
+    projection: cartopy.crs.Projection
+    ----------
+    """
+    if proj is None:
+        proj = _proj
+    if proj not in _projections:
+        _projections[proj] = _make_projection(proj)
+    return _projections[proj]
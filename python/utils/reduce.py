@@ -0,0 +1,160 @@
+#
+#  2026/10/19 予報時間方向の統計量（期間毎の最大・最小・平均など）を1回の読み込みで求める
+#
+import numpy as np
+
+
+def day_windows(fcst_end, length=24, start=0):
+    """予報時間をlength時間毎に区切った期間のリストを作成する
+
+    Parameters:
+    ----------
+    fcst_end: int
+        予報時間の終わり
+    length: int
+        期間の長さ（時間、デフォルト：24）
+    start: int
+        最初の期間の始まり（予報時間）
+    ----------
+    Returns:
+    ----------
+    windows: list((int, int), ...)
+        期間の(始まり, 終わり)のリスト（最後の期間はfcst_endまで）
+    ----------
+    """
+    return [(h0, min(h0 + length, fcst_end))
+            for h0 in range(start, fcst_end, length)]
+
+
+class _WindowStats():
+    """1つの期間の統計量（格子の大きさの配列だけを持つ）"""
+
+    def __init__(self, shape, thresholds):
+        self.max = np.full(shape, -np.inf, dtype=np.float32)
+        self.min = np.full(shape, np.inf, dtype=np.float32)
+        self.argmax = np.full(shape, np.nan, dtype=np.float32)
+        self.sum = np.zeros(shape, dtype=np.float64)
+        self.count = np.zeros(shape, dtype=np.int32)
+        self.exceed = {th: np.zeros(shape, dtype=np.float32)
+                       for th in thresholds}
+
+    def update(self, hours, dt, d):
+        """予報時間の塊で更新する"""
+        valid = ~np.isnan(d)
+        # 最大値と、最大になった予報時間（同じ値なら早い方）
+        dmax = np.where(valid, d, -np.inf)
+        k = dmax.argmax(axis=0)
+        cmax = np.take_along_axis(dmax, k[np.newaxis], axis=0)[0]
+        upd = cmax > self.max
+        self.max = np.where(upd, cmax, self.max)
+        self.argmax = np.where(upd, hours[k], self.argmax)
+        # 最小値
+        self.min = np.minimum(self.min, np.where(valid, d, np.inf).min(axis=0))
+        # 平均値を求めるための合計と個数
+        self.sum += np.where(valid, d, 0.).sum(axis=0, dtype=np.float64)
+        self.count += valid.sum(axis=0, dtype=np.int32)
+        # 閾値以上の時間（データの間隔で重み付けする）
+        for th, ex in self.exceed.items():
+            ex += np.tensordot(dt, d >= th, axes=1)
+
+    def result(self):
+        """統計量を返す（データがない格子点はマスクする）"""
+        none = self.count == 0
+        mean = self.sum / np.maximum(self.count, 1)
+        return {
+            "max": np.ma.masked_where(none, self.max),
+            "min": np.ma.masked_where(none, self.min),
+            "mean": np.ma.masked_where(none, mean.astype(np.float32)),
+            "argmax": np.ma.masked_where(none, self.argmax),
+            "count": self.count,
+            "exceed": {th: np.ma.masked_where(none, ex)
+                       for th, ex in self.exceed.items()}
+        }
+
+
+class TimeReducer():
+    """期間毎の最大・最小・平均値、最大になった予報時間、閾値以上の時間を求める
+
+    予報時間の順にデータの塊（(予報時間, 緯度, 経度)）を与えると、その予報時間を
+    含む期間の統計量を更新し、終わった期間の統計量を返して消す。
+    メモリは途中の期間の統計量（格子の大きさの配列数個）だけで、予報時間によらない
+    """
+
+    def __init__(self, windows, thresholds=()):
+        """統計量を求める期間の設定
+
+        Parameters:
+        ----------
+        windows: list((int, int), ...)
+            期間の(始まり, 終わり)のリスト（始まりより後、終わりまでの予報時間を含む）
+        thresholds: list(float, float, ...)
+            閾値以上の時間を求める閾値
+        ----------
+        """
+        self.windows = sorted(set((int(h0), int(h1)) for h0, h1 in windows),
+                              key=lambda w: (w[1], w[0]))
+        self.thresholds = list(thresholds)
+        self.stats = dict()  # 途中の期間 -> _WindowStats
+        self.done = set()  # 終わった期間
+        self.last = None  # 最後に与えた予報時間
+
+    def add(self, hours, d):
+        """予報時間の塊を与える
+
+        Parameters:
+        ----------
+        hours: ndarray
+            予報時間（1次元、昇順、前に与えたものより後）
+        d: ndarray
+            データ（3次元、(予報時間, 緯度, 経度)、欠損値はNaN）
+        ----------
+        Returns:
+        ----------
+        results: list(((int, int), dict), ...)
+            この塊で終わった期間と、その統計量（max、min、mean、argmax、count、
+            exceed（閾値をキーとした辞書））
+        ----------
+        """
+        hours = np.asarray(hours, dtype=np.int64)
+        d = np.ma.filled(d, np.nan)
+        if len(hours) == 0:
+            return []
+        if np.any(np.diff(hours) <= 0) or (self.last is not None
+                                           and hours[0] <= self.last):
+            raise ValueError("hours must be added in increasing order")
+        # データの間隔（時間、最初のデータは1つ前の予報時間から）
+        prev = np.concatenate(
+            [[hours[0] - 1 if self.last is None else self.last], hours[:-1]])
+        dt = (hours - prev).astype(np.float32)
+        self.last = int(hours[-1])
+        for w in self.windows:
+            h0, h1 = w
+            if w in self.done:
+                continue
+            sel = (hours > h0) & (hours <= h1)
+            if not np.any(sel):
+                continue
+            if w not in self.stats:
+                self.stats[w] = _WindowStats(d.shape[1:], self.thresholds)
+            self.stats[w].update(hours[sel], dt[sel], d[sel])
+        return self._finish(lambda w: w[1] <= self.last)
+
+    def close(self):
+        """途中の期間も含めて、残りの期間の統計量を返す
+
+        Returns:
+        ----------
+        results: list(((int, int), dict), ...)
+            期間と、その統計量
+        ----------
+        """
+        return self._finish(lambda w: True)
+
+    def _finish(self, ended):
+        """終わった期間の統計量を返して消す"""
+        results = []
+        for w in self.windows:
+            if w in self.stats and ended(w):
+                results.append((w, self.stats.pop(w).result()))
+                self.done.add(w)
+        return results
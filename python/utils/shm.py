@@ -0,0 +1,142 @@
+#
+#  2026/10/19 共有メモリを使ったワーカープロセスへのデータの受け渡し
+#
+from multiprocessing import shared_memory
+import numpy as np
+
+# ワーカープロセスで参照している共有メモリ：ブロック名 -> (SharedMemory, ndarray)
+_attached = dict()
+
+
+class SharedFieldStore():
+    """データを共有メモリに1つだけ置き、ワーカープロセスから名前で参照させる
+
+    読み込みを行うプロセスでput()したデータは、metaをワーカープロセスに渡し、
+    attach_fieldsで読み取り専用のndarrayとして参照する（コピーしない）
+    """
+
+    def __init__(self):
+        self.blocks = dict()  # 名前 -> SharedMemory
+        self.meta = dict()  # 名前 -> ブロック名、形、型、座標
+
+    def put(self, name, d, coords=None):
+        """データを共有メモリに置く（同じ名前のデータは置き換える）
+
+        Parameters:
+        ----------
+        name: str
+            データの名前
+        d: ndarray
+            データ（マスクされた値はNaNにする）
+        coords: dict
+            座標の名前をキー、1次元のndarrayを値とした辞書（例：lons_1d、lats_1d）
+        ----------
+        Returns:
+        ----------
+        view: ndarray
+            共有メモリ上のデータ
+        ----------
+        """
+        if np.ma.isMaskedArray(d):
+            d = np.ma.filled(d, np.nan)
+        d = np.asarray(d)
+        self.remove(name)
+        shm = shared_memory.SharedMemory(create=True, size=max(d.nbytes, 1))
+        view = np.ndarray(d.shape, dtype=d.dtype, buffer=shm.buf)
+        view[...] = d
+        self.blocks[name] = shm
+        self.meta[name] = {
+            "block": shm.name,
+            "shape": d.shape,
+            "dtype": d.dtype.str,
+            "coords": coords
+        }
+        return view
+
+    def remove(self, name):
+        """データを共有メモリから消す（参照中のワーカープロセスは閉じるまで使える）"""
+        shm = self.blocks.pop(name, None)
+        if shm is not None:
+            del self.meta[name]
+            shm.close()
+            shm.unlink()
+
+    def close(self):
+        """全てのデータを共有メモリから消す"""
+        for name in list(self.blocks):
+            self.remove(name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def _open_block(block):
+    """既存の共有メモリを開く（後片付けは作成したプロセスが行う）"""
+    try:
+        return shared_memory.SharedMemory(name=block, track=False)
+    except TypeError:  # Python 3.12以前
+        return shared_memory.SharedMemory(name=block)
+
+
+def attach(entry):
+    """共有メモリのデータを読み取り専用のndarrayとして返す（プロセス内で使い回す）
+
+    Parameters:
+    ----------
+    entry: dict
+        SharedFieldStore.metaの値
+    ----------
+    Returns:
+    ----------
+    d: ndarray
+        共有メモリ上のデータ（読み取り専用）
+    ----------
+    """
+    block = entry["block"]
+    if block not in _attached:
+        shm = _open_block(block)
+        d = np.ndarray(entry["shape"],
+                       dtype=np.dtype(entry["dtype"]),
+                       buffer=shm.buf)
+        d.flags.writeable = False
+        _attached[block] = (shm, d)
+    return _attached[block][1]
+
+
+def attach_fields(meta):
+    """SharedFieldStore.metaの全てのデータを参照する
+
+    Parameters:
+    ----------
+    meta: dict
+        SharedFieldStore.meta
+    ----------
+    Returns:
+    ----------
+    fields: dict
+        データの名前をキー、読み取り専用のndarrayを値とした辞書
+    ----------
+    """
+    return {name: attach(entry) for name, entry in meta.items()}
+
+
+def detach(keep=()):
+    """参照している共有メモリを閉じる
+
+    Parameters:
+    ----------
+    keep: list(str, str, ...)
+        閉じずに残すブロック名
+    ----------
+    """
+    for block in [b for b in _attached if b not in keep]:
+        shm, d = _attached.pop(block)
+        del d
+        try:
+            shm.close()
+        except BufferError:
+            # まだ参照されている場合は、参照がなくなった時に閉じられる
+            pass
@@ -0,0 +1,95 @@
+#
+#  2026/10/19 全ての地点の時系列データの表（地点×予報時間×変数）
+#
+import os
+import numpy as np
+import pandas as pd
+from .encode import _tmp_name
+
+# 表の出力形式：parquet、csv（parquetを書けない環境ではcsvにする）
+table_format = "parquet"
+
+
+def station_table(staids, en_names, rlon, rlat, index, fcst_times, series):
+    """地点×予報時間の縦長の表を作成する（変数毎に1列）
+
+    Parameters:
+    ----------
+    staids: ndarray
+        地点番号（1次元、str）
+    en_names: ndarray
+        英語の地点名（1次元、str）
+    rlon: ndarray
+        地点の経度（1次元、度）
+    rlat: ndarray
+        地点の緯度（1次元、度）
+    index: ndarray
+        予報の対象時刻（1次元、datetime）
+    fcst_times: ndarray
+        予報時刻からの経過時間（1次元、時間）
+    series: dict
+        変数名をキー、(予報時間, 地点)の2次元のndarrayを値とした辞書
+    ----------
+    Returns:
+    ----------
+    df: pandas.DataFrame
+        地点番号、地点名、経度、緯度、時刻、予報時間と変数の列を持つ表
+        （地点毎に予報時間の順に並べる）
+    ----------
+    """
+    nt = len(index)
+    nsta = len(staids)
+    # (地点, 予報時間)の順に並べる
+    table = {
+        "staid": np.repeat(np.asarray(staids), nt),
+        "en_name": np.repeat(np.asarray(en_names), nt),
+        "longitude": np.repeat(np.asarray(rlon, dtype=np.float64), nt),
+        "latitude": np.repeat(np.asarray(rlat, dtype=np.float64), nt),
+        "time": np.tile(pd.to_datetime(np.asarray(index)), nsta),
+        "fcst_time": np.tile(np.asarray(fcst_times, dtype=np.int32), nsta)
+    }
+    for name, d in series.items():
+        # 欠損値はNaNにする
+        d = np.ma.filled(np.ma.asarray(d, dtype=np.float32), np.nan)
+        table[name] = d.T.reshape(nsta * nt)
+    return pd.DataFrame(table)
+
+
+def write_table(df, output_filename, fmt=None):
+    """表をファイルに書き出す（書き込みが途中で終わったファイルを残さない）
+
+    Parameters:
+    ----------
+    df: pandas.DataFrame
+        書き出す表
+    output_filename: str
+        出力ファイル名（拡張子は出力形式に合わせて変わる）
+    fmt: str
+        出力形式：parquet、csv（デフォルト：table_format）
+    ----------
+    Returns:
+    ----------
+    output_filename: str
+        書き出したファイル名
+    ----------
+    """
+    if fmt is None:
+        fmt = table_format
+    root = os.path.splitext(output_filename)[0]
+    if fmt == "parquet":
+        output_filename = root + ".parquet"
+        tmp_filename = _tmp_name(output_filename)
+        try:
+            df.to_parquet(tmp_filename, index=False)
+        except ImportError as e:
+            # pyarrow、fastparquetがない場合
+            print("parquet is not available, write csv: ", e)
+            fmt = "csv"
+    if fmt == "csv":
+        output_filename = root + ".csv"
+        tmp_filename = _tmp_name(output_filename)
+        df.to_csv(tmp_filename, index=False, float_format="%.6g")
+    elif fmt != "parquet":
+        raise ValueError("format must be parquet or csv, not " + str(fmt))
+    os.replace(tmp_filename, output_filename)
+    return output_filename
@@ -0,0 +1,79 @@
+#
+#  2026/10/19 作図の品質（簡易版を先に描き、通常版で置き換える）
+#
+# 作図する品質のデフォルト
+# quick：簡易版のみ、full：通常版のみ、both：簡易版を描いた後に通常版で置き換える
+tier_default = "full"
+
+# 品質毎に簡易版かどうかのリスト（描く順番）
+_tiers = {"quick": [True], "full": [False], "both": [True, False]}
+
+# 通常版の解像度
+full_dpi = 300
+
+# 簡易版の解像度
+quick_dpi = 100
+
+# 簡易版で1格子に割り当てるピクセル数の下限（大きいほど間引く）
+quick_px_per_cell = 12
+
+# 簡易版を描いているかどうか
+_quick = False
+
+
+def tier_list(tier=None):
+    """品質の指定から、簡易版かどうかのリストを返す
+
+    Parameters:
+    ----------
+    tier: str
+        quick、full、bothのいずれか（デフォルト：tier_default）
+    ----------
+    Returns:
+    ----------
+    tiers: list(bool, ...)
+        描く順番に並べた、簡易版かどうかのリスト
+    ----------
+    """
+    if tier is None:
+        tier = tier_default
+    if tier not in _tiers:
+        raise ValueError("tier must be quick, full or both, not " + str(tier))
+    return _tiers[tier]
+
+
+def set_quick(quick):
+    """簡易版を描くかどうかを設定する"""
+    global _quick
+    _quick = bool(quick)
+
+
+def quicklook():
+    """簡易版を描いているかどうかを返す"""
+    return _quick
+
+
+def tier_dpi():
+    """現在の品質の解像度を返す"""
+    return quick_dpi if _quick else full_dpi
+
+
+def tier_px_per_cell():
+    """現在の品質で1格子に割り当てるピクセル数の下限を返す（Noneならデフォルト）"""
+    return quick_px_per_cell if _quick else None
+
+
+def clabel(cs, *args, **kwargs):
+    """等値線にラベルを付ける（簡易版では付けない）
+
+    Parameters:
+    ----------
+    cs: matplotlib.contour.ContourSet
+        等値線
+    args, kwargs:
+        ContourSet.clabelに渡す引数
+    ----------
+    """
+    if _quick:
+        return []
+    return cs.clabel(*args, **kwargs)
@@ -0,0 +1,318 @@
+#
+#  2026/10/19 XYZタイル（Web Mercator）の作成
+#
+import os
+import math
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from .cmaps import lut_rgba, band_cmap
+from .shm import SharedFieldStore, attach, detach
+
+# タイルを置くディレクトリ（環境変数TILEDIR_GPVで指定可能）
+tile_dir_default = os.environ.get('TILEDIR_GPV', 'tiles')
+
+# タイルの大きさ（ピクセル）
+tile_size = 256
+
+# Web Mercatorの地球半径 (m)
+_radius = 6378137.0
+
+# ワーカープロセスで使うデータ
+_worker = dict()
+
+
+def parse_zoom(zoom):
+    """ズームレベルの文字列をリストに変換する（例："4-7" -> [4, 5, 6, 7]）"""
+    if isinstance(zoom, (list, tuple)):
+        return [int(z) for z in zoom]
+    zooms = []
+    for s in str(zoom).split(","):
+        if "-" in s:
+            z0, z1 = s.split("-")
+            zooms.extend(range(int(z0), int(z1) + 1))
+        else:
+            zooms.append(int(s))
+    return zooms
+
+
+def lonlat2merc(lon, lat):
+    """経度・緯度（度）からWeb Mercatorの座標（m）に変換する"""
+    x = _radius * np.deg2rad(lon)
+    y = _radius * np.log(np.tan(np.pi / 4.0 + np.deg2rad(lat) / 2.0))
+    return x, y
+
+
+def merc2lonlat(x, y):
+    """Web Mercatorの座標（m）から経度・緯度（度）に変換する"""
+    lon = np.rad2deg(x / _radius)
+    lat = np.rad2deg(np.arctan(np.sinh(y / _radius)))
+    return lon, lat
+
+
+def tile_bounds(z, x, y):
+    """タイルの範囲をWeb Mercatorの座標で返す（xmin, ymin, xmax, ymax）"""
+    size = 2.0 * math.pi * _radius / 2**z
+    xmin = -math.pi * _radius + x * size
+    ymax = math.pi * _radius - y * size
+    return xmin, ymax - size, xmin + size, ymax
+
+
+def tile_range(z, lon_min, lon_max, lat_min, lat_max):
+    """範囲を含むタイル番号のリストを返す"""
+    n = 2**z
+
+    def _x(lon):
+        return min(max(int((lon + 180.0) / 360.0 * n), 0), n - 1)
+
+    def _y(lat):
+        r = math.radians(lat)
+        t = (1.0 - math.log(math.tan(r) + 1.0 / math.cos(r)) / math.pi) / 2.0
+        return min(max(int(t * n), 0), n - 1)
+
+    return [(x, y) for x in range(_x(lon_min),
+                                  _x(lon_max) + 1)
+            for y in range(_y(lat_max),
+                           _y(lat_min) + 1)]
+
+
+def _grid_index(loc_1d, loc):
+    """等間隔格子の近傍格子番号（範囲外は-1）"""
+    d = (loc_1d[-1] - loc_1d[0]) / (len(loc_1d) - 1)
+    ind = np.rint((loc - loc_1d[0]) / d).astype(np.int64)
+    ind[(ind < 0) | (ind >= len(loc_1d))] = -1
+    return ind
+
+
+def _render_shade(layer, d, lons_1d, lats_1d, bounds):
+    """陰影のタイルを作成する（近傍格子の値を色に変換）"""
+    xmin, ymin, xmax, ymax = bounds
+    # ピクセル中心の座標
+    step = (xmax - xmin) / tile_size
+    xs = xmin + (np.arange(tile_size) + 0.5) * step
+    ys = ymax - (np.arange(tile_size) + 0.5) * step
+    lon, lat = merc2lonlat(xs, ys)
+    ii = _grid_index(lons_1d, lon)
+    jj = _grid_index(lats_1d, lat)
+    valid = (jj[:, np.newaxis] >= 0) & (ii[np.newaxis, :] >= 0)
+    v = np.ma.filled(d[jj[:, np.newaxis], ii[np.newaxis, :]], np.nan)
+    v[~valid] = np.nan
+    levels = layer["levels"]
+    valid &= np.isfinite(v)
+    if layer.get("extend", "neither") in ("neither", "max"):
+        valid &= (v >= levels[0])
+    if layer.get("extend", "neither") in ("neither", "min"):
+        valid &= (v <= levels[-1])
+    if not valid.any():
+        return None
+    # GridContour.shadeと同じ区間毎の色
+    cmap, norm = band_cmap(layer["cmap"],
+                           levels,
+                           extend=layer.get("extend", "neither"))
+    rgba = lut_rgba(cmap, norm(np.where(valid, v, levels[0])))
+    rgba[..., 3] = np.where(valid, int(255 * layer.get("alpha", 1.0)), 0)
+    return rgba
+
+
+def _render_contour(layer, d, xm_1d, ym_1d, bounds):
+    """等値線のタイルを作成する"""
+    xmin, ymin, xmax, ymax = bounds
+    # タイルの範囲の格子を切り出す（タイルの外側にも2格子分残す）
+    dx = 2.0 * np.abs(np.diff(xm_1d)).max()
+    dy = 2.0 * np.abs(np.diff(ym_1d)).max()
+    ii = np.nonzero((xm_1d >= xmin - dx) & (xm_1d <= xmax + dx))[0]
+    jj = np.nonzero((ym_1d >= ymin - dy) & (ym_1d <= ymax + dy))[0]
+    if len(ii) < 2 or len(jj) < 2:
+        return None
+    isl = slice(ii.min(), ii.max() + 1)
+    jsl = slice(jj.min(), jj.max() + 1)
+    z = d[jsl, isl]
+    fig = Figure(figsize=(1, 1), dpi=tile_size)
+    canvas = FigureCanvasAgg(fig)
+    fig.patch.set_alpha(0.0)
+    ax = fig.add_axes((0, 0, 1, 1))
+    ax.set_axis_off()
+    ax.contour(xm_1d[isl],
+               ym_1d[jsl],
+               z,
+               levels=layer["levels"],
+               colors=layer.get("colors", "k"),
+               linewidths=layer.get("linewidths", 1.0))
+    ax.set_xlim(xmin, xmax)
+    ax.set_ylim(ymin, ymax)
+    canvas.draw()
+    rgba = np.asarray(canvas.buffer_rgba())
+    if rgba[..., 3].max() == 0:
+        return None
+    return rgba.copy()
+
+
+def empty_name(output_filename):
+    """何も描かれないタイルを記録するファイル名"""
+    return os.path.splitext(output_filename)[0] + ".empty"
+
+
+def _init_worker(lons_1d, lats_1d, layers):
+    """ワーカープロセスにデータを渡す"""
+    _worker["lons_1d"] = lons_1d
+    _worker["lats_1d"] = lats_1d
+    _worker["xm_1d"], _worker["ym_1d"] = lonlat2merc(lons_1d, lats_1d)
+    _worker["layers"] = layers
+
+
+def _load_field(meta, field):
+    """予報時間毎のデータを共有メモリから参照する（前の予報時間のものは閉じる）"""
+    detach(keep=[entry["block"] for entry in meta.values()])
+    return attach(meta[field])
+
+
+def _render_tile(task):
+    """タイルを1枚作成する（ワーカープロセスで実行）"""
+    name, z, x, y, output_filename, meta = task
+    layer = _worker["layers"][name]
+    d = _load_field(meta, layer["field"])
+    bounds = tile_bounds(z, x, y)
+    if layer["kind"] == "shade":
+        rgba = _render_shade(layer, d, _worker["lons_1d"], _worker["lats_1d"],
+                             bounds)
+    else:
+        rgba = _render_contour(layer, d, _worker["xm_1d"], _worker["ym_1d"],
+                               bounds)
+    os.makedirs(os.path.dirname(output_filename), exist_ok=True)
+    if rgba is None:
+        # 再実行時に作り直さないように、空のタイルであることを記録する
+        open(empty_name(output_filename), "w").close()
+        return False
+    tmp_filename = output_filename + ".tmp"
+    Image.fromarray(rgba).save(tmp_filename, format="png", optimize=True)
+    os.replace(tmp_filename, output_filename)
+    return True
+
+
+class TileRenderer():
+    """予報時刻毎の陰影・等値線をXYZタイルとして書き出す"""
+
+    def __init__(self,
+                 lons_1d,
+                 lats_1d,
+                 layers,
+                 zooms,
+                 run,
+                 product,
+                 tile_dir=None,
+                 max_workers=None,
+                 force=False):
+        """タイル作成の設定
+
+        Parameters:
+        ----------
+        lons_1d: ndarray
+            経度データ（1次元、度、等間隔）
+        lats_1d: ndarray
+            緯度データ（1次元、度、等間隔）
+        layers: dict
+            レイヤー名をキーとした描画設定の辞書
+            kind: shade（陰影）またはcontour（等値線）
+            field: 描画するデータの名前
+            levels: 陰影・等値線を描く値のリスト
+            cmap, extend, alpha: 陰影の色テーブル、範囲外の扱い、透明度
+            colors, linewidths: 等値線の色、太さ
+        zooms: list(int, int, ...)
+            作成するズームレベル
+        run: str
+            初期時刻（形式：20210819120000）
+        product: str
+            プロダクト名（例：msm_mslp）
+        tile_dir: str
+            タイルを置くディレクトリ（デフォルト：tile_dir_default）
+        max_workers: int
+            並列に実行するプロセス数（デフォルト：CPU数）
+        force: bool
+            作成済みのタイルがあっても作り直すかどうか
+        ----------
+        """
+        self.lons_1d = np.asarray(lons_1d, dtype=np.float64)
+        self.lats_1d = np.asarray(lats_1d, dtype=np.float64)
+        self.layers = layers
+        self.zooms = parse_zoom(zooms)
+        self.run = run
+        self.product = product
+        if tile_dir is None:
+            tile_dir = tile_dir_default
+        self.tile_dir = tile_dir
+        self.max_workers = max_workers
+        self.force = force
+        # ワーカープロセスは予報時間を通して使い回す
+        self.executor = None
+        self.store = None  # ワーカープロセスと共有するデータ
+
+    def path(self, fcst_time, name, z, x, y):
+        """タイルのパスを返す（初期時刻/プロダクト/予報時間/レイヤー/z/x/y.png）"""
+        hh = "{d:02d}".format(d=int(fcst_time))
+        return os.path.join(self.tile_dir, self.run, self.product, hh, name,
+                            str(z), str(x),
+                            str(y) + ".png")
+
+    def tiles(self):
+        """格子の範囲を含むタイル番号のリストを返す"""
+        lon_min, lon_max = self.lons_1d.min(), self.lons_1d.max()
+        lat_min, lat_max = self.lats_1d.min(), self.lats_1d.max()
+        return [(z, x, y) for z in self.zooms
+                for x, y in tile_range(z, lon_min, lon_max, lat_min, lat_max)]
+
+    def render(self, fcst_time, fields):
+        """予報時刻のタイルを作成する
+
+        Parameters:
+        ----------
+        fcst_time: int
+            予報時間
+        fields: dict
+            データの名前をキー、2次元のndarrayを値とした辞書
+        ----------
+        Returns:
+        ----------
+        num: int
+            新たに作成したタイルの数
+        ----------
+        """
+        tasks = []
+        for name in self.layers:
+            for z, x, y in self.tiles():
+                output_filename = self.path(fcst_time, name, z, x, y)
+                # 作成済みのタイル（空のタイルを含む）は作り直さない
+                if not self.force and (
+                        os.path.exists(output_filename)
+                        or os.path.exists(empty_name(output_filename))):
+                    continue
+                tasks.append((name, z, x, y, output_filename))
+        if len(tasks) == 0:
+            return 0
+        if self.executor is None:
+            self.store = SharedFieldStore()
+            initargs = (self.lons_1d, self.lats_1d, self.layers)
+            self.executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                initializer=_init_worker,
+                                                initargs=initargs)
+        # データは共有メモリに1つだけ置き、ワーカープロセスはコピーせずに参照する
+        for field, d in fields.items():
+            self.store.put(field, np.ma.masked_invalid(d))
+        meta = dict(self.store.meta)
+        tasks = [task + (meta, ) for task in tasks]
+        res = list(self.executor.map(_render_tile, tasks, chunksize=16))
+        self.store.close()
+        num = sum(res)
+        print("tiles: +" + str(fcst_time) + "h", len(tasks), "rendered,",
+              num, "written")
+        return num
+
+    def close(self):
+        """ワーカープロセスを終了する"""
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+        if self.store is not None:
+            self.store.close()
+            self.store = None
@@ -0,0 +1,320 @@
+#
+#  2026/10/19 等値線の間引き（Douglas-Peucker法）とGeoJSONへの書き出し
+#
+import os
+import json
+import numpy as np
+import contourpy
+from matplotlib.path import Path
+from matplotlib.colors import to_hex
+from .encode import _tmp_name
+from .cmaps import band_cmap
+
+# 間引きの許容誤差（格子間隔に対する比、0なら間引かない）
+# 格子間隔の半分以下なら、隣り合う等値線が交差することは実用上ない
+simplify_tolerance = 0.5
+
+# GeoJSONに書き出す座標の小数点以下の桁数
+coord_digits = 4
+
+
+def grid_tolerance(x, y, tol=None):
+    """格子間隔から間引きの許容誤差（座標の単位）を求める
+
+    Parameters:
+    ----------
+    x: ndarray
+        経度データ（2次元、度）
+    y: ndarray
+        緯度データ（2次元、度）
+    tol: float
+        格子間隔に対する比（デフォルト：simplify_tolerance）
+    ----------
+    Returns:
+    ----------
+    tol: float
+        許容誤差（度）
+    ----------
+    """
+    if tol is None:
+        tol = simplify_tolerance
+    dx = np.abs(np.diff(x[0, :])) if x.shape[1] > 1 else np.array([0.])
+    dy = np.abs(np.diff(y[:, 0])) if y.shape[0] > 1 else np.array([0.])
+    return tol * min(dx.min(), dy.min())
+
+
+def _douglas_peucker(xy, start, end, tol, keep):
+    """startからendまでの間で残す点をkeepに記録する"""
+    stack = [(start, end)]
+    while len(stack) > 0:
+        i, j = stack.pop()
+        if j - i < 2:
+            continue
+        # 始点と終点を結ぶ直線からの距離を、間の点についてまとめて求める
+        p = xy[i + 1:j] - xy[i]
+        d = xy[j] - xy[i]
+        norm = np.hypot(d[0], d[1])
+        if norm == 0.:
+            dist = np.hypot(p[:, 0], p[:, 1])
+        else:
+            dist = np.abs(d[0] * p[:, 1] - d[1] * p[:, 0]) / norm
+        k = int(np.argmax(dist))
+        if dist[k] > tol:
+            k = k + i + 1
+            keep[k] = True
+            stack.append((i, k))
+            stack.append((k, j))
+
+
+def simplify_line(xy, tol):
+    """折れ線の点を間引く（Douglas-Peucker法）
+
+    始点・終点は残し、閉じた線は閉じたまま、3角形より少ない点にはしない
+
+    Parameters:
+    ----------
+    xy: ndarray
+        折れ線の座標（2次元、(点の数, 2)）
+    tol: float
+        許容誤差（座標の単位、元の線からこれ以上離れない）
+    ----------
+    Returns:
+    ----------
+    xy: ndarray
+        間引いた折れ線の座標
+    ----------
+    """
+    xy = np.asarray(xy, dtype=np.float64)
+    n = len(xy)
+    if n <= 3 or tol <= 0.:
+        return xy
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    if np.array_equal(xy[0], xy[-1]):
+        # 閉じた線は始点から最も遠い点で2つに分けて間引く
+        k = int(np.argmax(np.sum((xy - xy[0])**2, axis=1)))
+        if k == 0:
+            return xy
+        keep[k] = True
+        _douglas_peucker(xy, 0, k, tol, keep)
+        _douglas_peucker(xy, k, n - 1, tol, keep)
+        # 3角形より小さくなる場合は間引かない
+        if np.count_nonzero(keep) < 4:
+            return xy
+    else:
+        _douglas_peucker(xy, 0, n - 1, tol, keep)
+    return xy[keep]
+
+
+def simplify_path(path, tol):
+    """matplotlibのPathを部分パス毎に間引く
+
+    Parameters:
+    ----------
+    path: matplotlib.path.Path
+        間引くパス（MOVETOで始まる複数の折れ線、多角形を含んでよい）
+    tol: float
+        許容誤差（座標の単位）
+    ----------
+    Returns:
+    ----------
+    path: matplotlib.path.Path
+        間引いたパス
+    ----------
+    """
+    vertices = path.vertices
+    codes = path.codes
+    if len(vertices) <= 3:
+        return path
+    if codes is None:
+        return Path(simplify_line(vertices, tol))
+    # 部分パスの始まり
+    starts = np.nonzero(codes == Path.MOVETO)[0]
+    if len(starts) == 0 or starts[0] != 0:
+        starts = np.concatenate([[0], starts])
+    ends = np.append(starts[1:], len(codes))
+    out_vertices = []
+    out_codes = []
+    for i, j in zip(starts, ends):
+        xy = simplify_line(vertices[i:j], tol)
+        c = np.full(len(xy), Path.LINETO, dtype=Path.code_type)
+        c[0] = Path.MOVETO
+        if codes[j - 1] == Path.CLOSEPOLY:
+            c[-1] = Path.CLOSEPOLY
+        out_vertices.append(xy)
+        out_codes.append(c)
+    return Path(np.concatenate(out_vertices), np.concatenate(out_codes))
+
+
+def simplify_contour(cs, tol):
+    """ContourSetの等値線・陰影の境界を間引く
+
+    Parameters:
+    ----------
+    cs: matplotlib.contour.ContourSet
+        等値線または陰影
+    tol: float
+        許容誤差（座標の単位）
+    ----------
+    Returns:
+    ----------
+    cs: matplotlib.contour.ContourSet
+        間引いたContourSet（同じオブジェクト）
+    ----------
+    """
+    if tol <= 0.:
+        return cs
+    cs.set_paths([simplify_path(p, tol) for p in cs.get_paths()])
+    return cs
+
+
+def _coords(xy):
+    """GeoJSONの座標のリストに変換する"""
+    return np.round(xy, coord_digits).tolist()
+
+
+class GeoJSONLayers():
+    """等値線・陰影の境界をGeoJSONのFeatureCollectionにまとめる"""
+
+    def __init__(self, **properties):
+        """FeatureCollectionの作成
+
+        Parameters:
+        ----------
+        properties: dict
+            FeatureCollectionに付ける情報（タイトル、予報時刻など）
+        ----------
+        """
+        self.properties = properties
+        self.features = []
+
+    def lines(self, name, x, y, z, levels, tol=None, **properties):
+        """等値線を追加する（値毎に1つのMultiLineString）
+
+        Parameters:
+        ----------
+        name: str
+            レイヤー名（例：mslp）
+        x: ndarray
+            経度データ（2次元、度）
+        y: ndarray
+            緯度データ（2次元、度）
+        z: ndarray
+            データ（2次元）
+        levels: list(float, float, ...)
+            等値線を描く値のリスト
+        tol: float
+            間引きの許容誤差（格子間隔に対する比、デフォルト：simplify_tolerance）
+        properties: dict
+            Featureに付ける情報（strokeなど）
+        ----------
+        """
+        tol = grid_tolerance(x, y, tol)
+        cg = contourpy.contour_generator(x, y, z, line_type="Separate")
+        for lev in levels:
+            lines = [simplify_line(xy, tol) for xy in cg.lines(lev)]
+            if len(lines) == 0:
+                continue
+            props = dict(layer=name, level=float(lev))
+            props.update(properties)
+            self.features.append({
+                "type": "Feature",
+                "properties": props,
+                "geometry": {
+                    "type": "MultiLineString",
+                    "coordinates": [_coords(xy) for xy in lines]
+                }
+            })
+
+    def bands(self,
+              name,
+              x,
+              y,
+              z,
+              levels,
+              extend="neither",
+              cmap=None,
+              tol=None,
+              **properties):
+        """陰影の範囲を追加する（値の範囲毎に1つのMultiPolygon）
+
+        Parameters:
+        ----------
+        name: str
+            レイヤー名（例：rain）
+        x: ndarray
+            経度データ（2次元、度）
+        y: ndarray
+            緯度データ（2次元、度）
+        z: ndarray
+            データ（2次元）
+        levels: list(float, float, ...)
+            陰影を付ける値のリスト
+        extend: str
+            範囲外の値も含めるか：neither、min、max、both
+        cmap: matplotlib Colormap
+            色テーブル（与えた場合はfillに色を付ける、shadeと同じ色になる）
+        tol: float
+            間引きの許容誤差（格子間隔に対する比、デフォルト：simplify_tolerance）
+        properties: dict
+            Featureに付ける情報
+        ----------
+        """
+        tol = grid_tolerance(x, y, tol)
+        levels = np.asarray(levels, dtype=np.float64)
+        cg = contourpy.contour_generator(x, y, z, fill_type="OuterOffset")
+        bounds = list(zip(levels[:-1], levels[1:]))
+        if extend in ("min", "both"):
+            bounds.insert(0, (-np.inf, levels[0]))
+        if extend in ("max", "both"):
+            bounds.append((levels[-1], np.inf))
+        norm = None
+        if cmap is not None:
+            # GridContour.shadeと同じ区間毎の色
+            cmap, norm = band_cmap(cmap, levels, extend=extend)
+        for lower, upper in bounds:
+            points, offsets = cg.filled(lower, upper)
+            polygons = []
+            for xy, offset in zip(points, offsets):
+                # 外側の境界と穴の境界
+                polygons.append([
+                    _coords(simplify_line(xy[i:j], tol))
+                    for i, j in zip(offset[:-1], offset[1:])
+                ])
+            if len(polygons) == 0:
+                continue
+            props = dict(layer=name,
+                         lower=None if np.isinf(lower) else float(lower),
+                         upper=None if np.isinf(upper) else float(upper))
+            if norm is not None:
+                # 範囲の中の代表値の色
+                v = lower if np.isfinite(lower) else upper - 1.
+                props["fill"] = to_hex(cmap(norm(v)))
+            props.update(properties)
+            self.features.append({
+                "type": "Feature",
+                "properties": props,
+                "geometry": {
+                    "type": "MultiPolygon",
+                    "coordinates": polygons
+                }
+            })
+
+    def write(self, output_filename):
+        """GeoJSONファイルに書き出す（書き込みが途中で終わったファイルを残さない）
+
+        Parameters:
+        ----------
+        output_filename: str
+            出力ファイル名
+        ----------
+        """
+        collection = {
+            "type": "FeatureCollection",
+            "properties": self.properties,
+            "features": self.features
+        }
+        tmp_filename = _tmp_name(output_filename)
+        with open(tmp_filename, "w") as f:
+            json.dump(collection, f, separators=(",", ":"))
+        os.replace(tmp_filename, output_filename)
@@ -0,0 +1,142 @@
+#
+#  2026/10/19 任意の線に沿った鉛直断面（内挿の重みは格子・線毎に1回だけ作成する）
+#
+import numpy as np
+from .interp import StationWeights
+
+# 断面の点の間隔（km）
+xsect_step_km = 10.
+
+# 地球の半径（km）
+_radius_km = 6371.
+
+
+def parse_path(path):
+    """断面の線の文字列を経度・緯度のリストに変換する（例："135,26:135,44"）
+
+    Parameters:
+    ----------
+    path: str
+        経度,緯度を:で区切って並べた文字列（2点以上）
+    ----------
+    Returns:
+    ----------
+    points: list(tuple, tuple, ...)
+        (経度, 緯度)のリスト
+    ----------
+    """
+    points = []
+    for s in str(path).split(":"):
+        lon, lat = s.split(",")
+        points.append((float(lon), float(lat)))
+    if len(points) < 2:
+        raise ValueError("path needs two or more points: " + str(path))
+    return points
+
+
+def _path_dist(points):
+    """折れ線の頂点の経度・緯度と、頂点の始点からの距離（km）"""
+    lon = np.array([p[0] for p in points], dtype=np.float64)
+    lat = np.array([p[1] for p in points], dtype=np.float64)
+    # 区間毎に正距円筒で近似する
+    dx = np.diff(lon) * np.cos(np.deg2rad(
+        (lat[1:] + lat[:-1]) / 2.)) * np.deg2rad(_radius_km)
+    dy = np.diff(lat) * np.deg2rad(_radius_km)
+    seg = np.hypot(dx, dy)
+    if np.any(seg == 0.):
+        raise ValueError("path has the same points in succession")
+    return lon, lat, np.concatenate([[0.], np.cumsum(seg)])
+
+
+def section_path(points, step_km=None):
+    """折れ線の上に等間隔に点を取る
+
+    Parameters:
+    ----------
+    points: list(tuple, tuple, ...)
+        折れ線の頂点の(経度, 緯度)のリスト
+    step_km: float
+        点の間隔（km、デフォルト：xsect_step_km、終点を含むように調整する）
+    ----------
+    Returns:
+    ----------
+    plon, plat: ndarray
+        点の経度・緯度（1次元、度）
+    dist: ndarray
+        始点からの距離（1次元、km）
+    ----------
+    """
+    if step_km is None:
+        step_km = xsect_step_km
+    lon, lat, vdist = _path_dist(points)
+    npts = int(np.ceil(vdist[-1] / step_km)) + 1
+    dist = np.linspace(0., vdist[-1], npts)
+    plon = np.interp(dist, vdist, lon)
+    plat = np.interp(dist, vdist, lat)
+    return plon, plat, dist
+
+
+class CrossSection():
+    """格子のデータを線に沿った断面に内挿する
+
+    内挿の重み（断面の点×格子点の疎行列）は格子・線毎に1回だけ作成して保存し、
+    (..., 緯度, 経度)のデータを予報時間・気圧面をまとめた1回の行列積で内挿する
+    """
+
+    def __init__(self,
+                 grid,
+                 lons_1d,
+                 lats_1d,
+                 points,
+                 step_km=None,
+                 method=None):
+        """断面の設定
+
+        Parameters:
+        ----------
+        grid: str
+            格子の名前（例：msm、重みを保存するファイル名に使う）
+        lons_1d: ndarray
+            格子の経度（1次元、度）
+        lats_1d: ndarray
+            格子の緯度（1次元、度）
+        points: list(tuple, tuple, ...)
+            折れ線の頂点の(経度, 緯度)のリスト
+        step_km: float
+            断面の点の間隔（km、デフォルト：xsect_step_km）
+        method: str
+            bilinear、nearestのいずれか（デフォルト：interp_method）
+        ----------
+        """
+        self.points = points
+        self.lons, self.lats, self.dist = section_path(points, step_km)
+        # 格子の範囲外の点があれば作図できない
+        if (self.lons.min() < np.min(lons_1d)
+                or self.lons.max() > np.max(lons_1d)
+                or self.lats.min() < np.min(lats_1d)
+                or self.lats.max() > np.max(lats_1d)):
+            raise ValueError("path must be inside the grid")
+        self.weights = StationWeights(grid + "_xsect",
+                                      lons_1d,
+                                      lats_1d,
+                                      self.lons,
+                                      self.lats,
+                                      method=method)
+        # 頂点の始点からの距離（km、目盛りに使う）
+        self.vdist = _path_dist(points)[2]
+
+    def sample(self, d):
+        """断面に内挿する
+
+        Parameters:
+        ----------
+        d: ndarray
+            格子のデータ（(..., 緯度, 経度)、マスクされた値はNaNにする）
+        ----------
+        Returns:
+        ----------
+        section: ndarray
+            断面のデータ（(..., 断面の点)）
+        ----------
+        """
+        return self.weights.sample(d)